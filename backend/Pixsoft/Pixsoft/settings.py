@@ -30,6 +30,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'corsheaders',
     'rest_framework',
     'rest_framework.authtoken',
@@ -105,6 +106,26 @@ DATABASES = {
     }
 }
 
+# Caché en dos niveles (ver api/cache.py):
+# - 'default': compartido entre procesos. Redis si se define REDIS_URL (requiere el
+#   paquete `redis`); en desarrollo un LocMemCache hace de sustituto.
+# - 'local': caché en memoria de cada proceso, delante del compartido.
+REDIS_URL = os.environ.get('REDIS_URL')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'pixsoft-shared',
+    },
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'pixsoft-local',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -153,6 +174,49 @@ CORS_ALLOW_CREDENTIALS = True
 # Stripe Configuration
 STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY', '')
 STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY', '')
+# Secreto con el que Stripe firma los webhooks (cabecera Stripe-Signature)
+STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET', '')
+
+# Pasarela de pagos (ver billing/gateway.py): URL base (la del stub local en pruebas,
+# ver billing/stub_gateway.py), timeouts de conexión y de lectura en segundos, y
+# reintentos con espera exponencial con jitter (base y tope en segundos)
+PAYMENT_GATEWAY_URL = os.environ.get('PAYMENT_GATEWAY_URL', 'https://api.stripe.com')
+PAYMENT_GATEWAY_CONNECT_TIMEOUT = float(os.environ.get('PAYMENT_GATEWAY_CONNECT_TIMEOUT', 3.05))
+PAYMENT_GATEWAY_READ_TIMEOUT = float(os.environ.get('PAYMENT_GATEWAY_READ_TIMEOUT', 10))
+PAYMENT_GATEWAY_RETRIES = int(os.environ.get('PAYMENT_GATEWAY_RETRIES', 3))
+PAYMENT_GATEWAY_BACKOFF = float(os.environ.get('PAYMENT_GATEWAY_BACKOFF', 0.25))
+PAYMENT_GATEWAY_BACKOFF_MAX = float(os.environ.get('PAYMENT_GATEWAY_BACKOFF_MAX', 5))
+PAYMENT_CURRENCY = os.environ.get('PAYMENT_CURRENCY', 'usd')
+
+# Los PaymentIntent se crean fuera del hilo de la petición, en un pool de hilos por
+# proceso web (que es también el tamaño del pool de conexiones HTTP); con False se
+# crean dentro de la petición (ver billing/payments.py)
+PAYMENT_INTENTS_ASYNC = os.environ.get('PAYMENT_INTENTS_ASYNC', 'True') == 'True'
+PAYMENT_GATEWAY_WORKERS = int(os.environ.get('PAYMENT_GATEWAY_WORKERS', 8))
+
+# Minutos que un carrito retiene el stock de sus productos de venta (se renueva
+# con cada operación sobre el carrito)
+STOCK_RESERVATION_TTL_MINUTES = int(os.environ.get('STOCK_RESERVATION_TTL_MINUTES', 15))
+
+# Números de factura (ver billing/numbering.py): formato con {prefix}, {year} y {number}
+# (contador global de la secuencia) y números que cada proceso reserva por bloque
+INVOICE_NUMBER_PREFIX = os.environ.get('INVOICE_NUMBER_PREFIX', 'INV')
+INVOICE_NUMBER_FORMAT = os.environ.get('INVOICE_NUMBER_FORMAT', '{prefix}-{year}-{number:08d}')
+INVOICE_NUMBER_BLOCK_SIZE = int(os.environ.get('INVOICE_NUMBER_BLOCK_SIZE', 20))
+
+# Procesos del pool que genera los PDF de facturas en segundo plano, por proceso web
+# (ver billing/rendering.py)
+INVOICE_PDF_WORKERS = int(os.environ.get('INVOICE_PDF_WORKERS', 2))
+
+# Horas que un contrato puede seguir pendiente de pago antes de que el ciclo de vida
+# lo cancele y libere sus unidades (ver leasing/lifecycle.py)
+RENTAL_PAYMENT_TIMEOUT_HOURS = int(os.environ.get('RENTAL_PAYMENT_TIMEOUT_HOURS', 48))
+
+# Horas que se guarda la respuesta de un POST con Idempotency-Key (ver api/idempotency.py)
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.environ.get('IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+# Horas que se conservan los eventos ya entregados del outbox (ver api/outbox.py)
+OUTBOX_RETENTION_HOURS = int(os.environ.get('OUTBOX_RETENTION_HOURS', 72))
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 REST_FRAMEWORK = {
@@ -16,7 +16,7 @@ from users.views import (
     RegisterView, ManageUserView
 )
 from shipping.views import ShippingMethodViewSet, ShipmentViewSet
-from billing.views import InvoiceViewSet, PaymentViewSet
+from billing.views import InvoiceViewSet, PaymentViewSet, PaymentWebhookView
 from orders.views import OrderViewSet, CartViewSet, SalesAnalyticsView
 from products.views import InventoryAnalyticsView
 
@@ -28,7 +28,7 @@ router.register(r'shipping/methods', ShippingMethodViewSet)
 router.register(r'shipping/shipments', ShipmentViewSet)
 
 router.register(r'billing/invoices', InvoiceViewSet, basename='invoice')
-router.register(r'billing/payments', PaymentViewSet)
+router.register(r'billing/payments', PaymentViewSet, basename='payment')
 router.register(r'orders/cart', CartViewSet, basename='cart')
 router.register(r'orders', OrderViewSet, basename='order')
 
@@ -41,6 +41,7 @@ urlpatterns = [
     path('api/v1/leasing/', include('leasing.urls')),
     path('api/v1/products/', include('products.urls')),
     path('api/v1/marketing/', include('marketing.urls')),
+    path('api/v1/billing/webhook/', PaymentWebhookView.as_view(), name='payment-webhook'),
     
     # Dashboard / Analytics
     path('api/v1/dashboard/sales/', SalesAnalyticsView.as_view(), name='dashboard-sales'),
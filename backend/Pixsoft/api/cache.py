@@ -0,0 +1,211 @@
+import hashlib
+import threading
+import time
+from functools import wraps
+from django.core.cache import caches
+from django.db import models
+from rest_framework.response import Response
+
+# Alias de settings.CACHES: 'local' vive en cada proceso, 'default' es compartido
+# (Redis en producción; un LocMemCache lo sustituye en desarrollo).
+LOCAL_CACHE = 'local'
+SHARED_CACHE = 'default'
+
+# Las respuestas expiran aunque nadie las invalide
+CATALOG_CACHE_TIMEOUT = 60 * 60
+
+# Segundos que cada proceso reutiliza las versiones leídas del nivel compartido: un
+# acierto local no consulta Redis, y la invalidación hecha en OTRO proceso se ve a
+# lo sumo con este retraso (la del propio proceso, de inmediato)
+VERSION_CACHE_TIMEOUT = 2
+
+
+class CatalogCache:
+    """
+    Caché read-through de dos niveles para respuestas públicas del catálogo.
+
+    Cada entrada se etiqueta con espacios de nombres versionados ('products',
+    'categories', ... y 'product:<id>' por cada fila incluida) y guarda la versión
+    que tenía cada uno al escribirse. Invalidar es incrementar la versión de un
+    espacio en el nivel compartido: las entradas que lo usaban dejan de coincidir
+    en todos los procesos (tras VERSION_CACHE_TIMEOUT), sin borrar claves ni
+    recorrerlas.
+    """
+
+    def __init__(self, local=LOCAL_CACHE, shared=SHARED_CACHE, timeout=CATALOG_CACHE_TIMEOUT):
+        self.local_alias = local
+        self.shared_alias = shared
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    @property
+    def local(self):
+        return caches[self.local_alias]
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    # --- Contadores (por proceso) ---
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'stale': 0, 'invalidations': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['local_hits'] + stats['shared_hits'] + stats['misses']
+        stats['hit_ratio'] = round((stats['local_hits'] + stats['shared_hits']) / lookups, 4) if lookups else None
+        return stats
+
+    # --- Versiones de los espacios de nombres ---
+
+    def _version_key(self, namespace):
+        return f"catalog:version:{namespace}"
+
+    def versions(self, namespaces, fresh=False):
+        """
+        Versión actual de cada espacio de nombres: primero las del nivel local (de
+        hace menos de VERSION_CACHE_TIMEOUT) y las que falten en UNA lectura al
+        nivel compartido. `fresh` las lee todas del nivel compartido.
+        """
+        keys = {self._version_key(namespace): namespace for namespace in namespaces}
+        found = {} if fresh else self.local.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            shared = self.shared.get_many(missing)
+            for key in missing:
+                if key not in shared:
+                    # Una versión perdida (expulsada del caché) no debe volver a un valor
+                    # ya usado: se inicia con el reloj para invalidar entradas antiguas.
+                    self.shared.add(key, time.time_ns(), timeout=None)
+                    shared[key] = self.shared.get(key)
+            self.local.set_many(shared, VERSION_CACHE_TIMEOUT)
+            found.update(shared)
+        return {keys[key]: version for key, version in found.items()}
+
+    def invalidate(self, *namespaces):
+        for namespace in namespaces:
+            key = self._version_key(namespace)
+            try:
+                version = self.shared.incr(key)
+            except ValueError:
+                version = time.time_ns()
+                self.shared.set(key, version, timeout=None)
+            self.local.set(key, version, VERSION_CACHE_TIMEOUT)
+            self._count('invalidations')
+
+    # --- Entradas ---
+
+    def make_key(self, request):
+        params = sorted((key, value) for key in request.query_params for value in request.query_params.getlist(key))
+        raw = f"{request.get_host()}{request.path}?{params}"
+        return f"catalog:entry:{hashlib.md5(raw.encode()).hexdigest()}"
+
+    def get(self, key):
+        """Entrada vigente (versiones, datos, fecha de escritura) o None."""
+        entry = self.local.get(key)
+        tier = 'local_hits'
+        if entry is None:
+            entry = self.shared.get(key)
+            tier = 'shared_hits'
+        if entry is None:
+            self._count('misses')
+            return None
+
+        versions, data, written = entry
+        if self.versions(versions) != versions:
+            self._count('stale')
+            self._count('misses')
+            return None
+        if tier == 'shared_hits':
+            self.local.set(key, entry, self.timeout)
+        self._count(tier)
+        return entry
+
+    def set(self, key, data, namespaces, expected=None):
+        """
+        Guarda la entrada con las versiones actuales de sus espacios de nombres.
+        `expected` son las versiones leídas ANTES de calcular la respuesta: si alguna
+        cambió mientras tanto la respuesta puede estar desactualizada y no se guarda.
+        Retorna la entrada guardada (o None).
+        """
+        versions = self.versions(namespaces, fresh=True)
+        if expected and any(versions[namespace] != version for namespace, version in expected.items()):
+            return None
+        entry = (versions, data, time.time())
+        self.shared.set(key, entry, self.timeout)
+        self.local.set(key, entry, self.timeout)
+        return entry
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+        self.reset_stats()
+
+
+catalog_cache = CatalogCache()
+
+
+def row_namespaces(data, row_namespace):
+    """Espacios por fila ('product:<id>') de una respuesta de detalle, lista o página."""
+    if isinstance(data, dict):
+        rows = data.get('results', [data])
+    else:
+        rows = data
+    return [f"{row_namespace}:{row['id']}" for row in rows if isinstance(row, dict) and 'id' in row]
+
+
+def watch_rows(view, row_namespace, expected):
+    """
+    Agrega a `expected` las versiones de los espacios por fila ('product:<id>') al
+    pedir el serializador, es decir, ANTES de serializar las filas leídas: si una se
+    invalida mientras se calcula la respuesta, esta no se guarda.
+    """
+    get_serializer = view.get_serializer
+
+    def watched(instance=None, *args, **kwargs):
+        if instance is not None:
+            # list() evalúa el queryset una vez; el serializador reutiliza sus filas
+            rows = [instance] if isinstance(instance, models.Model) else list(instance)
+            expected.update(catalog_cache.versions([f"{row_namespace}:{row.pk}" for row in rows]))
+        return get_serializer(instance, *args, **kwargs)
+
+    view.get_serializer = watched
+
+
+def cache_response(*namespaces, row_namespace=None):
+    """
+    Decorador para métodos GET de vistas públicas: sirve la respuesta serializada
+    desde el caché y, si no está, la calcula y la guarda etiquetada con
+    `namespaces` (y con un espacio por fila si se indica `row_namespace`).
+    La respuesta lleva la entrada en `catalog_entry` (ver api.conditional).
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            key = catalog_cache.make_key(request)
+            entry = catalog_cache.get(key)
+            if entry is not None:
+                response = Response(entry[1])
+                response.catalog_entry = entry
+                return response
+
+            expected = catalog_cache.versions(namespaces)
+            if row_namespace:
+                watch_rows(view, row_namespace, expected)
+            response = method(view, request, *args, **kwargs)
+            if response.status_code == 200:
+                tags = list(namespaces)
+                if row_namespace:
+                    tags += row_namespaces(response.data, row_namespace)
+                response.catalog_entry = catalog_cache.set(key, response.data, tags, expected=expected)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,58 @@
+import hashlib
+from functools import wraps
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+class Validator:
+    """Validadores de una respuesta: fecha de última modificación y huella para el ETag."""
+
+    def __init__(self, last_modified, fingerprint):
+        self.last_modified = last_modified
+        self.fingerprint = fingerprint
+
+    def etag(self, request):
+        # Fuerte: el cuerpo depende también de la URL (filtros, cursor) y del formato
+        raw = f"{request.get_full_path()}|{request.accepted_media_type}|{self.fingerprint}"
+        return quote_etag(hashlib.sha1(raw.encode()).hexdigest())
+
+
+def entry_validator(entry):
+    """
+    Validador de una entrada de catalog_cache (ver api.cache.cache_response): la
+    huella son las versiones de sus espacios de nombres, que cambian con cada
+    invalidación que afecta al cuerpo, y la fecha es la de escritura de la entrada
+    (posterior a cualquier cambio que contenga). Sin consultas a la base de datos.
+    Last-Modified es por lo tanto la hora en que se guardó la respuesta en caché, no
+    la del último cambio de los datos: una entrada recalculada (expirada o expulsada)
+    tiene una fecha nueva aunque los datos sean los mismos, y el ETag no cambia.
+    """
+    versions, data, written = entry
+    fingerprint = '|'.join(f"{namespace}:{version}" for namespace, version in sorted(versions.items()))
+    return Validator(written, fingerprint)
+
+
+def conditional_get(method):
+    """
+    Decorador para métodos GET de vistas DRF decorados con cache_response. Con la
+    entrada de caché de la respuesta, si el cliente ya tiene la versión actual
+    (If-None-Match / If-Modified-Since) responde 304 sin renderizar el cuerpo; si
+    no, agrega ETag y Last-Modified. Una respuesta que no quedó en caché (error o
+    invalidada mientras se calculaba) sale sin validadores.
+    """
+    @wraps(method)
+    def wrapper(view, request, *args, **kwargs):
+        response = method(view, request, *args, **kwargs)
+        entry = getattr(response, 'catalog_entry', None)
+        if entry is None:
+            return response
+        validator = entry_validator(entry)
+        etag = validator.etag(request)
+        # Last-Modified tiene resolución de segundos
+        last_modified = int(validator.last_modified)
+
+        response = get_conditional_response(request._request, etag=etag, last_modified=last_modified) or response
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+    return wrapper
@@ -0,0 +1,110 @@
+import hashlib
+from datetime import timedelta
+from functools import wraps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+
+
+def request_fingerprint(request):
+    raw = f"{request.method} {request.path}\n".encode() + request.body
+    return hashlib.sha256(raw).hexdigest()
+
+
+def claim(scope, key, request_hash):
+    """
+    Inserta la clave dentro de la transacción de la petición. Si otra petición con la
+    misma clave sigue en curso, el INSERT espera en el índice único hasta que esa
+    transacción termine: si confirmó, se devuelve su fila (con la respuesta); si se
+    deshizo, la inserción sigue adelante y esta petición hace el trabajo.
+    Retorna (fila, creada).
+    """
+    expires_at = timezone.now() + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                scope=scope, key=key, request_hash=request_hash, expires_at=expires_at
+            ), True
+    except IntegrityError:
+        pass
+
+    existing = IdempotencyKey.objects.select_for_update().get(scope=scope, key=key)
+    if existing.expires_at > timezone.now():
+        return existing, False
+    # Vencida pero aún sin purgar: se reutiliza como si fuera nueva
+    existing.request_hash = request_hash
+    existing.status_code = existing.response = None
+    existing.expires_at = expires_at
+    existing.save()
+    return existing, True
+
+
+def idempotent(method):
+    """
+    Decorador para métodos POST de vistas DRF. Con cabecera Idempotency-Key la vista
+    se ejecuta una sola vez por (usuario, clave): los reintentos (incluidos los
+    concurrentes, que esperan al primero) reciben la respuesta guardada con la cabecera
+    Idempotent-Replayed. Solo se guardan respuestas 2xx; un error libera la clave para
+    que el cliente pueda reintentar. Sin cabecera la vista se comporta como siempre.
+    La cabecera exige un usuario autenticado: sin uno, las claves de clientes
+    distintos chocarían y uno recibiría la respuesta guardada de otro.
+    """
+    @wraps(method)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return method(view, request, *args, **kwargs)
+        if not key or len(key) > 255:
+            return Response({"detail": f"{HEADER} inválida."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not request.user.is_authenticated:
+            return Response(
+                {"detail": f"{HEADER} requiere un usuario autenticado."}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        scope = str(request.user.pk)
+        request_hash = request_fingerprint(request)
+        with transaction.atomic():
+            record, created = claim(scope, key, request_hash)
+            if not created:
+                if record.request_hash != request_hash:
+                    return Response(
+                        {"detail": f"La {HEADER} ya se usó con otra petición."},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                    )
+                response = Response(record.response, status=record.status_code)
+                response['Idempotent-Replayed'] = 'true'
+                return response
+
+            response = method(view, request, *args, **kwargs)
+            if status.is_success(response.status_code):
+                record.status_code = response.status_code
+                record.response = response.data
+                record.save(update_fields=['status_code', 'response'])
+            else:
+                record.delete()
+        return response
+    return wrapper
+
+
+def purge_expired(batch_size=1000):
+    """
+    Borra las claves vencidas por lotes (cada lote en su propia transacción, saltando
+    las filas bloqueadas por una petición en curso). Retorna cuántas se borraron.
+    """
+    purged = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                IdempotencyKey.objects.expired().select_for_update(skip_locked=True)
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                return purged
+            IdempotencyKey.objects.filter(pk__in=ids).delete()
+        purged += len(ids)
@@ -0,0 +1,42 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.outbox import OUTBOX_BATCH_SIZE, drain, listen, purge, wait
+
+
+class Command(BaseCommand):
+    help = (
+        "Despachador del outbox: entrega por lotes los eventos confirmados a sus "
+        "manejadores (facturas de pedidos y contratos, pagos). Queda en ejecución "
+        "esperando el NOTIFY de cada transacción con eventos (y revisando cada --poll "
+        "segundos los reintentos); --once vacía la cola y termina. Informa en JSON "
+        "ritmo y lag de cada pasada."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=OUTBOX_BATCH_SIZE, help="Eventos por transacción")
+        parser.add_argument('--poll', type=float, default=5, help="Segundos máximos de espera entre pasadas")
+        parser.add_argument('--purge-every', type=int, default=3600, help="Segundos entre purgas de entregados")
+        parser.add_argument('--once', action='store_true', help="Vaciar la cola una vez y terminar")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['poll'] <= 0:
+            raise CommandError("--batch-size y --poll deben ser positivos.")
+        # Suscrito antes de la primera pasada: no se pierde lo que confirme mientras tanto
+        if not options['once']:
+            listen()
+        purged_at = None
+        while True:
+            stats = drain(options['batch_size'])
+            if stats['delivered'] or stats['failed']:
+                self.stdout.write(json.dumps(stats))
+            if options['once']:
+                return
+            if purged_at is None or time.monotonic() - purged_at >= options['purge_every']:
+                purged = purge()
+                purged_at = time.monotonic()
+                if purged:
+                    self.stdout.write(json.dumps({'purged': purged}))
+            wait(options['poll'])
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra por lotes las claves de idempotencia vencidas. Pensado para ejecutarse "
+        "periódicamente (cron); con --every queda en ejecución purgando cada N segundos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Claves borradas por transacción")
+        parser.add_argument('--every', type=int, default=0, help="Segundos entre purgas (0 = una sola vez)")
+
+    def handle(self, *args, **options):
+        while True:
+            purged = purge_expired(batch_size=options['batch_size'])
+            self.stdout.write(f"Claves de idempotencia purgadas: {purged}")
+            if not options['every']:
+                return
+            time.sleep(options['every'])
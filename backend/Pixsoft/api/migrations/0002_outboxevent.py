@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-18 18:30
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topic', models.CharField(max_length=64, verbose_name='Tema')),
+                ('payload', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_at', models.DateTimeField(verbose_name='Publicado')),
+                ('available_at', models.DateTimeField(verbose_name='Disponible desde')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Intentos fallidos')),
+                ('last_error', models.TextField(blank=True)),
+                ('dispatched_at', models.DateTimeField(blank=True, null=True, verbose_name='Entregado')),
+            ],
+            options={
+                'verbose_name_plural': 'Eventos del Outbox',
+                'indexes': [models.Index(condition=models.Q(('dispatched_at__isnull', True)), fields=['id'], name='outbox_pending_idx'), models.Index(fields=['dispatched_at'], name='outbox_dispatched_idx')],
+            },
+        ),
+    ]
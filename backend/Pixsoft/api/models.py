@@ -1,3 +1,67 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class IdempotencyKeyQuerySet(models.QuerySet):
+
+    def expired(self):
+        return self.filter(expires_at__lte=timezone.now())
+
+
+class IdempotencyKey(models.Model):
+    """
+    Respuesta guardada de un POST con cabecera Idempotency-Key (ver api/idempotency.py).
+    Los reintentos con la misma clave reciben esta respuesta en lugar de repetir el trabajo.
+    """
+    # Usuario (o 'anon') y clave enviada por el cliente: las claves no se comparten entre usuarios
+    scope = models.CharField(max_length=32)
+    key = models.CharField(max_length=255)
+    # sha256 de método, ruta y cuerpo: la misma clave con otra petición es un error del cliente
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    expires_at = models.DateTimeField(verbose_name="Vence")
+
+    objects = IdempotencyKeyQuerySet.as_manager()
+
+    class Meta:
+        verbose_name_plural = "Claves de Idempotencia"
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='unique_idempotency_scope_key'),
+        ]
+        indexes = [
+            # Purga de claves vencidas por lotes
+            models.Index(fields=['expires_at'], name='idempotency_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}:{self.key} ({self.status_code})"
+
+
+class OutboxEvent(models.Model):
+    """
+    Evento de dominio (p. ej. 'order.placed') escrito en la misma transacción que la
+    fila que lo origina (ver api/outbox.py): existe solo si esa transacción confirmó.
+    El despachador lo entrega a sus manejadores al menos una vez.
+    """
+    topic = models.CharField(max_length=64, verbose_name="Tema")
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(verbose_name="Publicado")
+    # Un evento cuyo manejador falló se reintenta desde esta hora (espera creciente)
+    available_at = models.DateTimeField(verbose_name="Disponible desde")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Intentos fallidos")
+    last_error = models.TextField(blank=True)
+    dispatched_at = models.DateTimeField(null=True, blank=True, verbose_name="Entregado")
+
+    class Meta:
+        verbose_name_plural = "Eventos del Outbox"
+        indexes = [
+            # Cola: solo los pendientes, en orden de publicación (pequeño aunque la tabla crezca)
+            models.Index(fields=['id'], name='outbox_pending_idx', condition=models.Q(dispatched_at__isnull=True)),
+            # Métricas de la ventana reciente y purga de los entregados
+            models.Index(fields=['dispatched_at'], name='outbox_dispatched_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} #{self.pk} ({'entregado' if self.dispatched_at else 'pendiente'})"
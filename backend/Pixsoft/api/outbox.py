@@ -0,0 +1,220 @@
+import json
+import select
+import time
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import OutboxEvent
+
+EVENTS = OutboxEvent._meta.db_table
+
+# Canal de LISTEN/NOTIFY con el que se despierta al despachador al confirmar
+CHANNEL = 'outbox'
+
+# Eventos entregados por transacción
+OUTBOX_BATCH_SIZE = 500
+
+# Espera máxima (segundos) antes de reintentar un evento cuyo manejador falló
+MAX_RETRY_DELAY = 300
+
+# Manejadores por tema (ver handler())
+HANDLERS = defaultdict(list)
+
+
+def handler(topic):
+    """
+    Registra un manejador de `topic`. Recibe la lista de payloads de un lote y corre
+    en la transacción que marca esos eventos como entregados. La entrega es al menos
+    una vez (un lote fallido se repite): el manejador debe poder repetirse sin efecto.
+    """
+    def register(function):
+        HANDLERS[topic].append(function)
+        return function
+    return register
+
+
+def publish(topic, **payload):
+    """
+    Escribe un evento en la transacción en curso: se entrega solo si esa transacción
+    confirma. El NOTIFY del mismo INSERT despierta al despachador al confirmar
+    (PostgreSQL combina las notificaciones iguales de una transacción).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            WITH event AS (
+                INSERT INTO {EVENTS} (topic, payload, created_at, available_at, attempts, last_error)
+                VALUES (%s, %s, clock_timestamp(), clock_timestamp(), 0, '')
+                RETURNING id
+            )
+            SELECT pg_notify(%s, '') FROM event
+        """, [topic, json.dumps(payload, cls=DjangoJSONEncoder), CHANNEL])
+
+
+def deliver(topic, payloads):
+    for function in HANDLERS[topic]:
+        function(payloads)
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(2 ** attempts, MAX_RETRY_DELAY))
+
+
+class DispatchStats:
+    """Contadores, ritmo y lag (publicación -> entrega) de una pasada del despachador."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.batches = self.delivered = self.failed = 0
+        self.topics = defaultdict(int)
+        self.lag_total = self.lag_max = 0.0
+
+    def add(self, delivered, failed, now):
+        self.batches += 1
+        self.delivered += len(delivered)
+        self.failed += len(failed)
+        for event in delivered:
+            self.topics[event.topic] += 1
+            lag = (now - event.created_at).total_seconds()
+            self.lag_total += lag
+            self.lag_max = max(self.lag_max, lag)
+
+    def as_dict(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            'batches': self.batches, 'delivered': self.delivered, 'failed': self.failed, 'topics': dict(self.topics),
+            'seconds': round(elapsed, 3),
+            'events_per_second': round(self.delivered / elapsed) if elapsed else 0,
+            'lag_ms_avg': round(self.lag_total / self.delivered * 1000) if self.delivered else 0,
+            'lag_ms_max': round(self.lag_max * 1000),
+        }
+
+
+def dispatch(batch_size=OUTBOX_BATCH_SIZE, stats=None):
+    """
+    Entrega UN lote de eventos pendientes en orden de publicación, saltando los que
+    toma otro despachador. Manejadores y marca de entregado confirman juntos. Si un
+    tema falla, sus eventos se reintentan de a uno para aislar el que falla, que queda
+    pendiente con espera creciente sin frenar a los demás. Retorna cuántos se tomaron.
+    """
+    stats = stats or DispatchStats()
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.filter(dispatched_at__isnull=True, available_at__lte=timezone.now())
+            .order_by('pk').select_for_update(skip_locked=True)[:batch_size]
+        )
+        if not events:
+            return 0
+        by_topic = defaultdict(list)
+        for event in events:
+            by_topic[event.topic].append(event)
+
+        delivered, failed = [], []
+        for topic, topic_events in by_topic.items():
+            try:
+                with transaction.atomic():
+                    deliver(topic, [event.payload for event in topic_events])
+                delivered += topic_events
+                continue
+            except Exception:
+                pass
+            for event in topic_events:
+                try:
+                    with transaction.atomic():
+                        deliver(topic, [event.payload])
+                    delivered.append(event)
+                except Exception as error:
+                    event.last_error = f"{type(error).__name__}: {error}"
+                    failed.append(event)
+
+        now = timezone.now()
+        OutboxEvent.objects.filter(pk__in=[event.pk for event in delivered]).update(dispatched_at=now)
+        for event in failed:
+            OutboxEvent.objects.filter(pk=event.pk).update(
+                attempts=event.attempts + 1, last_error=event.last_error,
+                available_at=now + retry_delay(event.attempts + 1),
+            )
+    stats.add(delivered, failed, now)
+    return len(events)
+
+
+def drain(batch_size=OUTBOX_BATCH_SIZE):
+    """Entrega lotes hasta que no quedan eventos disponibles. Retorna las estadísticas."""
+    stats = DispatchStats()
+    while dispatch(batch_size, stats) == batch_size:
+        pass
+    return stats.as_dict()
+
+
+def listen():
+    """Suscribe la conexión al canal (sin efecto si ya lo estaba)."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"LISTEN {CHANNEL}")
+
+
+def wait(timeout):
+    """
+    Espera hasta `timeout` segundos un NOTIFY de publish() (una transacción con eventos
+    confirmó). Retorna True si llegó alguno. El LISTEN se repite en cada espera por si
+    la conexión se reabrió.
+    """
+    listen()
+    raw = connection.connection
+    # Las que llegaron durante las consultas anteriores ya están en raw.notifies
+    if not raw.notifies and select.select([raw], [], [], timeout)[0]:
+        raw.poll()
+    arrived = bool(raw.notifies)
+    raw.notifies.clear()
+    return arrived
+
+
+def purge(batch_size=5000, now=None):
+    """
+    Borra por lotes los eventos entregados hace más de OUTBOX_RETENTION_HOURS (cada
+    lote en su propia transacción). Retorna cuántos se borraron.
+    """
+    before = (now or timezone.now()) - timedelta(hours=settings.OUTBOX_RETENTION_HOURS)
+    purged = 0
+    while True:
+        with transaction.atomic():
+            ids = list(OutboxEvent.objects.filter(dispatched_at__lt=before).values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                return purged
+            OutboxEvent.objects.filter(pk__in=ids).delete()
+        purged += len(ids)
+
+
+def metrics(window=timedelta(minutes=5)):
+    """
+    Estado del outbox en UNA consulta: pendientes, con fallos y antigüedad del más
+    viejo (el lag actual), y de los entregados en la ventana reciente: cantidad, ritmo
+    y lag publicación -> entrega (p50, p95 y máximo).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT
+                (SELECT count(*) FROM {EVENTS} WHERE dispatched_at IS NULL),
+                (SELECT count(*) FROM {EVENTS} WHERE dispatched_at IS NULL AND attempts > 0),
+                (SELECT extract(epoch FROM clock_timestamp() - min(created_at)) FROM {EVENTS} WHERE dispatched_at IS NULL),
+                count(*),
+                percentile_cont(0.5) WITHIN GROUP (ORDER BY extract(epoch FROM dispatched_at - created_at)),
+                percentile_cont(0.95) WITHIN GROUP (ORDER BY extract(epoch FROM dispatched_at - created_at)),
+                max(extract(epoch FROM dispatched_at - created_at))
+            FROM {EVENTS}
+            WHERE dispatched_at >= clock_timestamp() - %s
+        """, [window])
+        pending, failing, oldest, delivered, lag_p50, lag_p95, lag_max = cursor.fetchone()
+    milliseconds = lambda seconds: round(float(seconds) * 1000) if seconds is not None else None
+    return {
+        'pending': pending,
+        'failing': failing,
+        'oldest_pending_ms': milliseconds(oldest),
+        'window_seconds': int(window.total_seconds()),
+        'delivered': delivered,
+        'events_per_second': round(delivered / window.total_seconds(), 2),
+        'lag_ms_p50': milliseconds(lag_p50),
+        'lag_ms_p95': milliseconds(lag_p95),
+        'lag_ms_max': milliseconds(lag_max),
+    }
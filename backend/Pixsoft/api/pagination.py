@@ -0,0 +1,112 @@
+import base64
+import json
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Paginación por cursor (keyset) sobre una clave de orden compuesta y estable,
+    p. ej. ('-created_at', '-id') o ('name', 'id').
+
+    A diferencia de CursorPagination, el cursor guarda la clave COMPLETA de la
+    última fila, así que cada página es
+    `WHERE created_at < x OR (created_at = x AND id < y) LIMIT n`: una página
+    profunda cuesta lo mismo que la primera si existe un índice con las mismas
+    columnas, y nunca se ejecuta COUNT(*).
+
+    La vista declara el orden en el atributo `ordering`; todas las columnas deben
+    ir en la misma dirección y la última debe ser única (normalmente 'id').
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-id',)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = tuple(getattr(view, 'ordering', None) or self.ordering)
+        if len({field.startswith('-') for field in ordering}) > 1:
+            raise ImproperlyConfigured(
+                f"{view.__class__.__name__}.ordering debe usar la misma dirección en todas sus columnas."
+            )
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.fields = [field.lstrip('-') for field in self.ordering]
+
+        position, reverse = self.decode_cursor(request)
+        descending = self.ordering[0].startswith('-') != reverse
+        queryset = queryset.order_by(*[f"-{field}" if descending else field for field in self.fields])
+        if position is not None:
+            try:
+                queryset = queryset.filter(self.after(position, 'lt' if descending else 'gt'))
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+
+        # Una fila extra indica si hay más resultados en esa dirección
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.page = results
+        return results
+
+    def after(self, position, lookup):
+        """
+        Filas posteriores a `position` en el orden: la primera columna ya pasó o es
+        igual y desempata la siguiente, y así hasta la última.
+        """
+        condition = Q()
+        for index, field in enumerate(self.fields):
+            equal = dict(zip(self.fields[:index], position[:index]))
+            condition |= Q(**equal, **{f"{field}__{lookup}": position[index]})
+        return condition
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.get_position(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.get_position(self.page[0]), reverse=True)
+
+    def get_position(self, instance):
+        """Clave de orden de la fila, serializable en JSON (fechas y decimales como texto)."""
+        position = []
+        for field in self.fields:
+            value = getattr(instance, field)
+            position.append(value if isinstance(value, (int, float, str)) or value is None else str(value))
+        return position
+
+    def encode_cursor(self, position, reverse):
+        payload = json.dumps({'p': position, 'r': int(reverse)}, separators=(',', ':'))
+        cursor = base64.urlsafe_b64encode(payload.encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        """Devuelve (posición, reverse); (None, False) para la primera página."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            position, reverse = payload['p'], bool(payload['r'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.fields):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
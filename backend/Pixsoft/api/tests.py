@@ -1,3 +1,474 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.db.models import Q
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase
+from rest_framework import status
+from products.models import SaleCategory, SaleProduct
+from products.serializers import SaleProductSerializer
+from shipping.models import ShippingMethod, Shipment
+from marketing.models import Banner
+from leasing.models import RentalCategory, RentalProduct, RentalPlan
+from billing import gateway, payments
+from billing.models import Invoice, Payment
+from billing.stub_gateway import StubGateway
+from orders.models import Cart, Order
+from .cache import catalog_cache
+from .idempotency import idempotent, purge_expired
+from .models import IdempotencyKey, OutboxEvent
+from . import outbox
 
-# Create your tests here.
+User = get_user_model()
+
+
+class KeysetPaginationTests(APITestCase):
+    """
+    Pruebas de la paginación por cursor (keyset) sobre claves compuestas.
+    """
+
+    def setUp(self):
+        method = ShippingMethod.objects.create(name='Local', type='LOCAL')
+        for i in range(5):
+            Shipment.objects.create(
+                shipping_method=method, origin_address='Bodega', destination_address=f'Cliente {i}',
+                customer_name=f'Cliente {i}', customer_email=f'cliente{i}@example.com'
+            )
+        # Empates en created_at: el id desempata
+        Shipment.objects.update(created_at=timezone.now())
+
+    def walk(self, url, link):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append([shipment['id'] for shipment in response.data['results']])
+            url = response.data[link]
+        return pages
+
+    def test_pages_follow_the_composite_key_without_gaps(self):
+        pages = self.walk('/api/v1/shipping/shipments/?page_size=2', 'next')
+
+        expected = sorted(Shipment.objects.values_list('id', flat=True), reverse=True)
+        self.assertEqual(pages, [expected[0:2], expected[2:4], expected[4:5]])
+
+    def test_previous_links_walk_back_to_the_first_page(self):
+        last_page = self.client.get('/api/v1/shipping/shipments/?page_size=2')
+        while last_page.data['next']:
+            last_page = self.client.get(last_page.data['next'])
+
+        pages = self.walk(last_page.data['previous'], 'previous')
+        expected = sorted(Shipment.objects.values_list('id', flat=True), reverse=True)
+        self.assertEqual(pages, [expected[2:4], expected[0:2]])
+
+    def test_each_page_is_a_single_query_without_count(self):
+        first = self.client.get('/api/v1/shipping/shipments/?page_size=2')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(first.data['next'])
+        self.assertNotIn('count', response.data)
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get('/api/v1/shipping/shipments/', {'cursor': 'no-es-un-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_catalog_is_paginated_by_name(self):
+        category = SaleCategory.objects.create(name='Accesorios')
+        for name in ['Mouse', 'Cable', 'Teclado']:
+            SaleProduct.objects.create(
+                name=name, description='', sku=name.upper(), price=Decimal('9.90'), category=category
+            )
+
+        first = self.client.get('/api/v1/products/product/', {'page_size': 2})
+        second = self.client.get(first.data['next'])
+
+        self.assertEqual([p['name'] for p in first.data['results']], ['Cable', 'Mouse'])
+        self.assertEqual([p['name'] for p in second.data['results']], ['Teclado'])
+        self.assertIsNone(second.data['next'])
+
+
+class CatalogCacheTests(APITestCase):
+    """
+    Pruebas del caché de dos niveles de los endpoints públicos del catálogo.
+    """
+
+    def setUp(self):
+        catalog_cache.clear()
+        self.category = SaleCategory.objects.create(name='Almacenamiento')
+        self.ssd = SaleProduct.objects.create(
+            name='SSD 1TB', description='', sku='SSD-1TB', price=Decimal('80.00'),
+            stock_quantity=5, category=self.category
+        )
+        self.hdd = SaleProduct.objects.create(
+            name='HDD 4TB', description='', sku='HDD-4TB', price=Decimal('95.00'),
+            stock_quantity=5, category=self.category
+        )
+
+    def detail(self, product):
+        return self.client.get(f'/api/v1/products/product/{product.pk}/')
+
+    def test_repeated_requests_are_served_from_the_cache(self):
+        first = self.client.get('/api/v1/products/product/')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/v1/products/product/')
+
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(catalog_cache.stats()['local_hits'], 1)
+
+    def test_shared_tier_backs_the_local_tier(self):
+        self.client.get('/api/v1/products/category/')
+        catalog_cache.local.clear()
+
+        with self.assertNumQueries(0):
+            self.client.get('/api/v1/products/category/')
+        self.assertEqual(catalog_cache.stats()['shared_hits'], 1)
+
+    def test_local_hits_reuse_recent_namespace_versions(self):
+        self.client.get('/api/v1/products/category/')
+        # Otro proceso invalida: solo cambia la versión del nivel compartido
+        key = catalog_cache._version_key('categories')
+        catalog_cache.shared.incr(key)
+
+        self.client.get('/api/v1/products/category/')
+        self.assertEqual(catalog_cache.stats()['local_hits'], 1)
+
+        # Vencida la versión local se lee la nueva y la entrada ya no sirve
+        catalog_cache.local.delete(key)
+        self.client.get('/api/v1/products/category/')
+        self.assertEqual(catalog_cache.stats()['stale'], 1)
+
+    def test_purchase_only_invalidates_entries_that_include_the_product(self):
+        self.detail(self.ssd)
+        self.detail(self.hdd)
+
+        self.client.post(f'/api/v1/products/product/{self.ssd.pk}/purchase/', {'quantity': 2})
+
+        with self.assertNumQueries(0):
+            self.detail(self.hdd)
+        self.assertEqual(self.detail(self.ssd).data['stock_quantity'], 3)
+
+    def test_rows_invalidated_while_serializing_are_not_cached(self):
+        to_representation = SaleProductSerializer.to_representation
+
+        def purchased_meanwhile(serializer, instance):
+            # Una compra concurrente cambia el stock después de leer la fila
+            SaleProduct.objects.filter(pk=self.ssd.pk).update(stock_quantity=1)
+            catalog_cache.invalidate(f"product:{self.ssd.pk}")
+            return to_representation(serializer, instance)
+
+        with mock.patch.object(SaleProductSerializer, 'to_representation', purchased_meanwhile):
+            stale = self.client.get('/api/v1/products/product/')
+        self.assertEqual(stale.data['results'][1]['stock_quantity'], 5)
+
+        fresh = self.client.get('/api/v1/products/product/')
+        self.assertEqual(fresh.data['results'][1]['stock_quantity'], 1)
+        self.assertEqual(catalog_cache.stats()['local_hits'], 0)
+
+    def test_model_changes_invalidate_their_namespace(self):
+        self.client.get('/api/v1/products/category/')
+        SaleCategory.objects.create(name='Redes')
+
+        names = [category['name'] for category in self.client.get('/api/v1/products/category/').data]
+        self.assertEqual(names, ['Almacenamiento', 'Redes'])
+
+        self.client.get('/api/v1/marketing/banners/')
+        Banner.objects.create(title='Ofertas', image='banners/ofertas.png')
+        response = self.client.get('/api/v1/marketing/banners/')
+        self.assertEqual([banner['title'] for banner in response.data], ['Ofertas'])
+
+
+class ConditionalGetTests(APITestCase):
+    """
+    Pruebas de ETag / Last-Modified en los endpoints del catálogo.
+    """
+
+    def setUp(self):
+        catalog_cache.clear()
+        self.category = SaleCategory.objects.create(name='Monitores')
+        self.monitor = SaleProduct.objects.create(
+            name='Monitor 24', description='', sku='MON-24', price=Decimal('150.00'),
+            stock_quantity=4, category=self.category
+        )
+
+    def test_unchanged_list_answers_304_without_queries(self):
+        response = self.client.get('/api/v1/products/product/')
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(0):
+            cached = self.client.get('/api/v1/products/product/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(cached.content, b'')
+
+        cached = self.client.get('/api/v1/products/product/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_changes_when_the_data_changes(self):
+        url = f'/api/v1/products/product/{self.monitor.pk}/'
+        etag = self.client.get(url)['ETag']
+
+        # Compra: update() masivo que también mueve updated_at
+        self.client.post(f'{url}purchase/', {'quantity': 1})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['stock_quantity'], 3)
+
+        # Renombrar la categoría cambia el category_name del producto
+        etag = response['ETag']
+        self.category.name = 'Pantallas'
+        self.category.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.data['category_name'], 'Pantallas')
+
+    def test_deleting_a_plan_changes_the_rental_catalog_etag(self):
+        category = RentalCategory.objects.create(name='Laptops')
+        laptop = RentalProduct.objects.create(name='Laptop', description='', category=category, sku='LAP-1', stock_quantity=2)
+        RentalPlan.objects.create(product=laptop, period='MONTHLY', base_price=Decimal('40.00'))
+        weekly = RentalPlan.objects.create(product=laptop, period='WEEKLY', base_price=Decimal('15.00'))
+        etag = self.client.get('/api/v1/leasing/products/')['ETag']
+
+        weekly.delete()
+
+        response = self.client.get('/api/v1/leasing/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results'][0]['plans']), 1)
+
+
+class IdempotencyTests(APITestCase):
+    """
+    Pruebas de la cabecera Idempotency-Key en la creación de pedidos y pagos.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='cliente')
+        self.invoice = Invoice.objects.create(user=self.user, amount=Decimal('80.00'), invoice_number='INV-PAGO-1')
+        category = SaleCategory.objects.create(name='Audio')
+        self.product = SaleProduct.objects.create(
+            name='Parlante', description='', sku='PAR-1', price=Decimal('40.00'), stock_quantity=5, category=category
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def pay(self, key, amount='80.00'):
+        return self.client.post('/api/v1/billing/payments/', {
+            'invoice': self.invoice.pk, 'amount': amount, 'method': 'CARD'
+        }, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retried_payment_returns_the_stored_response(self):
+        first = self.pay('pago-1')
+        retry = self.pay('pago-1')
+
+        self.assertEqual(retry.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_retried_checkout_creates_a_single_order(self):
+        cart = Cart.objects.create(user=self.user)
+        cart.items.create(product=self.product, quantity=2)
+
+        first = self.client.post('/api/v1/orders/orders/', {}, format='json', HTTP_IDEMPOTENCY_KEY='pedido-1')
+        retry = self.client.post('/api/v1/orders/orders/', {}, format='json', HTTP_IDEMPOTENCY_KEY='pedido-1')
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data['id'], first.data['id'])
+        self.assertEqual(Order.objects.count(), 1)
+        outbox.drain()
+        self.assertEqual(Invoice.objects.filter(order__isnull=False).count(), 1)
+
+    def test_reusing_a_key_with_another_body_is_rejected(self):
+        self.pay('pago-2')
+        response = self.pay('pago-2', amount='10.00')
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_anonymous_requests_cannot_use_a_key(self):
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.pay('pago-anonimo').status_code, status.HTTP_401_UNAUTHORIZED)
+
+        # Sin sesión el decorador tampoco acepta la clave, aunque la vista lo permita
+        view = mock.Mock()
+        request = Request(APIRequestFactory().post('/', {}, HTTP_IDEMPOTENCY_KEY='pago-anonimo'))
+        response = idempotent(lambda view, request: Response(status=status.HTTP_201_CREATED))(view, request)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Payment.objects.exists())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_failed_requests_do_not_keep_the_key(self):
+        response = self.client.post('/api/v1/orders/orders/', {}, format='json', HTTP_IDEMPOTENCY_KEY='pedido-vacio')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_expired_keys_are_purged_in_batches(self):
+        for key in ('a', 'b', 'c'):
+            self.pay(key)
+        IdempotencyKey.objects.filter(key__in=['a', 'b']).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(purge_expired(batch_size=1), 2)
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['c'])
+
+
+class IdempotencyConcurrencyTests(TransactionTestCase):
+    """
+    Reintentos simultáneos con la misma clave: el primero hace el trabajo y los
+    demás esperan y reciben su respuesta.
+    """
+    CLIENTS = 8
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # El PaymentIntent del pago se crea en el pool, contra la pasarela simulada
+        cls.stub = StubGateway().start()
+        cls.addClassCleanup(cls.stub.stop)
+        override = override_settings(PAYMENT_GATEWAY_URL=cls.stub.url, STRIPE_SECRET_KEY='sk_test_prueba')
+        override.enable()
+        cls.addClassCleanup(override.disable)
+
+    def setUp(self):
+        self.addCleanup(gateway.client.reset)
+
+    def test_concurrent_duplicates_create_a_single_payment(self):
+        user = User.objects.create_user(username='concurrente')
+        invoice = Invoice.objects.create(user=user, amount=Decimal('15.00'))
+        start, responses = threading.Barrier(self.CLIENTS), []
+
+        def post():
+            client = APIClient()
+            client.force_authenticate(user=user)
+            start.wait()
+            try:
+                responses.append(client.post('/api/v1/billing/payments/', {
+                    'invoice': invoice.pk, 'amount': '15.00', 'method': 'CARD'
+                }, format='json', HTTP_IDEMPOTENCY_KEY='reintento'))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=post) for _ in range(self.CLIENTS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertEqual({response.status_code for response in responses}, {status.HTTP_202_ACCEPTED})
+        self.assertEqual({response.data['id'] for response in responses}, {Payment.objects.get().pk})
+        # Un solo PaymentIntent (el pool termina antes de apagarse)
+        payments.pool.shutdown()
+        self.assertEqual(len(self.stub.intents), 1)
+        self.assertEqual(Payment.objects.get().status, 'REQUIRES_PAYMENT')
+
+
+class OutboxTests(APITestCase):
+    """
+    Eventos de dominio en el outbox: se escriben con la fila que los origina y el
+    despachador los entrega al menos una vez a manejadores que pueden repetirse.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='cliente')
+        self.admin = User.objects.create_user(username='admin', is_staff=True)
+
+    def test_order_event_is_written_with_the_order_and_invoiced_after_dispatch(self):
+        order = Order.objects.create(user=self.user, total_price=Decimal('42.50'))
+
+        event = OutboxEvent.objects.get()
+        self.assertEqual((event.topic, event.payload), ('order.placed', {'order': order.pk}))
+        self.assertFalse(Invoice.objects.exists())
+
+        stats = outbox.drain()
+        self.assertEqual((stats['delivered'], stats['topics']), (1, {'order.placed': 1}))
+        self.assertEqual(Invoice.objects.get(order=order).amount, Decimal('42.50'))
+        self.assertFalse(OutboxEvent.objects.filter(dispatched_at__isnull=True).exists())
+
+    def test_redelivered_events_do_not_duplicate_invoices(self):
+        Order.objects.create(user=self.user, total_price=Decimal('10.00'))
+        outbox.drain()
+        # Entrega repetida (p. ej. el despachador cayó antes de confirmar)
+        OutboxEvent.objects.update(dispatched_at=None)
+        outbox.drain()
+
+        self.assertEqual(Invoice.objects.count(), 1)
+
+    def test_rolled_back_transactions_leave_no_events(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                Order.objects.create(user=self.user, total_price=Decimal('10.00'))
+                raise RuntimeError("falla después de crear el pedido")
+
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_failing_event_is_retried_later_without_blocking_the_batch(self):
+        def fragile(payloads):
+            if any(payload.get('poison') for payload in payloads):
+                raise ValueError("payload inválido")
+
+        with mock.patch.dict(outbox.HANDLERS, {'prueba': [fragile]}):
+            outbox.publish('prueba', poison=True)
+            outbox.publish('prueba', poison=False)
+            order = Order.objects.create(user=self.user, total_price=Decimal('10.00'))
+            stats = outbox.drain()
+
+        self.assertEqual((stats['delivered'], stats['failed']), (2, 1))
+        self.assertTrue(Invoice.objects.filter(order=order).exists())
+        failed = OutboxEvent.objects.get(dispatched_at__isnull=True)
+        self.assertEqual((failed.attempts, failed.last_error), (1, "ValueError: payload inválido"))
+        self.assertGreater(failed.available_at, timezone.now())
+
+    def test_completed_payment_marks_the_invoice_paid_once_dispatched(self):
+        invoice = Invoice.objects.create(user=self.user, amount=Decimal('80.00'), invoice_number='INV-OUTBOX-1')
+        payment = Payment.objects.create(invoice=invoice, amount=Decimal('80.00'), status='REQUIRES_PAYMENT')
+        self.assertTrue(payments.transition(Q(pk=payment.pk), 'COMPLETED'))
+        self.assertEqual(OutboxEvent.objects.get().payload, {'payment': payment.pk, 'invoice': invoice.pk})
+
+        outbox.drain()
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.status, 'PAID')
+        self.assertEqual(invoice.paid_at, Payment.objects.get().timestamp)
+
+    def test_metrics_report_pending_events_and_delivery_lag(self):
+        Order.objects.create(user=self.user, total_price=Decimal('10.00'))
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get('/api/v1/outbox/metrics/').status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.admin)
+        before = self.client.get('/api/v1/outbox/metrics/').data
+        outbox.drain()
+        after = self.client.get('/api/v1/outbox/metrics/').data
+
+        self.assertEqual((before['pending'], before['delivered']), (1, 0))
+        self.assertIsNotNone(before['oldest_pending_ms'])
+        self.assertEqual((after['pending'], after['delivered']), (0, 1))
+        self.assertGreaterEqual(after['lag_ms_max'], 0)
+
+
+class OutboxNotifyTests(TransactionTestCase):
+    """El despachador despierta con el NOTIFY de la transacción que confirma eventos."""
+
+    def test_dispatcher_wakes_up_when_events_are_committed(self):
+        user = User.objects.create_user(username='cliente')
+        outbox.listen()
+        self.assertFalse(outbox.wait(0.05))
+
+        def place_order():
+            try:
+                with transaction.atomic():
+                    Order.objects.create(user=user, total_price=Decimal('5.00'))
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=place_order)
+        thread.start()
+        thread.join()
+
+        self.assertTrue(outbox.wait(5))
+        self.assertEqual(outbox.drain()['delivered'], 1)
+        self.assertEqual(Invoice.objects.get().amount, Decimal('5.00'))
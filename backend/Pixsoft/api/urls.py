@@ -1,5 +1,6 @@
 from django.urls import path, include
 from users.views import CustomTokenObtainPairView, UserListUpdateView, ToggleUserStaffStatusView
+from .views import CacheStatsView, OutboxMetricsView
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -17,5 +18,7 @@ urlpatterns = [
     path('shipping/', include('shipping.urls')),
     path('auth/', include('dj_rest_auth.urls')),
     path('auth/registration/', include('dj_rest_auth.registration.urls')),
+    path('cache/stats/', CacheStatsView.as_view(), name='cache-stats'),
+    path('outbox/metrics/', OutboxMetricsView.as_view(), name='outbox-metrics'),
 
 ]
@@ -1,6 +1,10 @@
+from datetime import timedelta
+from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from .cache import catalog_cache
+from . import outbox
 
 class ProtectedTestView(APIView):
     """
@@ -15,3 +19,29 @@ class ProtectedTestView(APIView):
         }
         return Response(content)
 
+
+class CacheStatsView(APIView):
+    """
+    Contadores de aciertos/fallos del caché del catálogo (de este proceso).
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(catalog_cache.stats())
+
+
+class OutboxMetricsView(APIView):
+    """
+    Pendientes, lag y ritmo de entrega del outbox (ver api/outbox.py). ?window=segundos
+    de la ventana de entregas recientes (300 por defecto).
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        try:
+            window = int(request.query_params.get('window', 300))
+        except ValueError:
+            window = 0
+        if window < 1:
+            return Response({"detail": "window debe ser un entero positivo."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(outbox.metrics(timedelta(seconds=window)))
@@ -5,5 +5,5 @@ class BillingConfig(AppConfig):
     name = "billing"
 
     def ready(self):
-        import billing.signals
+        import billing.handlers
 
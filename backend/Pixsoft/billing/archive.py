@@ -0,0 +1,169 @@
+import resource
+import time
+import zipfile
+from datetime import date, datetime, time as day_start, timedelta
+from django.utils import timezone
+from api.export import encode_rows
+from .models import Invoice
+from . import rendering
+
+# Facturas cargadas por lote; los PDF faltantes de un lote se generan en paralelo
+ARCHIVE_CHUNK_SIZE = 200
+
+INDEX_NAME = 'indice.csv'
+INDEX_COLUMNS = ('invoice_number', 'customer', 'amount', 'status', 'paid_at')
+INDEX_FIELDS = ('invoice_number', 'user__username', 'amount', 'status', 'paid_at')
+
+
+def archive_filters(date_from=None, date_to=None, status=None):
+    """
+    Filtros del archivo a partir de texto (fechas ISO y estado, opcionales).
+    Retorna (desde, hasta, estado); ValueError si alguno es inválido.
+    """
+    date_from = date.fromisoformat(date_from) if date_from else None
+    date_to = date.fromisoformat(date_to) if date_to else None
+    if date_from and date_to and date_from > date_to:
+        raise ValueError("Rango de fechas invertido")
+    if status and status not in dict(Invoice.STATUS_CHOICES):
+        raise ValueError(f"Estado desconocido: {status}")
+    return date_from, date_to, status or None
+
+
+def archive_queryset(date_from=None, date_to=None, status=None):
+    """
+    Facturas emitidas entre dos fechas (inclusive, en hora local) y/o con un estado,
+    en orden de emisión (índice invoice_issued_idx).
+    """
+    invoices = Invoice.objects.order_by('issued_at', 'pk')
+    tz = timezone.get_current_timezone()
+    if date_from:
+        invoices = invoices.filter(issued_at__gte=timezone.make_aware(datetime.combine(date_from, day_start.min), tz))
+    if date_to:
+        next_day = datetime.combine(date_to + timedelta(days=1), day_start.min)
+        invoices = invoices.filter(issued_at__lt=timezone.make_aware(next_day, tz))
+    if status:
+        invoices = invoices.filter(status=status)
+    return invoices
+
+
+def archive_name(date_from=None, date_to=None, status=None):
+    parts = ['facturas', str(date_from or 'inicio'), str(date_to or 'hoy')] + ([status.lower()] if status else [])
+    return '_'.join(parts) + '.zip'
+
+
+class ZipSink:
+    """
+    Destino del ZipFile sin seek: guarda lo escrito hasta que el generador lo entrega
+    (drain). Al no poder volver atrás, zipfile escribe cada entrada con descriptor de
+    datos y el archivo nunca se arma completo en memoria.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+class ArchiveStats:
+    """Contadores, ritmo y memoria máxima de una exportación."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.invoices = self.rendered = self.bytes = 0
+
+    def as_dict(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            'invoices': self.invoices, 'rendered': self.rendered, 'bytes': self.bytes,
+            'seconds': round(elapsed, 2), 'invoices_per_second': round(self.invoices / elapsed) if elapsed else 0,
+            # ru_maxrss en KB (Linux): este proceso y el mayor de los procesos hijos (pool)
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024,
+            'workers_peak_rss_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // 1024,
+        }
+
+
+def invoice_chunks(queryset, chunk_size):
+    """Lotes de facturas listas para imprimir; los ids se leen con un cursor del servidor."""
+    ids = queryset.values_list('pk', flat=True).iterator(chunk_size=chunk_size)
+    chunk = []
+    for pk in ids:
+        chunk.append(pk)
+        if len(chunk) == chunk_size:
+            yield load(chunk)
+            chunk = []
+    if chunk:
+        yield load(chunk)
+
+
+def load(ids):
+    invoices = rendering.with_content(Invoice.objects.filter(pk__in=ids)).in_bulk()
+    return [invoices[pk] for pk in ids if pk in invoices]
+
+
+def prepare(invoices, executor):
+    """(factura, huella, generación) por factura; generación None si el PDF guardado sirve."""
+    work = []
+    for invoice in invoices:
+        content = rendering.invoice_content(invoice)
+        digest = rendering.content_hash(content)
+        render = None if rendering.is_current(invoice, digest) else rendering.schedule(content, executor)
+        work.append((invoice, digest, render))
+    return work
+
+
+def archive_stream(queryset, executor=None, chunk_size=ARCHIVE_CHUNK_SIZE, stats=None):
+    """
+    Bytes del ZIP de las facturas de `queryset`: primero el índice CSV (leído con un
+    cursor del servidor) y después el PDF de cada una. Los PDF faltantes o de un
+    contenido anterior se generan y se guardan (en el pool si hay `executor`: el lote
+    siguiente se genera mientras se escribe el actual). En memoria quedan dos lotes de
+    facturas y el directorio central del ZIP, que se escribe al final.
+    """
+    stats = stats or ArchiveStats()
+    sink = ZipSink()
+
+    def output():
+        data = sink.drain()
+        stats.bytes += len(data)
+        return data
+
+    def entries(work):
+        files = []
+        for invoice, digest, render in work:
+            if render is None:
+                with invoice.pdf_file.storage.open(invoice.pdf_file.name, 'rb') as stored:
+                    data = stored.read()
+            else:
+                data = render()
+                files.append((invoice, digest, rendering.save_file(invoice, digest, data)))
+            archive.writestr(f"facturas/{invoice.invoice_number.replace('/', '-')}.pdf", data)
+            stats.invoices += 1
+            yield output()
+        # Las facturas generadas del lote se actualizan juntas
+        rendering.assign(files)
+        stats.rendered += len(files)
+
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+        rows = queryset.values_list(*INDEX_FIELDS).iterator(chunk_size=chunk_size)
+        with archive.open(INDEX_NAME, 'w') as index:
+            for text in encode_rows(INDEX_COLUMNS, rows, 'csv', chunk_size):
+                index.write(text.encode('utf-8'))
+                yield output()
+
+        previous = []
+        for invoices in invoice_chunks(queryset, chunk_size):
+            work = prepare(invoices, executor)
+            yield from entries(previous)
+            previous = work
+        yield from entries(previous)
+    yield output()
@@ -0,0 +1,185 @@
+import hashlib
+import hmac
+import json
+import os
+import random
+import threading
+import time
+import httpx
+from django.conf import settings
+
+# Estados HTTP que se reintentan: conflicto de idempotencia (la misma clave en curso),
+# límite de ritmo y errores del servidor
+RETRY_STATUSES = {409, 429, 500, 502, 503, 504}
+
+# Antigüedad máxima (segundos) de un webhook firmado: evita que se reenvíe uno capturado
+SIGNATURE_TOLERANCE = 300
+
+
+class GatewayError(Exception):
+    """
+    Error de la pasarela. `retryable`: el pago puede reintentarse más tarde (caída,
+    timeout, límite de ritmo); si no, la pasarela lo rechazó (datos inválidos).
+    """
+
+    def __init__(self, message, status=None, retryable=False):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+
+
+class SignatureError(Exception):
+    """Webhook sin firma válida o fuera de la tolerancia de tiempo."""
+
+
+def backoff(attempt, retry_after=None):
+    """
+    Espera antes del reintento `attempt` (desde 1): exponencial con jitter completo,
+    al azar entre 0 y base * 2^(attempt-1) con tope, para que los clientes que
+    fallaron juntos no reintenten juntos. Un Retry-After de la pasarela manda.
+    """
+    if retry_after is not None:
+        return min(retry_after, settings.PAYMENT_GATEWAY_BACKOFF_MAX)
+    return random.uniform(0, min(settings.PAYMENT_GATEWAY_BACKOFF_MAX, settings.PAYMENT_GATEWAY_BACKOFF * 2 ** (attempt - 1)))
+
+
+def form_fields(data, prefix=''):
+    """Diccionario anidado en la codificación de formularios de Stripe (metadata[clave]=valor)."""
+    fields = []
+    for key, value in data.items():
+        name = f"{prefix}[{key}]" if prefix else key
+        if isinstance(value, dict):
+            fields += form_fields(value, name)
+        elif isinstance(value, bool):
+            fields.append((name, 'true' if value else 'false'))
+        else:
+            fields.append((name, str(value)))
+    return fields
+
+
+class GatewayClient:
+    """
+    Cliente HTTP de la API de Stripe (o del stub local) con UN httpx.Client compartido
+    por los hilos del proceso: sus conexiones se reutilizan (keep-alive) en un pool de
+    PAYMENT_GATEWAY_WORKERS conexiones. Cada llamada tiene timeout de conexión y de
+    lectura, y se reintenta con espera exponencial con jitter.
+    """
+
+    def __init__(self, base_url, api_key, pool_size):
+        # Con todas las conexiones en uso, un hilo espera una libre (hasta el timeout
+        # de lectura) en vez de abrir otra
+        self.client = httpx.Client(
+            base_url=base_url.rstrip('/'),
+            headers={'Authorization': f"Bearer {api_key}"},
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=httpx.Timeout(settings.PAYMENT_GATEWAY_READ_TIMEOUT, connect=settings.PAYMENT_GATEWAY_CONNECT_TIMEOUT),
+        )
+
+    def request(self, method, path, data=None, idempotency_key=None):
+        """
+        Llamada a la API; retorna el JSON. Los POST llevan Idempotency-Key: un reintento
+        (incluso tras un timeout de lectura, cuando la pasarela pudo haberlo procesado)
+        devuelve el mismo objeto en vez de crear otro.
+        """
+        headers = {'Idempotency-Key': idempotency_key} if idempotency_key else {}
+        attempt = 0
+        while True:
+            attempt += 1
+            retry_after = None
+            try:
+                response = self.client.request(method, path, data=dict(form_fields(data or {})) or None, headers=headers)
+            except httpx.TransportError as error:
+                failure = GatewayError(f"{type(error).__name__}: {error}", retryable=True)
+            else:
+                if response.is_success:
+                    return response.json()
+                failure = GatewayError(
+                    error_message(response), status=response.status_code,
+                    retryable=response.status_code in RETRY_STATUSES,
+                )
+                if 'Retry-After' in response.headers:
+                    try:
+                        retry_after = float(response.headers['Retry-After'])
+                    except ValueError:
+                        pass
+            if not failure.retryable or attempt > settings.PAYMENT_GATEWAY_RETRIES:
+                raise failure
+            time.sleep(backoff(attempt, retry_after))
+
+    def create_intent(self, amount, currency, metadata, idempotency_key):
+        """Crea un PaymentIntent por `amount` (Decimal, en unidades; Stripe recibe centavos)."""
+        return self.request('POST', '/v1/payment_intents', {
+            'amount': int(amount * 100),
+            'currency': currency,
+            'metadata': metadata,
+            'automatic_payment_methods': {'enabled': True},
+        }, idempotency_key=idempotency_key)
+
+    def close(self):
+        self.client.close()
+
+
+def error_message(response):
+    try:
+        return response.json()['error']['message']
+    except (ValueError, KeyError, TypeError):
+        return f"HTTP {response.status_code}"
+
+
+class ClientHolder:
+    """
+    Cliente del proceso, creado al primer uso (y de nuevo en un proceso hijo: las
+    conexiones abiertas no se comparten entre procesos).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.client = None
+        self.pid = None
+
+    def get(self):
+        with self.lock:
+            if self.client is None or self.pid != os.getpid():
+                self.client = GatewayClient(
+                    settings.PAYMENT_GATEWAY_URL, settings.STRIPE_SECRET_KEY, settings.PAYMENT_GATEWAY_WORKERS
+                )
+                self.pid = os.getpid()
+            return self.client
+
+    def reset(self):
+        with self.lock:
+            if self.client is not None and self.pid == os.getpid():
+                self.client.close()
+            self.client = None
+
+
+client = ClientHolder()
+
+
+def signature_header(payload, secret, timestamp=None):
+    """Cabecera Stripe-Signature de `payload` (bytes): t=<unix>,v1=<HMAC-SHA256 de 't.payload'>."""
+    timestamp = int(timestamp if timestamp is not None else time.time())
+    signed = hmac.new(secret.encode(), f"{timestamp}.".encode() + payload, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signed}"
+
+
+def parse_event(payload, header, secret, tolerance=SIGNATURE_TOLERANCE):
+    """Evento de un webhook (bytes del cuerpo) tras verificar su firma; SignatureError si no es válida."""
+    if not secret or not header:
+        raise SignatureError("Falta la firma o el secreto del webhook")
+    parts = [part.split('=', 1) for part in header.split(',') if '=' in part]
+    timestamps = [value for key, value in parts if key == 't']
+    signatures = [value for key, value in parts if key == 'v1']
+    try:
+        timestamp = int(timestamps[0])
+    except (IndexError, ValueError):
+        raise SignatureError("Firma sin marca de tiempo")
+    expected = signature_header(payload, secret, timestamp).split('v1=', 1)[1]
+    if not any(hmac.compare_digest(expected, signature) for signature in signatures):
+        raise SignatureError("La firma no corresponde al contenido")
+    if abs(time.time() - timestamp) > tolerance:
+        raise SignatureError("Firma fuera de la tolerancia de tiempo")
+    try:
+        return json.loads(payload)
+    except ValueError:
+        raise SignatureError("Contenido inválido")
@@ -0,0 +1,61 @@
+from django.db.models import Exists, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Now
+from api.outbox import handler
+from orders.models import Order
+from .models import Invoice, Payment
+from .recurring import bill_first_periods
+from . import numbering
+
+# Manejadores de los eventos del outbox (ver api/outbox.py) que antes eran señales
+# post_save. Reciben un lote de payloads y pueden repetirse: lo ya facturado o pagado
+# se omite.
+
+
+@handler('order.placed')
+def invoice_orders(payloads):
+    """Factura de cada pedido sin factura, con su total, en UN bulk_create."""
+    orders = list(
+        Order.objects.filter(pk__in=[payload['order'] for payload in payloads], invoice__isnull=True)
+        .order_by('pk').values_list('pk', 'user_id', 'total_price')
+    )
+    if not orders:
+        return
+    numbers = numbering.allocate(len(orders))
+    # ignore_conflicts: la factura de un pedido es única (OneToOne)
+    Invoice.objects.bulk_create([
+        Invoice(order_id=order_id, user_id=user_id, amount=total, status='PENDING', invoice_number=number)
+        for number, (order_id, user_id, total) in zip(numbers, orders)
+    ], ignore_conflicts=True)
+
+
+@handler('contract.created')
+def invoice_first_periods(payloads):
+    """Factura del primer periodo de cada contrato nuevo (todo el contrato si no es recurrente)."""
+    bill_first_periods([payload['contract'] for payload in payloads])
+
+
+def completed_payments():
+    return Payment.objects.filter(invoice=OuterRef('pk'), status='COMPLETED')
+
+
+@handler('payment.completed')
+def mark_invoices_paid(payloads):
+    """
+    Marca pagadas las facturas, con la fecha de su primer pago completado. Se decide
+    por el estado actual de los pagos: un evento repetido después de un reembolso no
+    vuelve a marcarla.
+    """
+    first_payment = completed_payments().order_by('timestamp')
+    Invoice.objects.filter(
+        Exists(completed_payments()), pk__in=[payload['invoice'] for payload in payloads]
+    ).exclude(status='PAID').update(
+        status='PAID', paid_at=Coalesce(Subquery(first_payment.values('timestamp')[:1]), Now())
+    )
+
+
+@handler('payment.refunded')
+def reopen_refunded_invoices(payloads):
+    """Una factura pagada cuyo pago se reembolsó vuelve a quedar pendiente si no le queda otro pago completado."""
+    Invoice.objects.filter(pk__in=[payload['invoice'] for payload in payloads], status='PAID').exclude(
+        Exists(completed_payments())
+    ).update(status='PENDING', paid_at=None)
@@ -0,0 +1,33 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.payments import INTENT_BATCH_SIZE, create_pending_intents, pool
+
+
+class Command(BaseCommand):
+    help = (
+        "Crea los PaymentIntent de los pagos que siguen pendientes (el pool del proceso "
+        "web no llegó a crearlos, p. ej. tras un reinicio o con la pasarela caída), en "
+        "--workers hilos (0 = en este hilo). Con --every queda en ejecución."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.PAYMENT_GATEWAY_WORKERS)
+        parser.add_argument('--batch-size', type=int, default=INTENT_BATCH_SIZE, help="Pagos tomados por lote")
+        parser.add_argument('--every', type=int, default=0, help="Segundos entre corridas (0 = una sola vez)")
+
+    def handle(self, *args, **options):
+        if options['workers'] < 0 or options['batch_size'] < 1:
+            raise CommandError("--workers no puede ser negativo y --batch-size debe ser positivo.")
+        executor = pool.get() if options['workers'] else None
+        try:
+            while True:
+                self.stdout.write(json.dumps(create_pending_intents(options['batch_size'], executor)))
+                if not options['every']:
+                    return
+                time.sleep(options['every'])
+        finally:
+            pool.shutdown()
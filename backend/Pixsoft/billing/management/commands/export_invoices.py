@@ -0,0 +1,47 @@
+import json
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.archive import ARCHIVE_CHUNK_SIZE, ArchiveStats, archive_filters, archive_queryset, archive_stream
+from billing.rendering import executor
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporta en un ZIP los PDF de las facturas emitidas en un rango de fechas y/o "
+        "con un estado, con un índice CSV (número, cliente, monto, estado, fecha de "
+        "pago). Los PDF faltantes o desactualizados se generan en --workers procesos "
+        "(0 = en este proceso). El ZIP se escribe en streaming; al final se informan "
+        "ritmo y memoria máxima."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help="Emitidas desde (AAAA-MM-DD)")
+        parser.add_argument('--to', dest='date_to', help="Emitidas hasta, inclusive (AAAA-MM-DD)")
+        parser.add_argument('--status', help="Estado de las facturas (PENDING, PAID, ...)")
+        parser.add_argument('--workers', type=int, default=settings.INVOICE_PDF_WORKERS)
+        parser.add_argument('--chunk-size', type=int, default=ARCHIVE_CHUNK_SIZE, help="Facturas por lote")
+        parser.add_argument('--file', help="Archivo de destino (por defecto, la salida estándar)")
+
+    def handle(self, *args, **options):
+        try:
+            filters = archive_filters(options['date_from'], options['date_to'], options['status'])
+        except ValueError as error:
+            raise CommandError(f"Filtros inválidos: {error}")
+        if options['workers'] < 0 or options['chunk_size'] < 1:
+            raise CommandError("--workers no puede ser negativo y --chunk-size debe ser positivo.")
+
+        stats = ArchiveStats()
+        pool = executor(options['workers']) if options['workers'] else None
+        target = open(options['file'], 'wb') if options['file'] else sys.stdout.buffer
+        try:
+            for chunk in archive_stream(archive_queryset(*filters), pool, options['chunk_size'], stats):
+                target.write(chunk)
+        finally:
+            if options['file']:
+                target.close()
+            if pool:
+                pool.shutdown()
+        self.stderr.write(json.dumps({**stats.as_dict(), 'workers': options['workers']}))
@@ -0,0 +1,37 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.rendering import RENDER_BATCH_SIZE, executor, render_pending
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera los PDF de facturas pendientes en la cola (los que el pool del proceso "
+        "web no llegó a generar, p. ej. tras un reinicio, y los abandonados en curso). "
+        "--workers procesos en paralelo (0 = en este proceso); con --every queda en "
+        "ejecución."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.INVOICE_PDF_WORKERS)
+        parser.add_argument('--batch-size', type=int, default=RENDER_BATCH_SIZE, help="Trabajos tomados por lote")
+        parser.add_argument('--every', type=int, default=0, help="Segundos entre corridas (0 = una sola vez)")
+
+    def handle(self, *args, **options):
+        if options['workers'] < 0 or options['batch_size'] < 1:
+            raise CommandError("--workers no puede ser negativo y --batch-size debe ser positivo.")
+        pool = executor(options['workers']) if options['workers'] else None
+        try:
+            while True:
+                started = time.perf_counter()
+                counts = render_pending(pool, options['batch_size'])
+                self.stdout.write(json.dumps({**counts, 'seconds': round(time.perf_counter() - started, 2)}))
+                if not options['every']:
+                    return
+                time.sleep(options['every'])
+        finally:
+            if pool:
+                pool.shutdown()
@@ -0,0 +1,67 @@
+import json
+import multiprocessing
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from billing.recurring import BILLING_CHUNK_SIZE, MAX_CUSTOMER_ID, customer_ranges, run
+
+
+def bill_range(args):
+    customer_range, as_of, chunk_size, dry_run = args
+    return customer_range, run(as_of, *customer_range, chunk_size=chunk_size, dry_run=dry_run)
+
+
+def bill_range_in_worker(args):
+    """Proceso hijo: factura un rango de clientes con su propia conexión."""
+    try:
+        return bill_range(args)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Factura los periodos de arrendamiento vencidos hasta una fecha (mensuales y "
+        "anuales: una factura por periodo). Reanudable: repetir la corrida continúa "
+        "desde el último lote confirmado. --workers reparte los clientes por rangos de "
+        "id entre procesos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--as-of', type=date.fromisoformat, help="Fecha de corte (por defecto hoy)")
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument('--chunk-size', type=int, default=BILLING_CHUNK_SIZE, help="Contratos por transacción")
+        parser.add_argument('--dry-run', action='store_true', help="Solo contar lo que se facturaría")
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['chunk_size'] < 1:
+            raise CommandError("--workers y --chunk-size deben ser positivos.")
+        as_of = options['as_of'] or timezone.localdate()
+
+        if options['workers'] == 1:
+            ranges = [(0, MAX_CUSTOMER_ID)]
+        else:
+            ranges = customer_ranges(options['workers'])
+        jobs = [(customer_range, as_of, options['chunk_size'], options['dry_run']) for customer_range in ranges]
+
+        if len(jobs) <= 1:
+            results = [bill_range(job) for job in jobs]
+        else:
+            # Los hijos no heredan conexiones abiertas: cada proceso abre la suya
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(len(jobs)) as pool:
+                results = pool.map(bill_range_in_worker, jobs)
+
+        totals = {'contracts': 0, 'invoices': 0}
+        for (first, last), stats in results:
+            self.stderr.write(f"Clientes {first}-{last}: {json.dumps(stats)}")
+            totals['contracts'] += stats['contracts']
+            totals['invoices'] += stats['invoices']
+        seconds = max((stats['seconds'] for _, stats in results), default=0)
+        self.stdout.write(json.dumps({
+            **totals, 'as_of': str(as_of), 'dry_run': options['dry_run'], 'workers': len(jobs),
+            'seconds': seconds, 'invoices_per_second': round(totals['invoices'] / seconds) if seconds else 0,
+        }))
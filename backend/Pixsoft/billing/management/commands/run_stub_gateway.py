@@ -0,0 +1,38 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from billing.stub_gateway import StubGateway
+
+
+class Command(BaseCommand):
+    help = (
+        "Levanta la pasarela de pagos simulada (API de PaymentIntents de Stripe) para "
+        "desarrollo y benchmarks: PAYMENT_GATEWAY_URL=http://127.0.0.1:<puerto>. Con "
+        "--webhook-url envía los webhooks firmados con STRIPE_WEBHOOK_SECRET al "
+        "confirmar o cancelar un PaymentIntent."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8010)
+        parser.add_argument('--latency', type=float, default=0, help="Milisegundos agregados a cada llamada")
+        parser.add_argument('--fail-rate', type=float, default=0, help="Fracción de llamadas que responden 500")
+        parser.add_argument('--webhook-url', help="p. ej. http://127.0.0.1:8000/api/v1/billing/webhook/")
+
+    def handle(self, *args, **options):
+        stub = StubGateway(
+            options['port'], options['latency'] / 1000, options['fail_rate'],
+            webhook_url=options['webhook_url'], webhook_secret=settings.STRIPE_WEBHOOK_SECRET,
+        ).start()
+        self.stdout.write(f"Pasarela simulada en {stub.url}")
+        try:
+            while True:
+                time.sleep(60)
+                self.stdout.write(json.dumps({
+                    'requests': stub.requests, 'connections': stub.connections,
+                    'intents': len(stub.intents), 'webhook_errors': stub.webhook_errors,
+                }))
+        except KeyboardInterrupt:
+            stub.stop()
@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-18 07:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0001_initial'),
+        ('leasing', '0004_keyset_indexes'),
+        ('orders', '0004_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['issued_at', 'id'], name='invoice_issued_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['user', 'issued_at', 'id'], name='invoice_user_issued_idx'),
+        ),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 6.0 on 2026-10-18 17:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Las facturas de arrendamiento existentes cubren todo su contrato
+BACKFILL_PERIODS_SQL = '''
+UPDATE billing_invoice i
+SET period_start = c.start_date, period_end = c.end_date
+FROM leasing_rentalcontract c
+WHERE i.rental_contract_id = c.id AND i.period_start IS NULL;
+'''
+
+# Números de factura: reserve_invoice_numbers(n) toma n valores consecutivos de la
+# secuencia. El candado consultivo (de sesión, liberado al terminar la función) evita
+# que otro nextval() se intercale entre nextval() y setval() dentro de un bloque.
+INVOICE_NUMBERS_SQL = '''
+CREATE SEQUENCE billing_invoice_number_seq AS bigint;
+
+CREATE FUNCTION billing_reserve_invoice_numbers(n integer) RETURNS bigint AS $$
+DECLARE
+    lock_key bigint := 'billing_invoice_number_seq'::regclass::oid;
+    first bigint;
+BEGIN
+    IF n < 1 THEN
+        RAISE EXCEPTION 'Se debe reservar al menos un número de factura';
+    END IF;
+    PERFORM pg_advisory_lock(lock_key);
+    BEGIN
+        first := nextval('billing_invoice_number_seq');
+        IF n > 1 THEN
+            PERFORM setval('billing_invoice_number_seq', first + n - 1);
+        END IF;
+    EXCEPTION WHEN OTHERS THEN
+        PERFORM pg_advisory_unlock(lock_key);
+        RAISE;
+    END;
+    PERFORM pg_advisory_unlock(lock_key);
+    RETURN first;
+END;
+$$ LANGUAGE plpgsql;
+'''
+
+DROP_INVOICE_NUMBERS_SQL = '''
+DROP FUNCTION billing_reserve_invoice_numbers(integer);
+DROP SEQUENCE billing_invoice_number_seq;
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0002_keyset_indexes'),
+        ('leasing', '0008_contract_lifecycle'),
+        ('orders', '0006_dailysalesrollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BillingRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateField(verbose_name='Facturar hasta')),
+                ('customer_from', models.PositiveIntegerField(verbose_name='Desde el cliente')),
+                ('customer_to', models.PositiveIntegerField(verbose_name='Hasta el cliente')),
+                ('cursor', models.PositiveIntegerField(default=0, verbose_name='Último contrato procesado')),
+                ('invoices_created', models.PositiveIntegerField(default=0, verbose_name='Facturas creadas')),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Corridas de Facturación',
+            },
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='period_end',
+            field=models.DateField(blank=True, null=True, verbose_name='Fin del Periodo Facturado'),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='period_start',
+            field=models.DateField(blank=True, null=True, verbose_name='Inicio del Periodo Facturado'),
+        ),
+        migrations.AlterField(
+            model_name='invoice',
+            name='rental_contract',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='invoices', to='leasing.rentalcontract'),
+        ),
+        migrations.RunSQL(BACKFILL_PERIODS_SQL, migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.UniqueConstraint(condition=models.Q(('period_start__isnull', False), ('rental_contract__isnull', False)), fields=('rental_contract', 'period_start'), name='unique_rental_period_invoice'),
+        ),
+        migrations.AddConstraint(
+            model_name='billingrun',
+            constraint=models.UniqueConstraint(fields=('as_of', 'customer_from', 'customer_to'), name='unique_billing_run_range'),
+        ),
+        migrations.RunSQL(INVOICE_NUMBERS_SQL, DROP_INVOICE_NUMBERS_SQL),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-18 18:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0003_recurring_billing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='pdf_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='Huella del PDF'),
+        ),
+        migrations.CreateModel(
+            name='PdfRenderJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64, verbose_name='Huella del contenido')),
+                ('status', models.CharField(choices=[('PENDING', 'Pendiente'), ('RUNNING', 'Generando'), ('DONE', 'Listo'), ('FAILED', 'Fallido')], default='PENDING', max_length=20)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('invoice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pdf_jobs', to='billing.invoice')),
+            ],
+            options={
+                'verbose_name_plural': 'Generaciones de PDF',
+                'indexes': [models.Index(fields=['status', 'created_at'], name='pdfjob_status_created_idx')],
+                'constraints': [models.UniqueConstraint(fields=('invoice', 'content_hash'), name='unique_invoice_pdf_content')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-18 19:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0004_invoice_pdf_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='client_secret',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='gateway_error',
+            field=models.TextField(blank=True, verbose_name='Último error de la pasarela'),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Procesando'), ('REQUIRES_PAYMENT', 'Esperando Pago'), ('COMPLETED', 'Completado'), ('FAILED', 'Fallido'), ('CANCELED', 'Cancelado'), ('REFUNDED', 'Reembolsado')], default='PENDING', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['transaction_id'], name='payment_transaction_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['timestamp'], name='payment_pending_idx'),
+        ),
+    ]
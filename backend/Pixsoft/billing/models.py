@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from orders.models import Order
 from leasing.models import RentalContract
+from .numbering import next_number
 
 User = get_user_model()
 
@@ -20,7 +21,10 @@ class Invoice(models.Model):
     
     # Relaciones opcionales: una factura puede ser de una Orden O de un Contrato
     order = models.OneToOneField(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='invoice')
-    rental_contract = models.OneToOneField(RentalContract, on_delete=models.SET_NULL, null=True, blank=True, related_name='invoice')
+    # Un contrato mensual o anual se factura por periodos: una factura por periodo (ver billing/recurring.py)
+    rental_contract = models.ForeignKey(RentalContract, on_delete=models.SET_NULL, null=True, blank=True, related_name='invoices')
+    period_start = models.DateField(null=True, blank=True, verbose_name="Inicio del Periodo Facturado")
+    period_end = models.DateField(null=True, blank=True, verbose_name="Fin del Periodo Facturado")
     
     invoice_number = models.CharField(max_length=50, unique=True, editable=False)
     amount = models.DecimalField(max_digits=12, decimal_places=2)
@@ -31,12 +35,29 @@ class Invoice(models.Model):
     paid_at = models.DateTimeField(null=True, blank=True)
     
     pdf_file = models.FileField(upload_to='invoices/', null=True, blank=True)
+    # Huella del contenido impreso en pdf_file (ver billing/rendering.py): si coincide
+    # con la del contenido actual, el PDF guardado sigue vigente y no se regenera
+    pdf_hash = models.CharField(max_length=64, blank=True, editable=False, verbose_name="Huella del PDF")
+
+    class Meta:
+        indexes = [
+            # Listados paginados por cursor (staff: todas; cliente: las suyas)
+            models.Index(fields=['issued_at', 'id'], name='invoice_issued_idx'),
+            models.Index(fields=['user', 'issued_at', 'id'], name='invoice_user_issued_idx'),
+        ]
+        constraints = [
+            # Un periodo de un contrato se factura una sola vez (corridas repetidas o en paralelo)
+            models.UniqueConstraint(
+                fields=['rental_contract', 'period_start'], name='unique_rental_period_invoice',
+                condition=models.Q(rental_contract__isnull=False, period_start__isnull=False),
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.invoice_number:
-            # Generar número de factura simple: INV-TIMESTAMP-USERID
-            import time
-            self.invoice_number = f"INV-{int(time.time())}-{self.user.id}"
+            # Número de la secuencia de facturas (ver billing/numbering.py): único aunque
+            # el mismo cliente reciba varias facturas en el mismo segundo
+            self.invoice_number = next_number()
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -53,19 +74,93 @@ class Payment(models.Model):
         ('TRANSFER', 'Transferencia'),
     )
     
+    # Las transiciones permitidas están en billing/payments.py (TRANSITIONS): después de
+    # crear el PaymentIntent, el estado lo mueven los webhooks de la pasarela
     STATUS_CHOICES = (
         ('PENDING', 'Procesando'),
+        ('REQUIRES_PAYMENT', 'Esperando Pago'),
         ('COMPLETED', 'Completado'),
         ('FAILED', 'Fallido'),
+        ('CANCELED', 'Cancelado'),
         ('REFUNDED', 'Reembolsado'),
     )
 
     invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='payments')
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     method = models.CharField(max_length=20, choices=METHOD_CHOICES, default='CARD')
+    # Id del PaymentIntent en la pasarela
     transaction_id = models.CharField(max_length=100, blank=True, null=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
     timestamp = models.DateTimeField(auto_now_add=True)
+    # Secreto del PaymentIntent con el que el frontend confirma el pago (Stripe.js)
+    client_secret = models.CharField(max_length=255, blank=True)
+    gateway_error = models.TextField(blank=True, verbose_name="Último error de la pasarela")
+
+    class Meta:
+        indexes = [
+            # Webhooks: el pago de un PaymentIntent
+            models.Index(fields=['transaction_id'], name='payment_transaction_idx'),
+            # Pagos cuyo PaymentIntent falta crear (comando create_payment_intents)
+            models.Index(fields=['timestamp'], name='payment_pending_idx', condition=models.Q(status='PENDING')),
+        ]
 
     def __str__(self):
         return f"Pago {self.id} - {self.invoice.invoice_number} - {self.status}"
+
+class PdfRenderJob(models.Model):
+    """
+    Generación pendiente del PDF de una factura para un contenido dado (huella
+    content_hash). La cola es esta tabla: la vista encola y el pool de procesos
+    (o el comando render_invoice_pdfs) toma los trabajos pendientes.
+    """
+    STATUS_CHOICES = (
+        ('PENDING', 'Pendiente'),
+        ('RUNNING', 'Generando'),
+        ('DONE', 'Listo'),
+        ('FAILED', 'Fallido'),
+    )
+
+    invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='pdf_jobs')
+    content_hash = models.CharField(max_length=64, verbose_name="Huella del contenido")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = "Generaciones de PDF"
+        indexes = [
+            # Cola: pendientes (y en curso abandonados) en orden de llegada
+            models.Index(fields=['status', 'created_at'], name='pdfjob_status_created_idx'),
+        ]
+        constraints = [
+            # Pedir dos veces el mismo contenido reutiliza el trabajo
+            models.UniqueConstraint(fields=['invoice', 'content_hash'], name='unique_invoice_pdf_content'),
+        ]
+
+    def __str__(self):
+        return f"PDF de {self.invoice_id} ({self.content_hash[:12]}) - {self.status}"
+
+class BillingRun(models.Model):
+    """
+    Avance de una corrida de facturación recurrente para un rango de clientes: el
+    cursor es el último contrato procesado y se guarda en la misma transacción que
+    sus facturas, así una corrida interrumpida continúa donde quedó.
+    """
+    as_of = models.DateField(verbose_name="Facturar hasta")
+    customer_from = models.PositiveIntegerField(verbose_name="Desde el cliente")
+    customer_to = models.PositiveIntegerField(verbose_name="Hasta el cliente")
+    cursor = models.PositiveIntegerField(default=0, verbose_name="Último contrato procesado")
+    invoices_created = models.PositiveIntegerField(default=0, verbose_name="Facturas creadas")
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = "Corridas de Facturación"
+        constraints = [
+            models.UniqueConstraint(fields=['as_of', 'customer_from', 'customer_to'], name='unique_billing_run_range'),
+        ]
+
+    def __str__(self):
+        return f"Facturación al {self.as_of} (clientes {self.customer_from}-{self.customer_to})"
@@ -0,0 +1,71 @@
+import os
+import threading
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+# Secuencia de PostgreSQL de los números de factura; la función de la migración
+# 0003 reserva bloques contiguos de ella (ver reserve())
+SEQUENCE = 'billing_invoice_number_seq'
+
+
+def reserve(count):
+    """
+    Reserva `count` números consecutivos en UNA llamada a la base y retorna el rango.
+    Las secuencias no son transaccionales: un bloque reservado no se reutiliza aunque
+    la transacción que lo pidió se revierta.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT billing_reserve_invoice_numbers(%s)", [count])
+        first = cursor.fetchone()[0]
+    return range(first, first + count)
+
+
+def format_number(number, year=None):
+    """
+    Número de factura con el formato configurado (INVOICE_NUMBER_FORMAT), p. ej.
+    '{prefix}-{year}-{number:08d}' -> INV-2026-00000042. El contador es global: el
+    año es informativo y el número sigue siendo único aunque el formato cambie.
+    """
+    return settings.INVOICE_NUMBER_FORMAT.format(
+        prefix=settings.INVOICE_NUMBER_PREFIX, year=year or timezone.localdate().year, number=number
+    )
+
+
+class NumberBlock:
+    """
+    Bloque de números reservado por este proceso: las facturas individuales toman el
+    siguiente número del bloque y solo se consulta la secuencia al agotarlo (cada
+    INVOICE_NUMBER_BLOCK_SIZE facturas). Dentro del bloque los números se entregan
+    en orden y sin saltos; entre procesos los bloques no se intercalan.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.numbers = iter(())
+        self.pid = None
+
+    def next(self):
+        with self.lock:
+            # Un proceso hijo (fork) no debe seguir usando el bloque de su padre
+            if self.pid != os.getpid():
+                self.numbers, self.pid = iter(()), os.getpid()
+            number = next(self.numbers, None)
+            if number is None:
+                self.numbers = iter(reserve(settings.INVOICE_NUMBER_BLOCK_SIZE))
+                number = next(self.numbers)
+            return number
+
+
+block = NumberBlock()
+
+
+def next_number():
+    """Siguiente número de factura formateado, tomado del bloque del proceso."""
+    return format_number(block.next())
+
+
+def allocate(count):
+    """Números formateados para `count` facturas de un lote, de un solo bloque contiguo."""
+    year = timezone.localdate().year
+    return [format_number(number, year) for number in reserve(count)]
@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from api import outbox
+from .models import Payment
+from .gateway import GatewayError, client
+
+# Máquina de estados del pago: estado -> estados a los que puede pasar. El pago nace
+# PENDING; al crearse su PaymentIntent espera que el cliente pague (REQUIRES_PAYMENT) y
+# desde ahí lo mueven los webhooks. Un webhook repetido o que llega tarde (p. ej.
+# payment_failed después de succeeded) no es una transición válida y se ignora.
+# Un webhook puede llegar antes de que se registre el PaymentIntent (PENDING -> final).
+TRANSITIONS = {
+    'PENDING': {'REQUIRES_PAYMENT', 'COMPLETED', 'FAILED', 'CANCELED'},
+    'REQUIRES_PAYMENT': {'COMPLETED', 'FAILED', 'CANCELED'},
+    # Tras un rechazo el cliente puede reintentar con otro medio sobre el mismo PaymentIntent
+    'FAILED': {'COMPLETED', 'CANCELED'},
+    'COMPLETED': {'REFUNDED'},
+    'CANCELED': set(),
+    'REFUNDED': set(),
+}
+
+# Eventos de la pasarela -> estado del pago
+EVENT_STATUS = {
+    'payment_intent.succeeded': 'COMPLETED',
+    'payment_intent.payment_failed': 'FAILED',
+    'payment_intent.canceled': 'CANCELED',
+    'charge.refunded': 'REFUNDED',
+}
+
+# Un pago sigue en PENDING sin PaymentIntent pasado este tiempo: el pool no llegó a
+# crearlo (reinicio, pasarela caída) y lo retoma el comando create_payment_intents
+PENDING_GRACE = timedelta(seconds=30)
+
+# Pagos retomados por lote
+INTENT_BATCH_SIZE = 100
+
+
+def transition(lookup, target, **fields):
+    """
+    Pasa a `target` el pago que cumple `lookup` (Q), con `fields`, si la máquina de
+    estados lo permite. Retorna True si cambió, False si no era una transición válida
+    y None si no existe. Al completarse o reembolsarse publica payment.completed o
+    payment.refunded en la misma transacción (el despachador del outbox marca la
+    factura como pagada o la vuelve a dejar pendiente).
+    """
+    with transaction.atomic():
+        payment = Payment.objects.select_for_update().filter(lookup).order_by('pk').first()
+        if payment is None:
+            return None
+        if target not in TRANSITIONS[payment.status]:
+            return False
+        payment.status = target
+        for name, value in fields.items():
+            setattr(payment, name, value)
+        payment.save(update_fields=['status', *fields])
+        if target in ('COMPLETED', 'REFUNDED'):
+            outbox.publish(f"payment.{target.lower()}", payment=payment.pk, invoice=payment.invoice_id)
+    return True
+
+
+def create_intent(payment_id):
+    """
+    Crea el PaymentIntent de un pago PENDING (sin transacción abierta durante la
+    llamada). La clave de idempotencia es el pago: crearlo dos veces (pool y comando,
+    reintentos) devuelve el mismo PaymentIntent. Retorna el desenlace: 'created',
+    'skipped' (ya tenía), 'failed' (la pasarela lo rechazó) o 'retry' (caída o
+    timeout: sigue PENDING y el comando lo retoma).
+    """
+    payment = Payment.objects.filter(pk=payment_id, status='PENDING', transaction_id__isnull=True).first()
+    if payment is None:
+        return 'skipped'
+    try:
+        intent = client.get().create_intent(
+            payment.amount, settings.PAYMENT_CURRENCY,
+            {'payment': payment.pk, 'invoice': payment.invoice_id}, idempotency_key=f"payment-{payment.pk}",
+        )
+    except GatewayError as error:
+        if error.retryable:
+            Payment.objects.filter(pk=payment.pk).update(gateway_error=str(error))
+            return 'retry'
+        transition(Q(pk=payment.pk), 'FAILED', gateway_error=str(error))
+        return 'failed'
+    fields = {'transaction_id': intent['id'], 'client_secret': intent.get('client_secret') or '', 'gateway_error': ''}
+    if not transition(Q(pk=payment.pk), 'REQUIRES_PAYMENT', **fields):
+        # Un webhook ya lo movió: solo se registra el PaymentIntent
+        Payment.objects.filter(pk=payment.pk, transaction_id__isnull=True).update(**fields)
+    return 'created'
+
+
+def create_intent_in_thread(payment_id):
+    """Tarea del pool: corre en uno de sus hilos, con su propia conexión."""
+    try:
+        return create_intent(payment_id)
+    finally:
+        connections.close_all()
+
+
+class IntentPool:
+    """
+    Pool de hilos del proceso web que crea los PaymentIntent fuera del hilo de la
+    petición (PAYMENT_GATEWAY_WORKERS hilos, tantos como conexiones HTTP del cliente).
+    Se crea al primer uso y de nuevo en un proceso hijo.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.executor = None
+        self.pid = None
+
+    def get(self):
+        with self.lock:
+            if self.executor is None or self.pid != os.getpid():
+                self.executor = ThreadPoolExecutor(settings.PAYMENT_GATEWAY_WORKERS, thread_name_prefix='payment-intents')
+                self.pid = os.getpid()
+            return self.executor
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None and self.pid == os.getpid():
+                self.executor.shutdown()
+            self.executor = None
+
+
+pool = IntentPool()
+
+
+def request_intent(payment):
+    """
+    Envía al pool el PaymentIntent de un pago recién creado, al confirmar la
+    transacción: la petición no espera a la pasarela (PAYMENT_INTENTS_ASYNC). Sin el
+    pool la vista llama a create_intent() después de confirmar.
+    """
+    transaction.on_commit(lambda: pool.get().submit(create_intent_in_thread, payment.pk))
+
+
+def handle_event(event):
+    """
+    Aplica un evento de la pasarela (webhook ya verificado). El pago se busca por su
+    PaymentIntent o por la metadata con la que se creó. Retorna lo mismo que
+    transition(); False si el evento no mueve pagos.
+    """
+    target = EVENT_STATUS.get(event.get('type'))
+    if target is None:
+        return False
+    data = event.get('data', {}).get('object', {})
+    intent_id = data.get('payment_intent') if data.get('object') == 'charge' else data.get('id')
+    payment_id = (data.get('metadata') or {}).get('payment')
+    lookup = Q(transaction_id=intent_id) if intent_id else Q(pk__in=[])
+    if payment_id and str(payment_id).isdigit():
+        lookup |= Q(pk=int(payment_id))
+    fields = {'transaction_id': intent_id} if intent_id else {}
+    if target == 'FAILED':
+        fields['gateway_error'] = (data.get('last_payment_error') or {}).get('message', '')
+    return transition(lookup, target, **fields)
+
+
+def create_pending_intents(batch_size=INTENT_BATCH_SIZE, executor=None, now=None):
+    """
+    Crea los PaymentIntent de los pagos que siguen PENDING pasado PENDING_GRACE, por
+    lotes en orden de llegada, en los hilos de `executor` si hay (si no, en este hilo).
+    Cada pago se intenta una vez por corrida. Retorna los desenlaces.
+    """
+    before = (now or timezone.now()) - PENDING_GRACE
+    counts = {'created': 0, 'skipped': 0, 'failed': 0, 'retry': 0}
+    started = time.perf_counter()
+    last = 0
+    while True:
+        ids = list(
+            Payment.objects.filter(status='PENDING', transaction_id__isnull=True, timestamp__lt=before, pk__gt=last)
+            .order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        last = ids[-1]
+        outcomes = executor.map(create_intent_in_thread, ids) if executor else map(create_intent, ids)
+        for outcome in outcomes:
+            counts[outcome] += 1
+    return {**counts, 'seconds': round(time.perf_counter() - started, 2)}
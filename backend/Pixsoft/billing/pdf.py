@@ -0,0 +1,72 @@
+"""
+Diseño del PDF de una factura con ReportLab. Trabaja solo con datos planos (ver
+rendering.invoice_content) y no importa Django: se ejecuta en los procesos del pool
+de generación, que no abren conexiones a la base.
+"""
+from io import BytesIO
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+# Forma parte de la huella del contenido: cambiar el diseño invalida los PDF guardados
+LAYOUT_VERSION = 1
+
+# Alto mínimo antes de pasar las líneas a una página nueva
+BOTTOM_MARGIN = 80
+
+
+def render(content):
+    """Bytes del PDF. Sin fecha de creación ni id aleatorio: mismo contenido, mismo archivo."""
+    buffer = BytesIO()
+    p = canvas.Canvas(buffer, pagesize=letter, invariant=1)
+    width, height = letter
+
+    # Encabezado
+    p.setFont("Helvetica-Bold", 20)
+    p.drawString(50, height - 50, f"Factura #{content['number']}")
+
+    p.setFont("Helvetica", 12)
+    p.drawString(50, height - 80, f"Fecha: {content['issued_at']}")
+    p.drawString(50, height - 100, f"Cliente: {content['customer']}")
+    p.drawString(50, height - 120, f"Email: {content['email']}")
+
+    # Detalles
+    y = height - 160
+    p.drawString(50, y, "Descripción")
+    p.drawString(400, y, "Monto")
+    y -= 20
+    p.line(50, y, 500, y)
+    y -= 20
+
+    for description, amount in content['lines']:
+        if y < BOTTOM_MARGIN:
+            p.showPage()
+            p.setFont("Helvetica", 12)
+            y = height - 50
+        p.drawString(50, y, description)
+        p.drawString(400, y, f"${amount}")
+        y -= 20
+
+    if y < BOTTOM_MARGIN + 90:
+        p.showPage()
+        y = height - 50
+
+    # Total
+    y -= 20
+    p.line(50, y, 500, y)
+    y -= 30
+    p.setFont("Helvetica-Bold", 14)
+    p.drawString(300, y, f"Total: ${content['total']}")
+
+    # Estado
+    y -= 40
+    p.setFont("Helvetica-Oblique", 12)
+    if content['status'] == 'PAID':
+        p.setFillColorRGB(0, 0.6, 0) # Verde
+        p.drawString(50, y, "ESTADO: PAGADO")
+    else:
+        p.setFillColorRGB(0.8, 0, 0) # Rojo
+        p.drawString(50, y, f"ESTADO: {content['status_display'].upper()}")
+
+    p.showPage()
+    p.save()
+    return buffer.getvalue()
@@ -0,0 +1,169 @@
+import time
+from collections import defaultdict
+from datetime import datetime, time as day_start
+from django.db import connection, transaction
+from django.db.models import F, Max, Min
+from django.utils import timezone
+from leasing.models import RentalContract, RentalPlan
+from leasing.utils import PERIOD_DAYS
+from .models import BillingRun, Invoice
+from . import numbering
+
+CONTRACTS = RentalContract._meta.db_table
+PLANS = RentalPlan._meta.db_table
+INVOICES = Invoice._meta.db_table
+
+# Planes que se facturan por periodo; los demás (diario, semanal) en una sola factura
+RECURRING_PERIODS = ('MONTHLY', 'ANNUAL')
+
+# Contratos cuyos periodos vencidos se siguen facturando
+BILLABLE_STATUSES = ('ACTIVE', 'COMPLETED')
+
+# Contratos procesados por transacción
+BILLING_CHUNK_SIZE = 1000
+
+# Último id de cliente posible (rango completo)
+MAX_CUSTOMER_ID = 2 ** 31 - 1
+
+# Periodos de cada contrato con la regla de calculate_rental_cost: n = días // días del
+# periodo (mínimo 1); el último periodo llega hasta end_date. El total del contrato se
+# reparte en partes iguales truncadas a centavos y el último periodo lleva el resto,
+# así la suma de las facturas es exactamente total_cost. Se omiten los periodos que
+# ya tienen factura (o que se solapan con una, como la factura única de los contratos
+# anteriores a la facturación por periodos) y los contratos con las fechas invertidas
+# (datos anteriores a la validación de fechas: daterange() los rechazaría).
+DUE_PERIODS = f"""
+    SELECT c.id, c.customer_id, s.period_start, s.period_end, s.amount
+    FROM {CONTRACTS} c
+    JOIN {PLANS} p ON p.id = c.plan_id
+    LEFT JOIN unnest(%(periods)s::text[], %(days)s::integer[]) AS r(period, days) ON r.period = p.period
+    CROSS JOIN LATERAL (
+        SELECT CASE WHEN r.days IS NULL THEN 1 ELSE greatest(1, (c.end_date - c.start_date) / r.days) END AS n
+    ) AS n
+    CROSS JOIN LATERAL generate_series(0, n.n - 1) AS k
+    CROSS JOIN LATERAL (
+        SELECT c.start_date + k * coalesce(r.days, 0) AS period_start,
+               CASE WHEN k = n.n - 1 THEN c.end_date ELSE c.start_date + (k + 1) * r.days END AS period_end,
+               CASE WHEN k = n.n - 1 THEN c.total_cost - trunc(c.total_cost / n.n, 2) * (n.n - 1)
+                    ELSE trunc(c.total_cost / n.n, 2) END AS amount
+    ) AS s
+    WHERE c.id = ANY(%(contracts)s) AND c.end_date >= c.start_date AND s.period_start <= %(as_of)s
+      AND NOT EXISTS (
+          SELECT 1 FROM {INVOICES} i
+          WHERE i.rental_contract_id = c.id AND i.period_start IS NOT NULL
+            AND (i.period_start = s.period_start
+                 OR daterange(i.period_start, i.period_end) && daterange(s.period_start, s.period_end))
+      )
+    ORDER BY c.id, k
+"""
+
+
+def due_periods(contract_ids, as_of):
+    """Periodos sin facturar que empiezan hasta `as_of`: (contrato, cliente, inicio, fin, monto)."""
+    if not contract_ids:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(DUE_PERIODS, {
+            'contracts': list(contract_ids), 'as_of': as_of,
+            'periods': list(RECURRING_PERIODS), 'days': [PERIOD_DAYS[period] for period in RECURRING_PERIODS],
+        })
+        return cursor.fetchall()
+
+
+def create_invoices(periods):
+    """
+    Facturas de los periodos con UN bulk_create; los números salen de un solo bloque
+    reservado de la secuencia (sin save(): no hay consulta por factura).
+    """
+    if not periods:
+        return []
+    numbers = numbering.allocate(len(periods))
+    tz = timezone.get_current_timezone()
+    return Invoice.objects.bulk_create([
+        Invoice(
+            user_id=customer_id, rental_contract_id=contract_id, amount=amount, status='PENDING',
+            invoice_number=number, period_start=period_start, period_end=period_end,
+            due_date=timezone.make_aware(datetime.combine(period_start, day_start.min), tz),
+        )
+        for number, (contract_id, customer_id, period_start, period_end, amount) in zip(numbers, periods)
+    ])
+
+
+def bill_first_periods(contract_ids):
+    """
+    Facturas del primer periodo de contratos recién creados (todo el contrato si no es
+    recurrente): los periodos que empiezan hasta el inicio de cada contrato, con una
+    consulta por fecha de inicio. Los periodos ya facturados se omiten.
+    """
+    by_start = defaultdict(list)
+    for pk, start_date in RentalContract.objects.filter(pk__in=contract_ids).values_list('pk', 'start_date'):
+        by_start[start_date].append(pk)
+    return [invoice for start_date, ids in by_start.items() for invoice in create_invoices(due_periods(ids, start_date))]
+
+
+class BillingStats:
+    """Contadores y ritmo de una corrida."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.contracts = self.invoices = 0
+        self.amount = 0
+
+    def as_dict(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            'contracts': self.contracts, 'invoices': self.invoices, 'amount': str(self.amount),
+            'seconds': round(elapsed, 2), 'invoices_per_second': round(self.invoices / elapsed) if elapsed else 0,
+        }
+
+
+def run(as_of, customer_from=0, customer_to=MAX_CUSTOMER_ID, chunk_size=BILLING_CHUNK_SIZE, dry_run=False):
+    """
+    Factura los periodos vencidos hasta `as_of` de los contratos de los clientes
+    [customer_from, customer_to], por lotes de contratos en orden de id. Cada lote
+    (facturas + cursor) es una transacción: si la corrida se interrumpe, volver a
+    ejecutarla continúa desde el último lote confirmado. Con dry_run solo cuenta.
+    """
+    stats = BillingStats()
+    billing_run = BillingRun.objects.filter(as_of=as_of, customer_from=customer_from, customer_to=customer_to).first()
+    if billing_run is None and not dry_run:
+        billing_run = BillingRun.objects.create(as_of=as_of, customer_from=customer_from, customer_to=customer_to)
+    if billing_run and billing_run.finished_at:
+        return {**stats.as_dict(), 'finished': True}
+    cursor = billing_run.cursor if billing_run else 0
+
+    contracts = RentalContract.objects.filter(
+        customer_id__gte=customer_from, customer_id__lte=customer_to,
+        status__in=BILLABLE_STATUSES, start_date__lte=as_of,
+    ).order_by('pk').values_list('pk', flat=True)
+    while True:
+        chunk = list(contracts.filter(pk__gt=cursor)[:chunk_size])
+        if not chunk:
+            break
+        cursor = chunk[-1]
+        with transaction.atomic():
+            periods = due_periods(chunk, as_of)
+            if not dry_run:
+                create_invoices(periods)
+                BillingRun.objects.filter(pk=billing_run.pk).update(
+                    cursor=cursor, invoices_created=F('invoices_created') + len(periods)
+                )
+        stats.contracts += len(chunk)
+        stats.invoices += len(periods)
+        stats.amount += sum(period[4] for period in periods)
+
+    if not dry_run:
+        BillingRun.objects.filter(pk=billing_run.pk).update(finished_at=timezone.now())
+    return {**stats.as_dict(), 'finished': not dry_run}
+
+
+def customer_ranges(workers):
+    """Rangos contiguos de ids de cliente (con contratos) para repartir la corrida entre procesos."""
+    low, high = (
+        RentalContract.objects.filter(status__in=BILLABLE_STATUSES)
+        .aggregate(low=Min('customer_id'), high=Max('customer_id')).values()
+    )
+    if low is None:
+        return []
+    step = -(-(high - low + 1) // workers)
+    return [(first, min(first + step - 1, high)) for first in range(low, high + 1, step)]
@@ -0,0 +1,271 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from functools import partial
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, connections, transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from orders.models import OrderItem
+from .models import Invoice, PdfRenderJob
+from . import pdf
+
+# Trabajos tomados por lote al vaciar la cola (comando render_invoice_pdfs)
+RENDER_BATCH_SIZE = 200
+
+# Un trabajo que sigue en RUNNING después de esto quedó abandonado (proceso caído)
+STALE_AFTER = timedelta(minutes=10)
+
+
+def with_content(queryset):
+    """
+    Facturas con todo lo que imprime el PDF en un número fijo de consultas: cliente,
+    pedido y contrato con JOIN; los ítems de todos los pedidos en UNA consulta y sus
+    productos (relación genérica) en una por tipo de producto.
+    """
+    return queryset.select_related('user', 'order', 'rental_contract__product').prefetch_related(
+        Prefetch('order__items', queryset=OrderItem.objects.prefetch_related('product').order_by('pk'))
+    )
+
+
+def invoice_content(invoice):
+    """Datos planos que imprime el PDF de la factura (cargada con with_content)."""
+    lines = []
+    if invoice.order:
+        for item in invoice.order.items.all():
+            name = item.product.name if item.product else "Producto eliminado"
+            lines.append((f"{name} (x{item.quantity})", f"{item.total_price}"))
+    contract = invoice.rental_contract
+    if contract:
+        if invoice.period_start:
+            # Factura de un periodo (ver billing/recurring.py)
+            lines.append((
+                f"Alquiler: {contract.product.name} ({invoice.period_start} a {invoice.period_end})", f"{invoice.amount}"
+            ))
+        else:
+            lines.append((f"Alquiler: {contract.product.name}", f"{contract.total_cost}"))
+    return {
+        'layout': pdf.LAYOUT_VERSION,
+        'number': invoice.invoice_number,
+        'issued_at': timezone.localtime(invoice.issued_at).strftime('%Y-%m-%d %H:%M'),
+        'customer': invoice.user.username,
+        'email': invoice.user.email,
+        'lines': lines,
+        'total': f"{invoice.amount}",
+        'status': invoice.status,
+        'status_display': invoice.get_status_display(),
+    }
+
+
+def content_hash(content):
+    """Huella (sha256) del contenido: identifica el archivo y decide si hay que regenerarlo."""
+    raw = json.dumps(content, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def file_name(digest):
+    return f"invoices/{digest}.pdf"
+
+
+def is_current(invoice, digest):
+    """El PDF guardado de la factura corresponde al contenido con huella `digest`."""
+    return bool(invoice.pdf_file) and invoice.pdf_hash == digest and invoice.pdf_file.storage.exists(invoice.pdf_file.name)
+
+
+def save_file(invoice, digest, data):
+    """Guarda el PDF con su huella como nombre (si ya existe, es el mismo) y retorna el nombre."""
+    storage = invoice.pdf_file.storage
+    name = file_name(digest)
+    if not storage.exists(name):
+        name = storage.save(name, ContentFile(data))
+    return name
+
+
+def assign(files):
+    """
+    Asigna a cada factura su archivo (lista de (factura, huella, nombre)) con UN
+    UPDATE ... FROM unnest directo: no pisa cambios hechos a las facturas mientras se
+    generaban. Los archivos de contenidos anteriores ya no sirven y se borran.
+    """
+    if not files:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE {Invoice._meta.db_table} i SET pdf_file = f.name, pdf_hash = f.digest
+            FROM unnest(%s::bigint[], %s::text[], %s::text[]) AS f(id, digest, name)
+            WHERE i.id = f.id
+        """, [[invoice.pk for invoice, _, _ in files], [digest for _, digest, _ in files], [name for _, _, name in files]])
+    for invoice, digest, name in files:
+        previous = invoice.pdf_file.name
+        if previous and previous != name:
+            invoice.pdf_file.storage.delete(previous)
+        invoice.pdf_file.name, invoice.pdf_hash = name, digest
+
+
+def store(invoice, digest, data):
+    """Guarda el PDF de una factura y se lo asigna."""
+    assign([(invoice, digest, save_file(invoice, digest, data))])
+
+
+def request_pdf(invoice):
+    """
+    PDF del contenido actual de la factura (cargada con with_content). Retorna None
+    si el guardado sigue vigente; si no, el trabajo que lo genera: se encola (o se
+    reutiliza el del mismo contenido) y se envía al pool al confirmar la transacción.
+    """
+    digest = content_hash(invoice_content(invoice))
+    if is_current(invoice, digest):
+        return None
+    job, _ = PdfRenderJob.objects.get_or_create(invoice=invoice, content_hash=digest)
+    if job.status in ('DONE', 'FAILED'):
+        # Reintento tras un error, o el archivo de este contenido ya se reemplazó
+        job.status, job.error, job.started_at, job.finished_at = 'PENDING', '', None, None
+        job.save(update_fields=['status', 'error', 'started_at', 'finished_at'])
+    if job.status == 'PENDING':
+        transaction.on_commit(partial(dispatch, [job.pk]))
+    return job
+
+
+def pending():
+    return PdfRenderJob.objects.filter(status='PENDING').order_by('created_at', 'pk')
+
+
+def claim(jobs):
+    """
+    Pasa a RUNNING los trabajos pendientes de `jobs` (saltando los que otro proceso
+    está tomando) y los retorna con sus facturas cargadas con with_content.
+    """
+    with transaction.atomic():
+        ids = list(jobs.select_for_update(skip_locked=True).values_list('pk', flat=True))
+        PdfRenderJob.objects.filter(pk__in=ids).update(status='RUNNING', started_at=timezone.now())
+    if not ids:
+        return []
+    claimed = list(PdfRenderJob.objects.filter(pk__in=ids).order_by('pk'))
+    invoices = with_content(Invoice.objects.filter(pk__in=[job.invoice_id for job in claimed])).in_bulk()
+    for job in claimed:
+        job.invoice = invoices[job.invoice_id]
+    return claimed
+
+
+def prepare(jobs):
+    """
+    (trabajo, huella, contenido) de cada trabajo tomado, con el contenido actual de la
+    factura (pudo cambiar desde que se encoló); contenido None si el PDF guardado sirve.
+    """
+    work = []
+    for job in jobs:
+        content = invoice_content(job.invoice)
+        digest = content_hash(content)
+        work.append((job, digest, None if is_current(job.invoice, digest) else content))
+    return work
+
+
+def schedule(content, executor=None):
+    """
+    Generación del PDF de `content` como llamable que retorna los bytes: ya enviada al
+    pool si hay `executor` (la llamada espera el resultado), si no, en este proceso.
+    """
+    return executor.submit(pdf.render, content).result if executor else partial(pdf.render, content)
+
+
+def complete(job, digest, render):
+    """
+    Cierra un trabajo con el resultado de `render()` (bytes del PDF; None si no hubo
+    que generarlo): guarda el archivo o registra el error. Retorna el desenlace.
+    """
+    outcome = 'cached'
+    try:
+        if render is not None:
+            store(job.invoice, digest, render())
+            outcome = 'rendered'
+    except Exception as error:
+        outcome = 'failed'
+        PdfRenderJob.objects.filter(pk=job.pk).update(
+            status='FAILED', error=f"{type(error).__name__}: {error}", finished_at=timezone.now()
+        )
+    else:
+        PdfRenderJob.objects.filter(pk=job.pk).update(status='DONE', error='', finished_at=timezone.now())
+    return outcome
+
+
+class RenderPool:
+    """
+    Pool de procesos de generación del proceso web (INVOICE_PDF_WORKERS), creado al
+    primer uso y de nuevo en un proceso hijo. Los procesos son 'spawn': no heredan
+    las conexiones ni los hilos del proceso web (solo ejecutan pdf.render).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.executor = None
+        self.pid = None
+
+    def get(self):
+        with self.lock:
+            if self.executor is None or self.pid != os.getpid():
+                self.executor, self.pid = executor(settings.INVOICE_PDF_WORKERS), os.getpid()
+            return self.executor
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None and self.pid == os.getpid():
+                self.executor.shutdown()
+            self.executor = None
+
+
+pool = RenderPool()
+
+
+def executor(workers):
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def complete_in_thread(job, digest, future):
+    """Callback del pool: corre en su hilo de control, con su propia conexión."""
+    try:
+        complete(job, digest, future.result)
+    finally:
+        connections.close_all()
+
+
+def dispatch(job_ids):
+    """
+    Envía al pool los trabajos pendientes (ya confirmados) sin esperar: cada PDF se
+    guarda al terminar. Si el proceso web cae antes, el trabajo queda en RUNNING y el
+    comando render_invoice_pdfs lo reencola pasado STALE_AFTER.
+    """
+    work = prepare(claim(pending().filter(pk__in=job_ids)))
+    for job, digest, content in work:
+        if content is None:
+            complete(job, digest, None)
+        else:
+            pool.get().submit(pdf.render, content).add_done_callback(partial(complete_in_thread, job, digest))
+
+
+def requeue_stale(now=None):
+    """Vuelve a la cola los trabajos que quedaron en RUNNING más de STALE_AFTER."""
+    now = now or timezone.now()
+    return PdfRenderJob.objects.filter(status='RUNNING', started_at__lt=now - STALE_AFTER).update(
+        status='PENDING', started_at=None
+    )
+
+
+def render_pending(executor=None, batch_size=RENDER_BATCH_SIZE):
+    """
+    Vacía la cola por lotes (reencolando antes los trabajos abandonados) y espera a
+    que cada lote termine. Con `executor` (pool de procesos) los PDF de un lote se
+    generan en paralelo; sin él, en este proceso. Retorna los desenlaces.
+    """
+    counts = {'requeued': requeue_stale(), 'rendered': 0, 'cached': 0, 'failed': 0}
+    while True:
+        work = prepare(claim(pending()[:batch_size]))
+        if not work:
+            return counts
+        renders = [None if content is None else schedule(content, executor) for _, _, content in work]
+        for (job, digest, _), render in zip(work, renders):
+            counts[complete(job, digest, render)] += 1
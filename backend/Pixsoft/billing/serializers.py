@@ -2,10 +2,18 @@ from rest_framework import serializers
 from .models import Invoice, Payment
 
 class PaymentSerializer(serializers.ModelSerializer):
+    # Sin client_secret: solo lo recibe el dueño de la factura (PaymentIntentSerializer)
+    class Meta:
+        model = Payment
+        exclude = ('client_secret',)
+        read_only_fields = ('status', 'transaction_id', 'timestamp', 'gateway_error')
+
+class PaymentIntentSerializer(PaymentSerializer):
+    """Pago con el secreto de su PaymentIntent, para el dueño de la factura."""
     class Meta:
         model = Payment
         fields = '__all__'
-        read_only_fields = ('status', 'transaction_id', 'timestamp')
+        read_only_fields = PaymentSerializer.Meta.read_only_fields + ('client_secret',)
 
 class InvoiceSerializer(serializers.ModelSerializer):
     payments = PaymentSerializer(many=True, read_only=True)
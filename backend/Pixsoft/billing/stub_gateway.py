@@ -0,0 +1,191 @@
+import itertools
+import json
+import random
+import secrets
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+from urllib.request import Request, urlopen
+from .gateway import signature_header
+
+# Medios de pago de prueba de Stripe que entiende el stub al confirmar
+DECLINED_METHODS = {'pm_card_chargeDeclined', 'pm_card_visa_chargeDeclined'}
+
+
+def nested(fields):
+    """Campos de formulario estilo Stripe (metadata[clave]) como diccionario anidado."""
+    data = {}
+    for name, value in fields:
+        keys = name.replace(']', '').split('[')
+        target = data
+        for key in keys[:-1]:
+            target = target.setdefault(key, {})
+        target[keys[-1]] = value
+    return data
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1: las conexiones quedan abiertas y el pool del cliente las reutiliza. Sin
+    # Nagle: cabeceras y cuerpo van en escrituras separadas y, con keep-alive, el ACK
+    # demorado del cliente sumaría ~40 ms a cada respuesta
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.stub.lock:
+            self.server.stub.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        intent = self.server.stub.intents.get(self.path.rsplit('/', 1)[-1])
+        if self.path.startswith('/v1/payment_intents/') and intent:
+            return self.reply(200, intent)
+        self.reply(404, {'error': {'message': 'No such payment_intent'}})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        data = nested(parse_qsl(self.rfile.read(length).decode()))
+        status, body, headers = self.server.stub.handle(self.path, data, self.headers)
+        self.reply(status, body, headers)
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # El cliente cortó la conexión (p. ej. por su timeout de lectura): es lo esperado
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class StubGateway:
+    """
+    Servidor local que imita la API de PaymentIntents de Stripe para pruebas y
+    benchmarks (ver el comando run_stub_gateway): crear, consultar, confirmar y
+    cancelar intents, con Idempotency-Key y webhooks firmados. `latency` (segundos)
+    se agrega a cada llamada; `fail_rate` es la fracción de llamadas que responden
+    500 y `failures` las primeras que lo hacen.
+    """
+
+    def __init__(self, port=0, latency=0.0, fail_rate=0.0, failures=0, webhook_url=None, webhook_secret=''):
+        self.latency, self.fail_rate, self.failures = latency, fail_rate, failures
+        self.webhook_url, self.webhook_secret = webhook_url, webhook_secret
+        self.lock = threading.Lock()
+        self.intents = {}
+        self.responses = {}
+        self.ids = itertools.count(1)
+        self.requests = self.connections = self.webhook_errors = 0
+        self.server = StubServer(('127.0.0.1', port), StubHandler)
+        self.server.stub = self
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, path, data, headers):
+        with self.lock:
+            self.requests += 1
+            failing = self.failures > 0 or random.random() < self.fail_rate
+            self.failures = max(self.failures - 1, 0)
+        if self.latency:
+            time.sleep(self.latency)
+        if not headers.get('Authorization', '').startswith('Bearer '):
+            return 401, {'error': {'message': 'Invalid API Key provided'}}, None
+        if failing:
+            return 500, {'error': {'message': 'Stub: error simulado'}}, None
+
+        key = headers.get('Idempotency-Key')
+        with self.lock:
+            if key and key in self.responses:
+                return *self.responses[key], {'Idempotent-Replayed': 'true'}
+            status, body = self.route(path, data)
+            if key:
+                self.responses[key] = (status, body)
+        return status, body, None
+
+    def route(self, path, data):
+        parts = path.strip('/').split('/')
+        if parts == ['v1', 'payment_intents']:
+            return self.create(data)
+        if len(parts) == 4 and parts[:2] == ['v1', 'payment_intents'] and parts[2] in self.intents:
+            intent = self.intents[parts[2]]
+            if parts[3] == 'confirm':
+                return self.confirm(intent, data.get('payment_method', 'pm_card_visa'))
+            if parts[3] == 'cancel':
+                return self.finish(intent, 'canceled', 'payment_intent.canceled')
+        return 404, {'error': {'message': f'Unrecognized request URL (POST: {path})'}}
+
+    def create(self, data):
+        try:
+            amount = int(data['amount'])
+        except (KeyError, ValueError):
+            return 400, {'error': {'message': 'Missing required param: amount.'}}
+        if amount < 50:
+            return 400, {'error': {'message': 'Amount must be at least $0.50 usd'}}
+        intent_id = f"pi_stub_{next(self.ids)}"
+        self.intents[intent_id] = intent = {
+            'id': intent_id, 'object': 'payment_intent', 'amount': amount, 'currency': data.get('currency', 'usd'),
+            'status': 'requires_payment_method', 'client_secret': f"{intent_id}_secret_{secrets.token_hex(8)}",
+            'metadata': data.get('metadata', {}), 'last_payment_error': None,
+        }
+        return 200, intent
+
+    def confirm(self, intent, payment_method):
+        if payment_method in DECLINED_METHODS:
+            intent['last_payment_error'] = {'message': 'Your card was declined.'}
+            return self.finish(intent, 'requires_payment_method', 'payment_intent.payment_failed')
+        return self.finish(intent, 'succeeded', 'payment_intent.succeeded')
+
+    def finish(self, intent, status, event_type):
+        intent['status'] = status
+        self.send_event(event_type, dict(intent))
+        return 200, intent
+
+    def event(self, event_type, data):
+        return {
+            'id': f"evt_stub_{next(self.ids)}", 'object': 'event', 'type': event_type,
+            'created': int(time.time()), 'data': {'object': data},
+        }
+
+    def send_event(self, event_type, data):
+        """Envía el webhook firmado en otro hilo, como la pasarela real (después de responder)."""
+        if not self.webhook_url:
+            return
+        payload = json.dumps(self.event(event_type, data)).encode()
+        request = Request(self.webhook_url, data=payload, method='POST', headers={
+            'Content-Type': 'application/json',
+            'Stripe-Signature': signature_header(payload, self.webhook_secret),
+        })
+        threading.Thread(target=self.post, args=[request], daemon=True).start()
+
+    def post(self, request):
+        try:
+            urlopen(request, timeout=10).close()
+        except OSError:
+            with self.lock:
+                self.webhook_errors += 1
@@ -1,3 +1,644 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import multiprocessing
+import os
+import re
+import tempfile
+import time
+import zipfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections
+from django.test import LiveServerTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+from api import outbox
+from api.models import OutboxEvent
+from leasing.models import RentalCategory, RentalContract, RentalPlan, RentalProduct
+from orders.models import Order
+from products.models import SaleCategory, SaleProduct
+from .gateway import GatewayError
+from .models import BillingRun, Invoice, Payment, PdfRenderJob
+from .stub_gateway import StubGateway
+from . import gateway, numbering, payments, pdf, recurring, rendering, services
 
-# Create your tests here.
+User = get_user_model()
+
+
+class RentalFixtures:
+
+    def make_fleet(self):
+        category = RentalCategory.objects.create(name='Maquinaria')
+        self.product = RentalProduct.objects.create(
+            name='Grúa', description='', sku='GRU-1', stock_quantity=100, category=category
+        )
+        self.plans = {
+            period: RentalPlan.objects.create(product=self.product, period=period, base_price=Decimal('100.00'))
+            for period in ('WEEKLY', 'MONTHLY', 'ANNUAL')
+        }
+
+    def contract(self, period, start, end, total, customer=None, status='ACTIVE'):
+        customer = customer or User.objects.create_user(username=f'cliente{User.objects.count()}')
+        contract = RentalContract.objects.create(
+            customer=customer, product=self.product, plan=self.plans[period], start_date=start, end_date=end,
+            total_cost=Decimal(total), status=status
+        )
+        # El primer periodo lo factura el despachador del outbox
+        outbox.drain()
+        return contract
+
+
+class RecurringBillingTests(RentalFixtures, TestCase):
+    """
+    Pruebas de la facturación por periodos: primer periodo al crear el contrato, los
+    siguientes en la corrida, sin duplicados y reanudable.
+    """
+
+    def setUp(self):
+        self.make_fleet()
+
+    def test_monthly_contract_is_billed_period_by_period(self):
+        # 181 días en plan mensual: 6 periodos de 30 días, el último hasta end_date
+        contract = self.contract('MONTHLY', date(2026, 1, 1), date(2026, 7, 1), '1000.00')
+        first = contract.invoices.get()
+        self.assertEqual((first.period_start, first.period_end, first.amount), (date(2026, 1, 1), date(2026, 1, 31), Decimal('166.66')))
+
+        stats = recurring.run(date(2026, 3, 15))
+        self.assertEqual((stats['contracts'], stats['invoices']), (1, 2))
+        # La misma corrida ya terminó: repetirla no factura de nuevo
+        self.assertEqual(recurring.run(date(2026, 3, 15))['invoices'], 0)
+
+        recurring.run(date(2026, 12, 31))
+        invoices = list(contract.invoices.order_by('period_start'))
+        self.assertEqual(len(invoices), 6)
+        self.assertEqual(sum(invoice.amount for invoice in invoices), Decimal('1000.00'))
+        self.assertEqual((invoices[-1].period_start, invoices[-1].period_end), (date(2026, 5, 31), date(2026, 7, 1)))
+        self.assertEqual(len({invoice.invoice_number for invoice in invoices}), 6)
+
+    def test_non_recurring_and_legacy_contracts_keep_a_single_invoice(self):
+        weekly = self.contract('WEEKLY', date(2026, 1, 1), date(2026, 3, 1), '800.00')
+        legacy = self.contract('ANNUAL', date(2024, 1, 1), date(2026, 1, 1), '2000.00')
+        # Factura única de antes de la facturación por periodos: cubre todo el contrato
+        legacy.invoices.update(period_end=legacy.end_date, amount=legacy.total_cost)
+
+        self.assertEqual(recurring.run(date(2026, 12, 31))['invoices'], 0)
+        self.assertEqual((weekly.invoices.get().period_end, legacy.invoices.count()), (date(2026, 3, 1), 1))
+        with self.assertRaises(IntegrityError):
+            Invoice.objects.create(
+                user=weekly.customer, rental_contract=weekly, amount=1, period_start=date(2026, 1, 1), period_end=date(2026, 2, 1)
+            )
+
+    def test_contracts_with_inverted_dates_are_skipped(self):
+        contract = self.contract('MONTHLY', date(2026, 3, 1), date(2026, 2, 1), '300.00')
+
+        self.assertEqual(recurring.run(date(2026, 12, 31))['invoices'], 0)
+        self.assertFalse(contract.invoices.exists())
+        self.assertFalse(OutboxEvent.objects.filter(attempts__gt=0).exists())
+
+    def test_dry_run_counts_without_writing(self):
+        for _ in range(3):
+            self.contract('MONTHLY', date(2026, 1, 1), date(2026, 12, 27), '1200.00')
+        stats = recurring.run(date(2026, 4, 1), dry_run=True)
+
+        self.assertEqual((stats['contracts'], stats['invoices'], stats['amount']), (3, 9, '900.00'))
+        self.assertEqual(Invoice.objects.count(), 3)
+        self.assertFalse(BillingRun.objects.exists())
+
+    def test_interrupted_run_resumes_from_its_checkpoint(self):
+        contracts = [self.contract('MONTHLY', date(2026, 1, 1), date(2026, 4, 1), '300.00') for _ in range(3)]
+        create_invoices = recurring.create_invoices
+        calls = []
+
+        def fail_on_second_chunk(periods):
+            calls.append(periods)
+            if len(calls) == 2:
+                raise RuntimeError('corte de luz')
+            return create_invoices(periods)
+
+        with mock.patch.object(recurring, 'create_invoices', side_effect=fail_on_second_chunk):
+            with self.assertRaises(RuntimeError):
+                recurring.run(date(2026, 6, 1), chunk_size=1)
+        billing_run = BillingRun.objects.get()
+        self.assertEqual((billing_run.cursor, billing_run.invoices_created), (contracts[0].pk, 2))
+
+        stats = recurring.run(date(2026, 6, 1), chunk_size=1)
+        self.assertEqual((stats['contracts'], stats['invoices']), (2, 4))
+        self.assertEqual([contract.invoices.count() for contract in contracts], [3, 3, 3])
+
+
+class ParallelBillingTests(RentalFixtures, TransactionTestCase):
+    """La corrida repartida entre procesos por rangos de clientes factura cada periodo una vez."""
+
+    def test_workers_split_customers_without_duplicates(self):
+        self.make_fleet()
+        for _ in range(8):
+            # 360 días: 12 periodos, el primero facturado al crear el contrato
+            self.contract('MONTHLY', date(2025, 1, 1), date(2025, 12, 27), '1200.00')
+
+        out = StringIO()
+        call_command('run_billing', '--as-of', '2025-12-31', '--workers', '3', '--chunk-size', '2', stdout=out, stderr=StringIO())
+
+        self.assertIn('"invoices": 88', out.getvalue())
+        self.assertEqual(BillingRun.objects.filter(finished_at__isnull=False).count(), 3)
+        self.assertEqual(Invoice.objects.count(), 96)
+        self.assertEqual(Invoice.objects.values('invoice_number').distinct().count(), 96)
+
+
+def counter(invoice_number):
+    return int(invoice_number.rsplit('-', 1)[1])
+
+
+class InvoiceNumberingTests(TestCase):
+    """Pruebas de la numeración de facturas con la secuencia: formato, bloques y unicidad."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='facturado')
+        # Cada prueba empieza sin bloque reservado
+        patcher = mock.patch.object(numbering, 'block', numbering.NumberBlock())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_same_customer_gets_distinct_numbers_in_the_same_second(self):
+        first = Invoice.objects.create(user=self.user, amount=Decimal('10.00'))
+        second = Invoice.objects.create(user=self.user, amount=Decimal('20.00'))
+
+        self.assertRegex(first.invoice_number, rf'^INV-{date.today().year}-\d{{8}}$')
+        self.assertEqual(counter(second.invoice_number), counter(first.invoice_number) + 1)
+
+    @override_settings(INVOICE_NUMBER_BLOCK_SIZE=5)
+    def test_process_reserves_numbers_by_block(self):
+        # 5 facturas: una sola reserva en la secuencia además de los INSERT
+        with self.assertNumQueries(6):
+            invoices = [Invoice.objects.create(user=self.user, amount=Decimal('1.00')) for _ in range(5)]
+        numbers = [counter(invoice.invoice_number) for invoice in invoices]
+        self.assertEqual(numbers, list(range(numbers[0], numbers[0] + 5)))
+
+        # Lotes: un bloque contiguo del tamaño pedido, después del bloque del proceso
+        batch = [counter(number) for number in numbering.allocate(3)]
+        self.assertEqual(batch, list(range(numbers[-1] + 1, numbers[-1] + 4)))
+
+    @override_settings(INVOICE_NUMBER_FORMAT='{prefix}{year}/{number:06d}', INVOICE_NUMBER_PREFIX='F')
+    def test_format_is_configurable(self):
+        self.assertEqual(numbering.format_number(42, 2026), 'F2026/000042')
+        self.assertRegex(Invoice.objects.create(user=self.user, amount=1).invoice_number, r'^F\d{4}/\d{6}$')
+
+
+def create_invoices_in_child(args):
+    """Proceso hijo: facturas individuales y un lote, con su propia conexión."""
+    user_id, singles, batch = args
+    try:
+        numbers = [Invoice.objects.create(user_id=user_id, amount=Decimal('1.00')).invoice_number for _ in range(singles)]
+        return numbers, numbering.allocate(batch)
+    finally:
+        connections.close_all()
+
+
+class InvoiceNumberingConcurrencyTests(TransactionTestCase):
+    """Miles de facturas creadas por procesos en paralelo: ningún número se repite."""
+    WORKERS = 4
+    SINGLES = 500
+    BATCH = 250
+
+    def test_parallel_processes_never_share_a_number(self):
+        users = [User.objects.create_user(username=f'proceso{i}') for i in range(self.WORKERS)]
+        # El padre ya tiene un bloque: los hijos (fork) no deben reutilizarlo
+        parent = Invoice.objects.create(user=users[0], amount=Decimal('1.00')).invoice_number
+
+        connections.close_all()
+        with multiprocessing.get_context('fork').Pool(self.WORKERS) as pool:
+            results = pool.map(create_invoices_in_child, [(user.pk, self.SINGLES, self.BATCH) for user in users])
+
+        numbers = [parent]
+        for singles, batch in results:
+            numbers += singles + batch
+            counters = [counter(number) for number in batch]
+            self.assertEqual(counters, list(range(counters[0], counters[0] + self.BATCH)))
+        self.assertEqual(len(numbers), 1 + self.WORKERS * (self.SINGLES + self.BATCH))
+        self.assertEqual(len(set(numbers)), len(numbers))
+        self.assertEqual(Invoice.objects.count(), 1 + self.WORKERS * self.SINGLES)
+
+
+class InvoicePdfFixtures:
+
+    def use_temporary_media(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = media.name
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def order_invoice(self, user, lines=1):
+        category, _ = SaleCategory.objects.get_or_create(name='Accesorios')
+        rental_category, _ = RentalCategory.objects.get_or_create(name='Equipos')
+        order = Order.objects.create(user=user, total_price=Decimal('13.00') * lines)
+        for i in range(lines):
+            sale = SaleProduct.objects.create(
+                name=f'Cable {order.pk}-{i}', description='', sku=f'CAB-{order.pk}-{i}',
+                price=Decimal('3.00'), stock_quantity=5, category=category
+            )
+            rental = RentalProduct.objects.create(
+                name=f'Proyector {order.pk}-{i}', description='', sku=f'PRY-{order.pk}-{i}',
+                stock_quantity=2, category=rental_category
+            )
+            order.items.create(product=sale, quantity=1, price_at_purchase=sale.price)
+            order.items.create(product=rental, quantity=1, price_at_purchase=Decimal('10.00'))
+        outbox.drain()
+        return Invoice.objects.get(order=order)
+
+
+class InvoicePdfTests(InvoicePdfFixtures, RentalFixtures, APITestCase):
+    """
+    PDF de facturas: se encola y se genera en segundo plano (202 con URL de estado),
+    se guarda con la huella de su contenido y no se regenera mientras no cambie.
+    """
+
+    def setUp(self):
+        self.use_temporary_media()
+        self.user = User.objects.create_user(username='facturado', email='facturado@example.com')
+        self.client.force_authenticate(user=self.user)
+        self.invoice = self.order_invoice(self.user)
+        self.url = f'/api/v1/billing/invoices/{self.invoice.pk}/generate_pdf/'
+
+    def drain(self):
+        out = StringIO()
+        call_command('render_invoice_pdfs', '--workers', '0', stdout=out)
+        return json.loads(out.getvalue())
+
+    def request_pdf(self):
+        # El envío al pool queda para después de la transacción: aquí no se ejecuta
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(len(callbacks), 1)
+        return response
+
+    def test_pdf_is_rendered_in_background_then_served_from_cache(self):
+        response = self.request_pdf()
+        status_url = response.data['status_url']
+        self.assertEqual((response.data['status'], response['Location']), ('PENDING', status_url))
+        self.assertEqual(self.client.get(status_url).status_code, status.HTTP_202_ACCEPTED)
+
+        self.assertEqual(self.drain()['rendered'], 1)
+        response = self.client.get(status_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.pdf_file.name, f'invoices/{self.invoice.pdf_hash}.pdf')
+
+        # Sin cambios en la factura: el archivo guardado, sin encolar ni generar de nuevo
+        with mock.patch.object(pdf, 'render') as render:
+            response = self.client.get(self.url)
+            self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+            render.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(PdfRenderJob.objects.count(), 1)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Otro contenido (pagada): otra huella, otro archivo; el anterior se borra
+        previous = self.invoice.pdf_file.name
+        Invoice.objects.filter(pk=self.invoice.pk).update(status='PAID')
+        self.request_pdf()
+        self.assertEqual(self.drain()['rendered'], 1)
+        self.invoice.refresh_from_db()
+        self.assertNotEqual(self.invoice.pdf_file.name, previous)
+        self.assertFalse(self.invoice.pdf_file.storage.exists(previous))
+
+    def test_failed_render_is_reported_and_retried(self):
+        status_url = self.request_pdf().data['status_url']
+        with mock.patch.object(pdf, 'render', side_effect=RuntimeError('sin fuentes')):
+            self.assertEqual(self.drain()['failed'], 1)
+
+        response = self.client.get(status_url)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data, {'status': 'FAILED', 'detail': 'RuntimeError: sin fuentes'})
+        # Pedirlo de nuevo reencola el mismo trabajo
+        self.request_pdf()
+        self.assertEqual(self.drain(), {'requeued': 0, 'rendered': 1, 'cached': 0, 'failed': 0, 'seconds': mock.ANY})
+        self.assertEqual(PdfRenderJob.objects.get().status, 'DONE')
+
+    def test_content_is_loaded_with_a_fixed_number_of_queries(self):
+        self.make_fleet()
+        self.contract('MONTHLY', date(2026, 1, 1), date(2026, 7, 1), '600.00', customer=self.user)
+
+        def queries_for_all():
+            with CaptureQueriesContext(connection) as queries:
+                contents = [rendering.invoice_content(invoice) for invoice in rendering.with_content(Invoice.objects.all())]
+            return len(queries), contents
+
+        few, _ = queries_for_all()
+        for _ in range(5):
+            self.order_invoice(self.user, lines=4)
+        many, contents = queries_for_all()
+
+        self.assertEqual(few, many)
+        self.assertEqual(len(contents), 7)
+        self.assertEqual(sum(len(content['lines']) for content in contents), 2 + 1 + 5 * 8)
+        self.assertIn('Alquiler: Grúa (2026-01-01 a 2026-01-31)', [line[0] for content in contents for line in content['lines']])
+
+
+class InvoicePdfPoolTests(InvoicePdfFixtures, TransactionTestCase):
+    """El PDF que encola la vista se genera en el pool de procesos y queda listo sin otra petición."""
+
+    def test_requested_pdf_is_rendered_by_a_worker_process(self):
+        self.use_temporary_media()
+        self.addCleanup(rendering.pool.shutdown)
+        user = User.objects.create_user(username='facturado')
+        invoice = self.order_invoice(user, lines=3)
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        response = client.get(f'/api/v1/billing/invoices/{invoice.pk}/generate_pdf/')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        deadline = time.monotonic() + 60
+        while PdfRenderJob.objects.get().status in ('PENDING', 'RUNNING') and time.monotonic() < deadline:
+            time.sleep(0.1)
+
+        self.assertEqual(PdfRenderJob.objects.get().status, 'DONE')
+        response = client.get(response.data['status_url'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+
+class InvoiceArchiveTests(InvoicePdfFixtures, APITestCase):
+    """
+    Archivo de facturas de un periodo: ZIP en streaming con un PDF por factura
+    (generando solo los faltantes o desactualizados) y el índice CSV.
+    """
+
+    def setUp(self):
+        self.use_temporary_media()
+        self.admin = User.objects.create_user(username='contabilidad', is_staff=True)
+        customer = User.objects.create_user(username='cliente')
+        self.march = [self.order_invoice(customer) for _ in range(3)]
+        self.april = self.order_invoice(customer)
+        for invoice, day in zip(self.march + [self.april], (1, 15, 31, 1)):
+            issued_at = timezone.make_aware(datetime(2026, 3 if invoice in self.march else 4, day, 12))
+            Invoice.objects.filter(pk=invoice.pk).update(issued_at=issued_at)
+        Invoice.objects.filter(pk=self.march[1].pk).update(status='PAID', paid_at=timezone.now())
+        # Una ya tiene su PDF vigente y otra uno de antes de cambiar de estado
+        services.generate_invoice_pdf(self.march[0])
+        services.generate_invoice_pdf(self.march[2])
+        Invoice.objects.filter(pk=self.march[2].pk).update(status='OVERDUE')
+
+    def read(self, content):
+        archive = zipfile.ZipFile(io.BytesIO(content))
+        self.assertIsNone(archive.testzip())
+        index = list(csv.DictReader(io.TextIOWrapper(archive.open('indice.csv'), encoding='utf-8')))
+        pdfs = {name: archive.read(name) for name in archive.namelist() if name.endswith('.pdf')}
+        return index, pdfs
+
+    def test_archive_streams_pdfs_and_index_for_the_period(self):
+        cached = Invoice.objects.get(pk=self.march[0].pk).pdf_file.name
+        self.client.force_authenticate(user=self.admin)
+        self.addCleanup(rendering.pool.shutdown)
+        response = self.client.get('/api/v1/billing/invoices/archive/?from=2026-03-01&to=2026-03-31')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertIn('facturas_2026-03-01_2026-03-31.zip', response['Content-Disposition'])
+        index, pdfs = self.read(b''.join(response.streaming_content))
+
+        numbers = [invoice.invoice_number for invoice in self.march]
+        self.assertEqual([row['invoice_number'] for row in index], numbers)
+        self.assertEqual([row['status'] for row in index], ['PENDING', 'PAID', 'OVERDUE'])
+        self.assertEqual((index[0]['customer'], index[0]['amount'], index[0]['paid_at']), ('cliente', '13.00', ''))
+        self.assertTrue(index[1]['paid_at'])
+        self.assertEqual(sorted(pdfs), sorted(f'facturas/{number}.pdf' for number in numbers))
+        self.assertTrue(all(data.startswith(b'%PDF') for data in pdfs.values()))
+        # Se generaron y guardaron solo los faltantes o desactualizados
+        for invoice in Invoice.objects.filter(pk__in=[invoice.pk for invoice in self.march]):
+            self.assertEqual(invoice.pdf_file.name, f'invoices/{invoice.pdf_hash}.pdf')
+        self.assertEqual(Invoice.objects.get(pk=self.march[0].pk).pdf_file.name, cached)
+        self.assertFalse(Invoice.objects.get(pk=self.april.pk).pdf_hash)
+
+    def test_command_filters_by_status_and_reports_throughput(self):
+        path = os.path.join(tempfile.mkdtemp(dir=self.media_root), 'pagadas.zip')
+        err = StringIO()
+        call_command('export_invoices', '--status', 'PAID', '--workers', '0', '--file', path, stderr=err)
+
+        stats = json.loads(err.getvalue())
+        self.assertEqual((stats['invoices'], stats['rendered']), (1, 1))
+        self.assertEqual(stats['bytes'], os.path.getsize(path))
+        with open(path, 'rb') as archive:
+            index, pdfs = self.read(archive.read())
+        self.assertEqual([row['invoice_number'] for row in index], [self.march[1].invoice_number])
+        self.assertEqual(list(pdfs), [f'facturas/{self.march[1].invoice_number}.pdf'])
+
+    def test_archive_is_for_staff_with_valid_filters(self):
+        self.client.force_authenticate(user=self.march[0].user)
+        self.assertEqual(self.client.get('/api/v1/billing/invoices/archive/').status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=self.admin)
+        for query in ('from=2026-13-01', 'from=2026-04-01&to=2026-03-01', 'status=BORRADOR'):
+            response = self.client.get(f'/api/v1/billing/invoices/archive/?{query}')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class StubGatewayFixtures:
+    """Pasarela simulada local para la clase (con webhooks al servidor de prueba si hay uno)."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        webhook_url = getattr(cls, 'live_server_url', None)
+        cls.stub = StubGateway(
+            webhook_url=webhook_url and f'{webhook_url}/api/v1/billing/webhook/', webhook_secret='whsec_prueba'
+        ).start()
+        cls.addClassCleanup(cls.stub.stop)
+        override = override_settings(
+            PAYMENT_GATEWAY_URL=cls.stub.url, STRIPE_SECRET_KEY='sk_test_prueba', STRIPE_WEBHOOK_SECRET='whsec_prueba',
+            PAYMENT_GATEWAY_BACKOFF=0.001,
+        )
+        override.enable()
+        cls.addClassCleanup(override.disable)
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(gateway.client.reset)
+
+    def webhook(self, event_type, intent, secret='whsec_prueba', timestamp=None):
+        payload = json.dumps(self.stub.event(event_type, intent)).encode()
+        return self.client.post(
+            '/api/v1/billing/webhook/', payload, content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=gateway.signature_header(payload, secret, timestamp),
+        )
+
+
+@override_settings(PAYMENT_INTENTS_ASYNC=False)
+class PaymentGatewayTests(StubGatewayFixtures, APITestCase):
+    """
+    Pasarela de pagos: cliente con reintentos e idempotencia, y pagos que avanzan por
+    su máquina de estados con los webhooks firmados.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='pagador')
+        self.invoice = Invoice.objects.create(user=self.user, amount=Decimal('80.00'), invoice_number='INV-PASARELA-1')
+        self.client.force_authenticate(user=self.user)
+
+    def test_server_errors_are_retried_with_jitter_and_the_same_idempotency_key(self):
+        requests_before, intents_before = self.stub.requests, len(self.stub.intents)
+        self.stub.failures = 2
+        with mock.patch('billing.gateway.time.sleep') as sleep:
+            intent = services.create_payment_intent(Decimal('12.34'), metadata={'payment': 7}, idempotency_key='clave-1')
+            again = services.create_payment_intent(Decimal('12.34'), metadata={'payment': 7}, idempotency_key='clave-1')
+
+        self.assertEqual((intent['amount'], intent['metadata']), (1234, {'payment': '7'}))
+        self.assertEqual(again['id'], intent['id'])
+        self.assertEqual((self.stub.requests - requests_before, len(self.stub.intents) - intents_before), (4, 1))
+        waits = [call.args[0] for call in sleep.call_args_list]
+        self.assertEqual(len(waits), 2)
+        self.assertTrue(0 <= waits[0] <= 0.001 and 0 <= waits[1] <= 0.002)
+
+    def test_timeouts_and_rejections_raise_gateway_errors(self):
+        self.stub.latency = 0.3
+        self.addCleanup(setattr, self.stub, 'latency', 0)
+        with override_settings(PAYMENT_GATEWAY_READ_TIMEOUT=0.05, PAYMENT_GATEWAY_RETRIES=1):
+            with self.assertRaises(GatewayError) as timeout:
+                services.create_payment_intent(Decimal('10.00'))
+        self.assertTrue(timeout.exception.retryable)
+
+        self.stub.latency = 0
+        requests_before = self.stub.requests
+        with self.assertRaises(GatewayError) as rejected:
+            services.create_payment_intent(Decimal('0.10'))
+        self.assertEqual((rejected.exception.status, rejected.exception.retryable), (400, False))
+        self.assertEqual(self.stub.requests - requests_before, 1)
+
+    def test_payment_status_follows_the_gateway_callbacks(self):
+        response = self.client.post('/api/v1/billing/payments/', {
+            'invoice': self.invoice.pk, 'amount': '80.00', 'method': 'CARD'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['status'], 'REQUIRES_PAYMENT')
+        intent = self.stub.intents[response.data['transaction_id']]
+        self.assertEqual(response.data['client_secret'], intent['client_secret'])
+
+        self.assertEqual(self.webhook('payment_intent.payment_failed', intent).data, {'applied': True})
+        self.assertEqual(self.webhook('payment_intent.succeeded', intent).data, {'applied': True})
+        # Repetido o fuera de orden: no cambia nada
+        self.assertEqual(self.webhook('payment_intent.succeeded', intent).data, {'applied': False})
+        self.assertEqual(self.webhook('payment_intent.canceled', intent).data, {'applied': False})
+
+        payment = Payment.objects.get()
+        self.assertEqual(payment.status, 'COMPLETED')
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.status, 'PENDING')
+        outbox.drain()
+        self.invoice.refresh_from_db()
+        self.assertEqual((self.invoice.status, self.invoice.paid_at), ('PAID', payment.timestamp))
+
+        # Reembolso: el cargo apunta al PaymentIntent y la factura vuelve a quedar pendiente
+        charge = {'id': 'ch_prueba', 'object': 'charge', 'payment_intent': intent['id'], 'metadata': intent['metadata']}
+        self.assertEqual(self.webhook('charge.refunded', charge).data, {'applied': True})
+        outbox.drain()
+        self.invoice.refresh_from_db()
+        self.assertEqual((self.invoice.status, self.invoice.paid_at), ('PENDING', None))
+
+    def test_intent_is_created_after_the_payment_transaction_commits(self):
+        depth = len(connection.atomic_blocks)
+        create_intent = gateway.GatewayClient.create_intent
+        depths = []
+
+        def tracked(client, *args, **kwargs):
+            depths.append(len(connection.atomic_blocks))
+            return create_intent(client, *args, **kwargs)
+
+        with mock.patch.object(gateway.GatewayClient, 'create_intent', tracked):
+            response = self.client.post('/api/v1/billing/payments/', {
+                'invoice': self.invoice.pk, 'amount': '80.00', 'method': 'CARD'
+            }, format='json', HTTP_IDEMPOTENCY_KEY='pago-sincrono')
+            replayed = self.client.post('/api/v1/billing/payments/', {
+                'invoice': self.invoice.pk, 'amount': '80.00', 'method': 'CARD'
+            }, format='json', HTTP_IDEMPOTENCY_KEY='pago-sincrono')
+
+        # Sin transacción propia ni la de la Idempotency-Key abiertas durante la llamada
+        self.assertEqual(depths, [depth])
+        self.assertEqual(response.data['status'], 'REQUIRES_PAYMENT')
+        self.assertEqual(replayed['Idempotent-Replayed'], 'true')
+        self.assertEqual(replayed.data['client_secret'], response.data['client_secret'])
+
+    def test_client_secret_is_only_returned_to_the_invoice_owner(self):
+        response = self.client.post('/api/v1/billing/payments/', {
+            'invoice': self.invoice.pk, 'amount': '80.00', 'method': 'CARD'
+        }, format='json')
+        payment = Payment.objects.get(pk=response.data['id'])
+        self.assertEqual(response.data['client_secret'], payment.client_secret)
+        self.assertEqual(self.client.get(f'/api/v1/billing/payments/{payment.pk}/intent/').data['client_secret'], payment.client_secret)
+        self.assertNotIn('client_secret', self.client.get(f'/api/v1/billing/payments/{payment.pk}/').data)
+        self.assertNotIn('client_secret', self.client.get('/api/v1/billing/payments/').data[0])
+
+        # Otro cliente no ve el pago; el staff lo ve, pero sin el secreto
+        self.client.force_authenticate(user=User.objects.create_user(username='ajeno'))
+        self.assertEqual(self.client.get('/api/v1/billing/payments/').data, [])
+        self.assertEqual(self.client.get(f'/api/v1/billing/payments/{payment.pk}/intent/').status_code, 404)
+        self.client.force_authenticate(user=User.objects.create_user(username='cajero', is_staff=True))
+        self.assertEqual(self.client.get(f'/api/v1/billing/payments/{payment.pk}/intent/').status_code, 403)
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get('/api/v1/billing/payments/').status_code, 401)
+
+    def test_webhooks_require_a_valid_recent_signature(self):
+        intent = {'id': 'pi_desconocido', 'object': 'payment_intent', 'metadata': {}}
+        self.assertEqual(self.webhook('payment_intent.succeeded', intent, secret='otro').status_code, 400)
+        stale = self.webhook('payment_intent.succeeded', intent, timestamp=time.time() - 3600)
+        self.assertEqual(stale.status_code, 400)
+        # Firma válida, pero el pago no existe (todavía): la pasarela debe reintentar
+        self.assertEqual(self.webhook('payment_intent.succeeded', intent).status_code, 404)
+
+    def test_command_resumes_payments_left_pending(self):
+        payment = Payment.objects.create(invoice=self.invoice, amount=Decimal('80.00'))
+        Payment.objects.filter(pk=payment.pk).update(timestamp=timezone.now() - timedelta(minutes=5))
+        recent = Payment.objects.create(invoice=self.invoice, amount=Decimal('80.00'))
+        out = StringIO()
+
+        call_command('create_payment_intents', '--workers', '0', stdout=out)
+
+        self.assertEqual(json.loads(out.getvalue())['created'], 1)
+        payment.refresh_from_db()
+        self.assertEqual((payment.status, payment.transaction_id in self.stub.intents), ('REQUIRES_PAYMENT', True))
+        self.assertEqual(Payment.objects.get(pk=recent.pk).status, 'PENDING')
+
+
+class PaymentIntentPoolTests(StubGatewayFixtures, LiveServerTestCase):
+    """
+    Modo asíncrono de punta a punta: la petición no espera a la pasarela, el pool crea
+    el PaymentIntent y el webhook de la pasarela completa el pago.
+    """
+
+    def wait_for(self, payment, status):
+        deadline = time.monotonic() + 10
+        while Payment.objects.get(pk=payment).status != status and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return Payment.objects.get(pk=payment)
+
+    def test_intent_is_created_in_the_background_and_completed_by_webhook(self):
+        self.addCleanup(payments.pool.shutdown)
+        user = User.objects.create_user(username='asincrono')
+        invoice = Invoice.objects.create(user=user, amount=Decimal('25.00'), invoice_number='INV-PASARELA-2')
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        response = client.post('/api/v1/billing/payments/', {
+            'invoice': invoice.pk, 'amount': '25.00', 'method': 'CARD'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'PENDING')
+        self.assertTrue(response['Location'].endswith(f"/api/v1/billing/payments/{response.data['id']}/intent/"))
+
+        payment = self.wait_for(response.data['id'], 'REQUIRES_PAYMENT')
+        self.assertEqual(client.get(response['Location']).data['client_secret'], payment.client_secret)
+        gateway.client.get().request('POST', f'/v1/payment_intents/{payment.transaction_id}/confirm', {
+            'payment_method': 'pm_card_visa'
+        })
+        self.assertEqual(self.wait_for(payment.pk, 'COMPLETED').status, 'COMPLETED')
+        outbox.drain()
+        self.assertEqual(Invoice.objects.get(pk=invoice.pk).status, 'PAID')
@@ -1,57 +1,181 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
-from django.utils import timezone
+from rest_framework.reverse import reverse
+from rest_framework.views import APIView
+from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from .models import Invoice, Payment
-from .serializers import InvoiceSerializer, PaymentSerializer
+from .serializers import InvoiceSerializer, PaymentIntentSerializer, PaymentSerializer
+from .archive import archive_filters, archive_name, archive_queryset, archive_stream
+from . import gateway, payments, rendering
+from api.pagination import KeysetPagination
+from api.idempotency import idempotent
 
 class InvoiceViewSet(viewsets.ModelViewSet):
     serializer_class = InvoiceSerializer
+    # Paginación por cursor sobre (issued_at, id); índices invoice_issued_idx / invoice_user_issued_idx
+    pagination_class = KeysetPagination
+    ordering = ('-issued_at', '-id')
 
     def get_queryset(self):
         user = self.request.user
         if user.is_staff:
-            return Invoice.objects.all().order_by('-issued_at')
-        return Invoice.objects.filter(user=user).order_by('-issued_at')
+            queryset = Invoice.objects.all().order_by('-issued_at')
+        else:
+            queryset = Invoice.objects.filter(user=user).order_by('-issued_at')
+        if self.action in ('generate_pdf', 'pdf_status'):
+            # Ítems y productos en consultas fijas para calcular la huella del contenido
+            queryset = rendering.with_content(queryset)
+        return queryset
 
-    @action(detail=True, methods=['get'])
+    @action(detail=True, methods=['get', 'post'])
     def generate_pdf(self, request, pk=None):
         """
-        Simula la generación de un PDF.
-        En producción, esto usaría ReportLab o WeasyPrint.
+        PDF de la factura. Si el guardado corresponde al contenido actual se entrega
+        directamente; si no, se encola su generación en segundo plano y se responde 202
+        con la URL de estado (pdf_status), que entrega el archivo cuando está listo.
+        """
+        invoice = self.get_object()
+        job = rendering.request_pdf(invoice)
+        if job is None:
+            return self.pdf_response(request, invoice)
+        return self.pending_response(invoice, job)
+
+    @action(detail=True, methods=['get'])
+    def pdf_status(self, request, pk=None):
+        """
+        Estado de la generación del PDF: 202 mientras se genera, el archivo cuando está
+        listo, 409 con status FAILED si la generación falló (generate_pdf la reintenta)
+        y 404 si no se pidió.
         """
         invoice = self.get_object()
-        # Mock response
-        return Response({
-            "message": f"PDF generado para factura {invoice.invoice_number}",
-            "url": "/static/mock_invoice.pdf" # Placeholder
-        })
+        digest = rendering.content_hash(rendering.invoice_content(invoice))
+        if rendering.is_current(invoice, digest):
+            return self.pdf_response(request, invoice)
+        job = invoice.pdf_jobs.filter(content_hash=digest).first()
+        if job is None or job.status == 'DONE':
+            return Response(
+                {"detail": "No hay un PDF en preparación para el contenido actual de la factura."},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        if job.status == 'FAILED':
+            return Response({"status": job.status, "detail": job.error}, status=status.HTTP_409_CONFLICT)
+        return self.pending_response(invoice, job)
+
+    # URL: /api/v1/billing/invoices/archive/?from=AAAA-MM-DD&to=AAAA-MM-DD&status=PAID
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def archive(self, request):
+        """
+        ZIP en streaming con el PDF de cada factura emitida en el rango y/o con el
+        estado pedido, más un índice CSV (número, cliente, monto, estado, fecha de pago).
+        Los PDF faltantes o desactualizados se generan en el pool de procesos.
+        """
+        try:
+            filters = archive_filters(*(request.query_params.get(key) for key in ('from', 'to', 'status')))
+        except ValueError:
+            return Response({"detail": "Filtros inválidos (fechas AAAA-MM-DD y estado de factura)."}, status=status.HTTP_400_BAD_REQUEST)
+        response = StreamingHttpResponse(
+            archive_stream(archive_queryset(*filters), rendering.pool.get()), content_type='application/zip'
+        )
+        response['Content-Disposition'] = f'attachment; filename="{archive_name(*filters)}"'
+        return response
+
+    def pending_response(self, invoice, job):
+        status_url = self.reverse_action('pdf-status', args=[invoice.pk])
+        return Response(
+            {"status": job.status, "status_url": status_url}, status=status.HTTP_202_ACCEPTED,
+            headers={'Location': status_url, 'Retry-After': '1'}
+        )
+
+    def pdf_response(self, request, invoice):
+        # La huella identifica el contenido: sirve como ETag fuerte (304 si el cliente ya lo tiene)
+        etag = quote_etag(invoice.pdf_hash)
+        response = get_conditional_response(request._request, etag=etag)
+        if response is None:
+            response = FileResponse(
+                invoice.pdf_file.open('rb'), content_type='application/pdf',
+                filename=f"factura_{invoice.invoice_number}.pdf"
+            )
+        response['ETag'] = etag
+        return response
 
 class PaymentViewSet(viewsets.ModelViewSet):
-    queryset = Payment.objects.all().order_by('-timestamp')
     serializer_class = PaymentSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        user = self.request.user
+        if user.is_staff:
+            return Payment.objects.all().order_by('-timestamp')
+        return Payment.objects.filter(invoice__user=user).order_by('-timestamp')
 
     def create(self, request, *args, **kwargs):
         """
-        Procesa un pago simulado.
+        Registra un pago y pide su PaymentIntent a la pasarela (ver billing/payments.py).
+        Con PAYMENT_INTENTS_ASYNC responde 202 sin esperar a la pasarela: el dueño de la
+        factura consulta el PaymentIntent del pago (Location) hasta tener client_secret.
+        Si no, el PaymentIntent se crea aquí, después de confirmar el pago: la llamada a
+        la pasarela no retiene una transacción ni el bloqueo de la Idempotency-Key. El
+        pago lo completan después los webhooks de la pasarela, no esta vista.
+        Con Idempotency-Key un reintento devuelve el mismo pago en lugar de duplicarlo.
         """
+        response = self.register_payment(request)
+        if response.status_code == status.HTTP_201_CREATED:
+            # También en un reintento: completa el PaymentIntent si la pasarela falló
+            payments.create_intent(response.data['id'])
+            response.data = self.intent_data(request, Payment.objects.select_related('invoice').get(pk=response.data['id']))
+        return response
+
+    @idempotent
+    def register_payment(self, request):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        
-        # Simulación de procesamiento de pago
         payment = serializer.save()
-        
-        # Actualizar estado a COMPLETADO (Mock)
-        payment.status = 'COMPLETED'
-        payment.transaction_id = f"TXN-{payment.id}-MOCK"
-        payment.save()
-        
-        # Actualizar factura si el pago cubre el monto
-        invoice = payment.invoice
-        if invoice.status != 'PAID':
-            # Lógica simple: si hay un pago completado, marcar como pagada
-            invoice.status = 'PAID'
-            invoice.paid_at = timezone.now()
-            invoice.save()
-            
+
+        if settings.PAYMENT_INTENTS_ASYNC:
+            payments.request_intent(payment)
+            response = Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+            response['Location'] = reverse('payment-intent', args=[payment.pk], request=request)
+            return response
         return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    # URL: /api/v1/billing/payments/{id}/intent/
+    @action(detail=True, methods=['get'])
+    def intent(self, request, pk=None):
+        """Pago con el client_secret de su PaymentIntent; solo para el dueño de la factura."""
+        payment = self.get_object()
+        if payment.invoice.user_id != request.user.pk:
+            return Response({"detail": "Solo el dueño de la factura puede ver el PaymentIntent."}, status=status.HTTP_403_FORBIDDEN)
+        return Response(self.intent_data(request, payment))
+
+    def intent_data(self, request, payment):
+        # El secreto del PaymentIntent solo se entrega al dueño de la factura
+        if payment.invoice.user_id == request.user.pk:
+            return PaymentIntentSerializer(payment, context=self.get_serializer_context()).data
+        return self.get_serializer(payment).data
+
+
+class PaymentWebhookView(APIView):
+    """
+    Webhook de la pasarela: eventos firmados (Stripe-Signature) que mueven el estado de
+    los pagos. Responde 200 aunque el evento no aplique (repetido o fuera de orden)
+    para que la pasarela no lo reintente; 404 si el pago aún no existe (sí reintenta).
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        try:
+            event = gateway.parse_event(
+                request.body, request.headers.get('Stripe-Signature'), settings.STRIPE_WEBHOOK_SECRET
+            )
+        except gateway.SignatureError as error:
+            return Response({"detail": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        applied = payments.handle_event(event)
+        if applied is None:
+            return Response({"detail": "Pago no encontrado."}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"applied": applied})
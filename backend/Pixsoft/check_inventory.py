@@ -5,7 +5,10 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Pixsoft.settings')
 django.setup()
 
 from products.models import SaleProduct
+from products.ledger import reconcile
 from leasing.models import RentalProduct
 
 print(f"Sale Products: {SaleProduct.objects.count()}")
 print(f"Rental Products: {RentalProduct.objects.count()}")
+# Detalle con: python manage.py reconcile_stock
+print(f"Products out of balance with the stock ledger: {len(reconcile())}")
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import RentalCategory, RentalProduct, RentalPlan, RentalContract
+from .models import ContractTemplate, RentalCategory, RentalProduct, RentalPlan, RentalContract
+from .documents import render_contract
 
 # --- Inline para añadir Planes dentro de la vista de Producto ---
 
@@ -44,7 +45,29 @@ class RentalContractAdmin(admin.ModelAdmin):
     list_display = ('id', 'customer', 'product', 'start_date', 'end_date', 'total_cost', 'is_signed', 'status')
     list_filter = ('status', 'is_signed', 'start_date', 'plan')
     search_fields = ('customer__username', 'product__name')
-    readonly_fields = ('total_cost',)
+    readonly_fields = ('total_cost', 'template', 'terms', 'document')
+    exclude = ('contract_document',)
+
+    def document(self, obj):
+        """Texto del contrato generado desde su plantilla (o el texto antiguo)."""
+        return render_contract(obj)
+
+    document.short_description = 'Términos y Condiciones del Contrato (Aplicados)'
+
+# ----------------------------------------------------------------
+# --- Administrador de las Plantillas de Contrato ---
+# ----------------------------------------------------------------
+
+@admin.register(ContractTemplate)
+class ContractTemplateAdmin(admin.ModelAdmin):
+    list_display = ('version', 'created_at')
+
+    # Las versiones publicadas son inmutables: solo se publican nuevas
+    def has_change_permission(self, request, obj=None):
+        return obj is None
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 # ----------------------------------------------------------------
 # --- Administrador de la Categoría ---
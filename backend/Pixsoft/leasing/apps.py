@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class LeasingConfig(AppConfig):
     name = "leasing"
+
+    def ready(self):
+        import leasing.signals
@@ -0,0 +1,106 @@
+from datetime import timedelta
+from django.db import connection
+from .models import RentalContract
+
+CONTRACTS = RentalContract._meta.db_table
+
+# Ventana máxima del calendario por petición
+MAX_CALENDAR_DAYS = 366
+
+# Eventos de ocupación por ventana (equipo, [start, end)): +1 el día en que un contrato
+# empieza a ocupar una unidad dentro de la ventana y -1 el día en que la libera,
+# sumados por ventana y día. El índice GiST parcial (product_id, rental_period)
+# encuentra solo los contratos que se solapan (&&), así el costo depende de esos
+# contratos y no del historial del equipo. Las ventanas llegan como arreglos
+# paralelos (unnest): GiST no indexa comparaciones con arreglos (= ANY()).
+EVENTS = f"""
+    windows AS (
+        SELECT * FROM unnest(%(products)s::integer[], %(starts)s::date[], %(ends)s::date[])
+            WITH ORDINALITY AS w(product_id, start_date, end_date, n)
+    ), events AS (
+        SELECT w.n, e.day, sum(e.delta) AS delta
+        FROM windows w
+        JOIN {CONTRACTS} c
+          ON c.product_id = w.product_id AND c.rental_period && daterange(w.start_date, w.end_date)
+        CROSS JOIN LATERAL (VALUES
+            (greatest(lower(c.rental_period), w.start_date), 1),
+            (least(upper(c.rental_period), w.end_date), -1)
+        ) AS e(day, delta)
+        WHERE c.status IN ('PENDING', 'ACTIVE')
+          {{exclude}}
+        GROUP BY w.n, e.day
+    )
+"""
+
+
+def events_sql(exclude_contract=None):
+    return EVENTS.format(exclude='AND c.id <> %(exclude)s' if exclude_contract else '')
+
+
+def window_params(windows, exclude_contract=None):
+    products, starts, ends = (list(column) for column in zip(*windows))
+    return {'products': products, 'starts': starts, 'ends': ends, 'exclude': exclude_contract}
+
+
+def peak_usage_many(windows, exclude_contract=None):
+    """
+    Máximo de unidades ocupadas a la vez por contratos vigentes en cada ventana
+    (equipo, inicio, fin), en UNA consulta para todas: barrido de eventos con suma
+    acumulada por ventana. Retorna una lista alineada con `windows`.
+    """
+    # Las ventanas vacías o invertidas no ocupan días (daterange() las rechazaría)
+    valid = [index for index, (product_id, start, end) in enumerate(windows) if end > start]
+    peaks = [0] * len(windows)
+    if not valid:
+        return peaks
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            WITH {events_sql(exclude_contract)}
+            SELECT n, max(used) FROM (
+                SELECT n, sum(delta) OVER (PARTITION BY n ORDER BY day) AS used FROM events
+            ) AS usage
+            GROUP BY n
+        """, window_params([windows[index] for index in valid], exclude_contract))
+        for n, peak in cursor.fetchall():
+            peaks[valid[n - 1]] = max(peak, 0)
+    return peaks
+
+
+def peak_usage(product_id, start, end, exclude_contract=None):
+    """Máximo de unidades ocupadas a la vez en algún día de [start, end)."""
+    return peak_usage_many([(product_id, start, end)], exclude_contract)[0]
+
+
+def available_units(product, start, end, exclude_contract=None):
+    """Unidades del equipo libres durante TODO el periodo [start, end)."""
+    return max(product.stock_quantity - peak_usage(product.pk, start, end, exclude_contract), 0)
+
+
+def daily_availability(products, start, end):
+    """
+    Unidades libres por día de [start, end) para varios equipos: una consulta de
+    eventos y la suma acumulada en Python. Retorna {id_equipo: [libres por día]}.
+    """
+    days = (end - start).days
+    changes = {}
+    if products:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"WITH {events_sql()} SELECT n, day, delta FROM events",
+                window_params([(product.pk, start, end) for product in products]),
+            )
+            for n, day, delta in cursor.fetchall():
+                changes.setdefault(n, {})[(day - start).days] = delta
+
+    calendar = {}
+    for n, product in enumerate(products, start=1):
+        deltas, used, available = changes.get(n, {}), 0, []
+        for offset in range(days):
+            used += deltas.get(offset, 0)
+            available.append(max(product.stock_quantity - used, 0))
+        calendar[product.pk] = available
+    return calendar
+
+
+def calendar_dates(start, end):
+    return [start + timedelta(days=offset) for offset in range((end - start).days)]
@@ -0,0 +1,91 @@
+from decimal import Decimal
+from functools import lru_cache
+from django.template import Context, Engine
+from django.utils import timezone
+from .models import ContractTemplate, RentalPlan
+from .utils import PERIOD_DAYS
+
+# Motor propio: el contrato es texto plano (sin autoescape) y no depende de TEMPLATES
+ENGINE = Engine(autoescape=False)
+
+PERIOD_LABELS = dict(RentalPlan.RENTAL_PERIOD_CHOICES)
+
+
+@lru_cache(maxsize=None)
+def compiled(version):
+    """Plantilla compilada de una versión; las versiones son inmutables, se cachean por proceso."""
+    return ENGINE.from_string(ContractTemplate.objects.values_list('body', flat=True).get(version=version))
+
+
+class NoTemplate(Exception):
+    """No hay una plantilla de contrato publicada con la que generar el documento."""
+
+
+def current_version():
+    """Versión vigente (la última publicada) o None si no hay plantillas."""
+    return ContractTemplate.objects.values_list('version', flat=True).first()
+
+
+def build_terms(product, plan, issued_at=None):
+    """
+    Parámetros compactos que guarda el contrato en lugar del texto: lo que puede
+    cambiar después en el catálogo (nombre, precios) y la fecha de emisión. Las
+    fechas del arrendamiento ya están en el propio contrato.
+    """
+    return {
+        'product': product.name,
+        'sku': product.sku,
+        'period': plan.period,
+        'base_price': str(plan.base_price),
+        'maintenance_price': str(plan.maintenance_price),
+        'issued_at': timezone.localtime(issued_at).strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+def document_context(terms, start_date, end_date):
+    """Valores ya formateados para la plantilla, con las reglas de calculate_rental_cost."""
+    period = terms['period']
+    label = PERIOD_LABELS.get(period, period)
+    duration_days = (end_date - start_date).days
+    duration_units = max(1, duration_days // PERIOD_DAYS.get(period, 30))
+    base_price, maintenance_price = Decimal(terms['base_price']), Decimal(terms['maintenance_price'])
+    base_cost, maintenance_cost = base_price * duration_units, maintenance_price * duration_units
+    return {
+        'product': terms['product'],
+        'sku': terms['sku'],
+        'plan': label,
+        'plan_unit': label.lower(),
+        # ISO y no el formato localizado de fechas de las plantillas
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'duration_days': duration_days,
+        'duration_units': duration_units,
+        'base_price': f"{base_price:.2f}",
+        'maintenance_price': f"{maintenance_price:.2f}",
+        'base_cost': f"{base_cost:.2f}",
+        'maintenance_cost': f"{maintenance_cost:.2f}",
+        'total_cost': f"{base_cost + maintenance_cost:.2f}",
+        'issued_at': terms['issued_at'],
+    }
+
+
+def render(version, terms, start_date, end_date):
+    return compiled(version).render(Context(document_context(terms, start_date, end_date)))
+
+
+def quote_document(product, plan, start_date, end_date, version=None):
+    """
+    Texto que acompaña a una cotización: el contrato tal como se emitiría ahora.
+    NoTemplate si todavía no se publicó ninguna plantilla.
+    """
+    version = version or current_version()
+    if version is None:
+        raise NoTemplate("No hay una plantilla de contrato publicada.")
+    return render(version, build_terms(product, plan), start_date, end_date)
+
+
+def render_contract(contract):
+    """Texto del contrato: su plantilla y parámetros, o el texto guardado si es antiguo."""
+    if contract.template_id is None:
+        return contract.contract_document
+    return render(contract.template_id, contract.terms, contract.start_date, contract.end_date)
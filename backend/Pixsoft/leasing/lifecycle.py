@@ -0,0 +1,100 @@
+from datetime import timedelta
+from django.apps import apps
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.utils import timezone
+from products.models import StockMovement
+from .models import RentalContract, RentalProduct
+
+CONTRACTS = RentalContract._meta.db_table
+MOVEMENTS = StockMovement._meta.db_table
+
+# Contratos que cambian de estado por transacción: cada lote bloquea solo sus filas
+LIFECYCLE_BATCH_SIZE = 2000
+
+
+class Transition:
+    """
+    Cambio de estado automático de los contratos que cumplen `condition` (SQL sobre
+    el alias c). `order_by` es la columna del índice (status, columna) con el que se
+    recorren; `returns_stock` registra la devolución de la unidad en el libro de stock.
+    """
+
+    def __init__(self, name, source, target, condition, order_by, returns_stock=False):
+        self.name = name
+        self.source = source
+        self.target = target
+        self.condition = condition
+        self.order_by = order_by
+        self.returns_stock = returns_stock
+
+    def sql(self):
+        # Sin save() no hay señales: la devolución al libro va en la misma sentencia
+        returned = f""",
+            returned AS (
+                INSERT INTO {MOVEMENTS} (content_type_id, object_id, kind, quantity, reference, created_at)
+                SELECT %(content_type)s, product_id, '{StockMovement.RENTAL_IN}', 1, 'contract:' || id, %(now)s
+                FROM moved
+            )""" if self.returns_stock else ''
+        # El estado se vuelve a comprobar en el UPDATE: repetir la corrida no mueve nada dos veces
+        return f"""
+            WITH due AS (
+                SELECT c.id FROM {CONTRACTS} c
+                WHERE c.status = %(source)s AND {self.condition}
+                ORDER BY c.{self.order_by}, c.id
+                LIMIT %(limit)s
+                FOR UPDATE SKIP LOCKED
+            ), moved AS (
+                UPDATE {CONTRACTS} c SET status = %(target)s
+                FROM due WHERE c.id = due.id AND c.status = %(source)s
+                RETURNING c.id, c.product_id
+            ){returned}
+            SELECT count(*) FROM moved
+        """
+
+
+def transitions():
+    invoices = apps.get_model('billing', 'Invoice')._meta.db_table
+    return [
+        # Pendientes sin pago dentro del plazo: se cancelan y dejan de ocupar unidades
+        Transition(
+            'canceled', 'PENDING', 'CANCELED',
+            f"c.created_at < %(payment_deadline)s AND NOT EXISTS ("
+            f"SELECT 1 FROM {invoices} i WHERE i.rental_contract_id = c.id AND i.status = 'PAID')",
+            order_by='created_at',
+        ),
+        # Activos cuyo día de devolución llegó: se completan y la unidad vuelve a bodega
+        Transition(
+            'completed', 'ACTIVE', 'COMPLETED', "c.end_date <= %(today)s",
+            order_by='end_date', returns_stock=True,
+        ),
+    ]
+
+
+def run(batch_size=LIFECYCLE_BATCH_SIZE, now=None):
+    """
+    Aplica las transiciones del ciclo de vida por lotes, cada lote en su propia
+    transacción (UN UPDATE ... RETURNING por lote, saltando filas bloqueadas por otra
+    operación). Idempotente. Retorna cuántos contratos pasó cada transición.
+    """
+    now = now or timezone.now()
+    params = {
+        'now': now,
+        'today': timezone.localdate(now),
+        'payment_deadline': now - timedelta(hours=settings.RENTAL_PAYMENT_TIMEOUT_HOURS),
+        'content_type': ContentType.objects.get_for_model(RentalProduct).pk,
+        'limit': batch_size,
+    }
+    moved = {}
+    for transition in transitions():
+        moved[transition.name] = 0
+        sql = transition.sql()
+        while True:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(sql, {**params, 'source': transition.source, 'target': transition.target})
+                count = cursor.fetchone()[0]
+            moved[transition.name] += count
+            if count < batch_size:
+                break
+    return moved
@@ -0,0 +1,61 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.template import Context
+
+from leasing import documents
+from leasing.models import ContractTemplate, RentalContract
+
+SAMPLE_TERMS = {
+    'product': 'Servidor de rack modelo 1', 'sku': 'SRV-0001', 'period': 'WEEKLY',
+    'base_price': '350.00', 'maintenance_price': '12.50', 'issued_at': '2026-10-18 12:00:00',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el ritmo de generación de contratos con la plantilla compilada (caché por "
+        "proceso) contra compilarla en cada documento, y el tamaño que ocupan los "
+        "contratos guardados (parámetros frente a texto completo)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--renders', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        version = documents.current_version()
+        if version is None:
+            raise CommandError("No hay plantillas de contrato publicadas.")
+        renders = options['renders']
+        start_date, end_date = date(2026, 1, 1), date(2026, 3, 1)
+
+        documents.compiled(version)
+        started = time.perf_counter()
+        for _ in range(renders):
+            text = documents.render(version, SAMPLE_TERMS, start_date, end_date)
+        cached = renders / (time.perf_counter() - started)
+
+        body = ContractTemplate.objects.get(version=version).body
+        started = time.perf_counter()
+        for _ in range(renders):
+            documents.ENGINE.from_string(body).render(Context(documents.document_context(SAMPLE_TERMS, start_date, end_date)))
+        uncached = renders / (time.perf_counter() - started)
+
+        self.stdout.write(f"Plantilla v{version}: {cached:,.0f} documentos/s compilada una vez, {uncached:,.0f} compilando cada vez")
+        self.stdout.write(f"Documento: {len(text.encode())} bytes de texto, {len(str(SAMPLE_TERMS).encode())} bytes de parámetros")
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT count(*), count(template_version), avg(pg_column_size(c.*)),
+                       avg(pg_column_size(terms) + pg_column_size(contract_document)),
+                       pg_total_relation_size('{RentalContract._meta.db_table}')
+                FROM {RentalContract._meta.db_table} c
+            """)
+            total, templated, row_bytes, document_bytes, table_bytes = cursor.fetchone()
+        if total:
+            self.stdout.write(
+                f"Contratos: {total} ({templated} con plantilla), fila promedio {row_bytes:.0f} bytes, "
+                f"documento guardado {document_bytes:.0f} bytes, tabla {table_bytes / 2 ** 20:.1f} MB"
+            )
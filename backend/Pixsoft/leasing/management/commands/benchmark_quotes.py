@@ -0,0 +1,85 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory
+
+from leasing.models import RentalCategory, RentalContract, RentalPlan, RentalProduct
+from leasing.views import BatchQuoteView, calculate_quote
+
+PERIODS = ['DAILY', 'WEEKLY', 'MONTHLY']
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara N cotizaciones individuales (/quote/) contra UNA cotización masiva "
+        "(/quote/batch/) sobre una flota sintética con historial de contratos. "
+        "Los datos sintéticos se eliminan al terminar; no ejecutar contra producción."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[10, 50, 200], help="Ítems por comparación")
+        parser.add_argument('--products', type=int, default=50)
+        parser.add_argument('--contracts', type=int, default=1000, help="Contratos por equipo")
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        factory = APIRequestFactory()
+        batch_view = BatchQuoteView.as_view()
+
+        customer = get_user_model().objects.create_user(username='benchmark-quotes')
+        category = RentalCategory.objects.create(name='Benchmark cotizaciones')
+        try:
+            # bulk_create: sin señales (ni facturas ni libro de stock) para los datos sintéticos
+            products = RentalProduct.objects.bulk_create(
+                RentalProduct(name=f'Equipo {i}', description='', sku=f'BENCH-Q-{i:05d}', stock_quantity=400, category=category)
+                for i in range(options['products'])
+            )
+            plans = RentalPlan.objects.bulk_create(
+                RentalPlan(product=product, period=period, base_price=Decimal(rng.randint(10, 500)))
+                for product in products for period in PERIODS
+            )
+            first_day = date(2020, 1, 1)
+            for product, plan in zip(products, plans[::len(PERIODS)]):
+                starts = (first_day + timedelta(days=rng.randrange(3650)) for _ in range(options['contracts']))
+                RentalContract.objects.bulk_create(
+                    RentalContract(
+                        customer=customer, product=product, plan=plan, start_date=start,
+                        end_date=start + timedelta(days=rng.randint(1, 90)), total_cost=0,
+                        contract_document='', status='ACTIVE'
+                    )
+                    for start in starts
+                )
+
+            self.stdout.write(f"{'ítems':>6} {'N individuales ms':>18} {'masiva ms':>10} {'aceleración':>12}")
+            for size in options['sizes']:
+                items = []
+                for _ in range(size):
+                    start = date(2025, 1, 1) + timedelta(days=rng.randrange(300))
+                    items.append({
+                        'product_id': rng.choice(products).pk, 'period': rng.choice(PERIODS),
+                        'start_date': str(start), 'end_date': str(start + timedelta(days=rng.randint(1, 60))),
+                    })
+                single, batch = [], []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    for item in items:
+                        calculate_quote(factory.post('/api/v1/leasing/quote/', item, format='json'))
+                    single.append((time.perf_counter() - started) * 1000)
+
+                    started = time.perf_counter()
+                    batch_view(factory.post('/api/v1/leasing/quote/batch/', {'items': items}, format='json'))
+                    batch.append((time.perf_counter() - started) * 1000)
+                single_ms, batch_ms = statistics.median(single), statistics.median(batch)
+                self.stdout.write(f"{size:>6} {single_ms:>18.1f} {batch_ms:>10.1f} {single_ms / batch_ms:>11.1f}x")
+        finally:
+            RentalContract.objects.filter(customer=customer).delete()
+            RentalPlan.objects.filter(product__category=category).delete()
+            RentalProduct.objects.filter(category=category).delete()
+            category.delete()
+            customer.delete()
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from leasing.lifecycle import LIFECYCLE_BATCH_SIZE, run
+
+
+class Command(BaseCommand):
+    help = (
+        "Aplica el ciclo de vida de los contratos por lotes: cancela los pendientes sin "
+        "pago dentro del plazo y completa los activos cuyo periodo terminó (la unidad "
+        "vuelve a bodega). Pensado para ejecutarse periódicamente (cron); con --every "
+        "queda en ejecución. Repetir una corrida no cambia nada."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=LIFECYCLE_BATCH_SIZE, help="Contratos por transacción")
+        parser.add_argument('--every', type=int, default=0, help="Segundos entre corridas (0 = una sola vez)")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size debe ser positivo.")
+        while True:
+            started = time.perf_counter()
+            moved = run(batch_size=options['batch_size'])
+            self.stdout.write(
+                f"Contratos cancelados: {moved['canceled']}, completados: {moved['completed']} "
+                f"({time.perf_counter() - started:.2f} s)"
+            )
+            if not options['every']:
+                return
+            time.sleep(options['every'])
@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 07:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leasing', '0003_alter_rentalcategory_id_alter_rentalcontract_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='rentalproduct',
+            index=models.Index(fields=['name', 'id'], name='rentalproduct_name_id_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 08:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leasing', '0004_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rentalplan',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Última Modificación'),
+        ),
+        migrations.AddField(
+            model_name='rentalproduct',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Última Modificación'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-18 15:10
+
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+import django.contrib.postgres.operations
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leasing', '0005_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # GiST sobre (product_id, rental_period): el entero necesita las clases de btree_gist
+        django.contrib.postgres.operations.BtreeGistExtension(),
+        migrations.AddField(
+            model_name='rentalcontract',
+            name='rental_period',
+            field=models.GeneratedField(db_persist=True, expression=models.Func(models.F('start_date'), django.db.models.functions.comparison.Greatest('start_date', 'end_date'), function='daterange'), output_field=django.contrib.postgres.fields.ranges.DateRangeField(), verbose_name='Periodo Ocupado'),
+        ),
+        migrations.AddIndex(
+            model_name='rentalcontract',
+            index=django.contrib.postgres.indexes.GistIndex(condition=models.Q(('status__in', ['PENDING', 'ACTIVE'])), fields=['product', 'rental_period'], name='rentalcontract_period_gist'),
+        ),
+    ]
@@ -0,0 +1,162 @@
+# Generated by Django 6.0 on 2026-10-18 16:20
+
+import json
+import re
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.template import Context, Engine
+
+# Versión 1: el mismo texto que generaba la cotización
+TEMPLATE_V1 = """CONTRATO DE ARRENDAMIENTO - {{ product }}
+
+DETALLES DEL CONTRATO:
+• Producto: {{ product }}
+• SKU: {{ sku }}
+• Plan: {{ plan }}
+• Periodo: {{ start_date }} a {{ end_date }}
+• Duración: {{ duration_days }} días ({{ duration_units }} {{ plan_unit }}(s))
+
+DETALLES DE COSTO:
+• Precio base por {{ plan_unit }}: ${{ base_price }}
+• Mantenimiento/seguro por {{ plan_unit }}: ${{ maintenance_price }}
+• Costo base: ${{ base_cost }}
+• Costo mantenimiento: ${{ maintenance_cost }}
+• TOTAL: ${{ total_cost }}
+
+TÉRMINOS Y CONDICIONES:
+1. El equipo debe ser devuelto en las mismas condiciones.
+2. Cualquier daño será responsabilidad del arrendatario.
+3. El pago debe realizarse al inicio del contrato.
+4. Cancelaciones con menos de 24h de anticipación incurren en penalización.
+
+FIRMA DEL CLIENTE: _________________________
+FECHA: {{ issued_at }}"""
+
+# Copia congelada de leasing/documents.py: la migración no depende del código actual
+PERIOD_DAYS = {'DAILY': 1, 'WEEKLY': 7, 'MONTHLY': 30, 'ANNUAL': 365}
+PERIOD_LABELS = {'DAILY': 'Diario', 'WEEKLY': 'Semanal', 'MONTHLY': 'Mensual', 'ANNUAL': 'Anual'}
+ISSUED_AT = re.compile(r'^FECHA: (\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})$', re.MULTILINE)
+BATCH_SIZE = 2000
+
+
+def render_v1(template, terms, start_date, end_date):
+    period = terms['period']
+    label = PERIOD_LABELS.get(period, period)
+    duration_days = (end_date - start_date).days
+    duration_units = max(1, duration_days // PERIOD_DAYS.get(period, 30))
+    base_price, maintenance_price = Decimal(terms['base_price']), Decimal(terms['maintenance_price'])
+    base_cost, maintenance_cost = base_price * duration_units, maintenance_price * duration_units
+    return template.render(Context({
+        'product': terms['product'], 'sku': terms['sku'], 'plan': label, 'plan_unit': label.lower(),
+        'start_date': start_date.isoformat(), 'end_date': end_date.isoformat(),
+        'duration_days': duration_days, 'duration_units': duration_units,
+        'base_price': f"{base_price:.2f}", 'maintenance_price': f"{maintenance_price:.2f}",
+        'base_cost': f"{base_cost:.2f}", 'maintenance_cost': f"{maintenance_cost:.2f}",
+        'total_cost': f"{base_cost + maintenance_cost:.2f}", 'issued_at': terms['issued_at'],
+    }))
+
+
+def update_contracts(schema_editor, table, ids, terms, documents):
+    # Un UPDATE por lote desde arreglos paralelos (bulk_update arma un CASE por fila)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE {table} c
+            SET template_version = CASE WHEN v.terms IS NULL THEN NULL ELSE 1 END,
+                terms = COALESCE(v.terms, '{{}}'::jsonb), contract_document = v.document
+            FROM unnest(%s::integer[], %s::jsonb[], %s::text[]) AS v(id, terms, document)
+            WHERE c.id = v.id
+        """, [ids, terms, documents])
+
+
+def convert_documents(apps, schema_editor):
+    """
+    Publica la versión 1 y convierte los contratos cuyo texto es exactamente el que
+    genera la plantilla con los datos actuales del equipo y del plan: guardan la
+    versión y los parámetros, y el texto se vacía. Los demás (texto editado, precios
+    cambiados desde la emisión) conservan su texto tal cual.
+    """
+    ContractTemplate = apps.get_model('leasing', 'ContractTemplate')
+    RentalContract = apps.get_model('leasing', 'RentalContract')
+    ContractTemplate.objects.create(version=1, body=TEMPLATE_V1)
+    template = Engine(autoescape=False).from_string(TEMPLATE_V1)
+
+    ids, terms_list = [], []
+    contracts = RentalContract.objects.select_related('product', 'plan').exclude(contract_document='')
+    for contract in contracts.iterator(chunk_size=BATCH_SIZE):
+        issued_at = ISSUED_AT.search(contract.contract_document)
+        if issued_at is None:
+            continue
+        terms = {
+            'product': contract.product.name, 'sku': contract.product.sku, 'period': contract.plan.period,
+            'base_price': str(contract.plan.base_price), 'maintenance_price': str(contract.plan.maintenance_price),
+            'issued_at': issued_at.group(1),
+        }
+        if render_v1(template, terms, contract.start_date, contract.end_date) != contract.contract_document:
+            continue
+        ids.append(contract.pk)
+        terms_list.append(json.dumps(terms, ensure_ascii=False))
+        if len(ids) >= BATCH_SIZE:
+            update_contracts(schema_editor, RentalContract._meta.db_table, ids, terms_list, [''] * len(ids))
+            ids, terms_list = [], []
+    if ids:
+        update_contracts(schema_editor, RentalContract._meta.db_table, ids, terms_list, [''] * len(ids))
+
+
+def restore_documents(apps, schema_editor):
+    # Reversa: el texto se vuelve a guardar en cada contrato
+    ContractTemplate = apps.get_model('leasing', 'ContractTemplate')
+    RentalContract = apps.get_model('leasing', 'RentalContract')
+    templates = {
+        version: Engine(autoescape=False).from_string(body)
+        for version, body in ContractTemplate.objects.values_list('version', 'body')
+    }
+    ids, texts = [], []
+    contracts = RentalContract.objects.filter(template__isnull=False)
+    for contract in contracts.iterator(chunk_size=BATCH_SIZE):
+        ids.append(contract.pk)
+        texts.append(render_v1(templates[contract.template_id], contract.terms, contract.start_date, contract.end_date))
+        if len(ids) >= BATCH_SIZE:
+            update_contracts(schema_editor, RentalContract._meta.db_table, ids, [None] * len(ids), texts)
+            ids, texts = [], []
+    if ids:
+        update_contracts(schema_editor, RentalContract._meta.db_table, ids, [None] * len(ids), texts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leasing', '0006_rental_period'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContractTemplate',
+            fields=[
+                ('version', models.PositiveIntegerField(primary_key=True, serialize=False, verbose_name='Versión')),
+                ('body', models.TextField(verbose_name='Plantilla')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Publicación')),
+            ],
+            options={
+                'verbose_name_plural': 'Plantillas de Contrato',
+                'ordering': ['-version'],
+            },
+        ),
+        migrations.AddField(
+            model_name='rentalcontract',
+            name='terms',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Parámetros del Contrato'),
+        ),
+        migrations.AlterField(
+            model_name='rentalcontract',
+            name='contract_document',
+            field=models.TextField(blank=True, verbose_name='Términos y Condiciones del Contrato (Aplicados)'),
+        ),
+        migrations.AddField(
+            model_name='rentalcontract',
+            name='template',
+            field=models.ForeignKey(blank=True, db_column='template_version', null=True, on_delete=django.db.models.deletion.PROTECT, to='leasing.contracttemplate', verbose_name='Versión de la Plantilla'),
+        ),
+        migrations.RunPython(convert_documents, restore_documents),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-18 17:05
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leasing', '0007_contract_templates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Los contratos existentes toman la fecha de la migración: el plazo de pago corre desde hoy
+        migrations.AddField(
+            model_name='rentalcontract',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Fecha de Creación'),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='rentalcontract',
+            index=models.Index(fields=['status', 'end_date'], name='rentalcontract_status_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rentalcontract',
+            index=models.Index(fields=['status', 'created_at'], name='rentalcontract_status_new_idx'),
+        ),
+    ]
@@ -1,5 +1,10 @@
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import F, Func, Q
+from django.db.models.functions import Greatest
 from django.contrib.auth import get_user_model 
+from django.contrib.postgres.fields import DateRangeField
+from django.contrib.postgres.indexes import GistIndex
 
 User = get_user_model()
 
@@ -36,6 +41,13 @@ class RentalProduct(models.Model):
     sku = models.CharField(max_length=50, unique=True, verbose_name="Código de Inventario")
     stock_quantity = models.IntegerField(default=0, verbose_name="Cantidad en Inventario para Arrendamiento")
     image = models.ImageField(upload_to='leasing/', null=True, blank=True, verbose_name="Imagen del Equipo")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Última Modificación")
+
+    class Meta:
+        indexes = [
+            # Paginación por cursor del catálogo de arrendamiento
+            models.Index(fields=['name', 'id'], name='rentalproduct_name_id_idx'),
+        ]
     
     @property
     def is_available(self):
@@ -62,6 +74,7 @@ class RentalPlan(models.Model):
     
     # Requerimiento: Opciones de mantenimiento o seguros
     maintenance_price = models.DecimalField(max_digits=10, decimal_places=2, default=0.00, verbose_name="Costo Adicional de Mantenimiento/Seguro")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Última Modificación")
     
     class Meta:
         unique_together = ('product', 'period')
@@ -70,6 +83,32 @@ class RentalPlan(models.Model):
     def __str__(self):
         return f"{self.product.name} - {self.get_period_display()}"
 
+class ContractTemplate(models.Model):
+    """
+    Versión publicada del texto de los contratos (sintaxis de plantillas de Django).
+    Las versiones no se editan: cambiar el texto es publicar una versión nueva, así
+    cada contrato sigue mostrando exactamente lo que se firmó.
+    """
+
+    version = models.PositiveIntegerField(primary_key=True, verbose_name="Versión")
+    body = models.TextField(verbose_name="Plantilla")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Publicación")
+
+    class Meta:
+        ordering = ['-version']
+        verbose_name_plural = "Plantillas de Contrato"
+
+    def __str__(self):
+        return f"Plantilla de contrato v{self.version}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValidationError("Las plantillas publicadas no se modifican; publique una nueva versión.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValidationError("Las plantillas publicadas no se eliminan.")
+
 class RentalContract(models.Model):
     """Representa un contrato de arrendamiento (el 'pedido')."""
     
@@ -85,8 +124,16 @@ class RentalContract(models.Model):
     # Requerimiento: Opción para firmar contratos
     is_signed = models.BooleanField(default=False, verbose_name="Contrato Firmado")
     
-    # Requerimiento: Detalle de los términos y condiciones de Arrendamiento
-    contract_document = models.TextField(verbose_name="Términos y Condiciones del Contrato (Aplicados)") 
+    # Requerimiento: Detalle de los términos y condiciones de Arrendamiento.
+    # El texto se genera al vuelo con la plantilla y los parámetros del contrato
+    # (ver leasing/documents.py); contract_document solo conserva el texto de los
+    # contratos antiguos que no se pudieron convertir.
+    template = models.ForeignKey(
+        ContractTemplate, on_delete=models.PROTECT, null=True, blank=True,
+        db_column='template_version', verbose_name="Versión de la Plantilla"
+    )
+    terms = models.JSONField(default=dict, blank=True, verbose_name="Parámetros del Contrato")
+    contract_document = models.TextField(blank=True, verbose_name="Términos y Condiciones del Contrato (Aplicados)") 
     
     CONTRACT_STATUS_CHOICES = [
         ('PENDING', 'Pendiente de Pago/Firma'),
@@ -96,8 +143,32 @@ class RentalContract(models.Model):
     ]
     status = models.CharField(max_length=10, choices=CONTRACT_STATUS_CHOICES, default='PENDING', verbose_name="Estado del Contrato")
 
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Creación")
+
+    # Estados que ocupan una unidad del equipo durante el periodo del contrato
+    HOLDING_STATUSES = ('PENDING', 'ACTIVE')
+
+    # Intervalo [start_date, end_date) calculado por PostgreSQL; el día de fin es el de
+    # devolución y queda libre. Fechas invertidas dan un rango vacío (no ocupa días).
+    rental_period = models.GeneratedField(
+        expression=Func(F('start_date'), Greatest('start_date', 'end_date'), function='daterange'),
+        output_field=DateRangeField(),
+        db_persist=True,
+        verbose_name="Periodo Ocupado",
+    )
+
     class Meta:
         verbose_name_plural = "Contratos de Arrendamiento"
+        indexes = [
+            # Contratos que se solapan con una ventana (&&) para un equipo; requiere btree_gist
+            GistIndex(
+                fields=['product', 'rental_period'], name='rentalcontract_period_gist',
+                condition=Q(status__in=['PENDING', 'ACTIVE']),
+            ),
+            # Ciclo de vida (leasing/lifecycle.py): activos que terminaron y pendientes vencidos
+            models.Index(fields=['status', 'end_date'], name='rentalcontract_status_end_idx'),
+            models.Index(fields=['status', 'created_at'], name='rentalcontract_status_new_idx'),
+        ]
 
     def __str__(self):
         return f"Contrato #{self.id} - {self.product.name} ({self.status})"
\ No newline at end of file
@@ -0,0 +1,73 @@
+from .models import RentalPlan
+from .utils import PERIOD_DAYS
+from . import availability, documents
+
+# Ítems por cotización masiva
+MAX_BATCH_QUOTES = 200
+
+
+def quote_many(items, include_document=False):
+    """
+    Cotiza muchos (product_id, period, start_date, end_date, quantity) con las reglas
+    de calculate_rental_cost en DOS consultas en total: los planes (con su equipo) y
+    la ocupación máxima de todas las ventanas. Los costos se calculan por columnas
+    sobre listas paralelas con Decimal (dinero exacto, sin floats).
+
+    Retorna un resultado por ítem, en el mismo orden; los ítems que no se pueden
+    cotizar llevan 'error' en lugar de los costos.
+    """
+    plans = {
+        (plan.product_id, plan.period): plan
+        for plan in RentalPlan.objects.select_related('product').filter(
+            product_id__in={item['product_id'] for item in items},
+            period__in={item['period'] for item in items},
+        )
+    }
+    matched = [plans.get((item['product_id'], item['period'])) for item in items]
+
+    # Columnas: días, periodos cobrados y precios unitarios de cada ítem
+    days = [(item['end_date'] - item['start_date']).days for item in items]
+    units = [max(1, d // PERIOD_DAYS[item['period']]) for d, item in zip(days, items)]
+    base_costs = [plan.base_price * n if plan else None for plan, n in zip(matched, units)]
+    maintenance_costs = [plan.maintenance_price * n if plan else None for plan, n in zip(matched, units)]
+
+    quotable = [index for index, (plan, d) in enumerate(zip(matched, days)) if plan and d > 0]
+    peaks = availability.peak_usage_many([
+        (items[index]['product_id'], items[index]['start_date'], items[index]['end_date']) for index in quotable
+    ])
+    available = dict(zip(quotable, peaks))
+    version = documents.current_version() if include_document else None
+
+    results = []
+    for index, item in enumerate(items):
+        result = {
+            'product_id': item['product_id'],
+            'period': item['period'],
+            'start_date': item['start_date'],
+            'end_date': item['end_date'],
+            'quantity': item['quantity'],
+        }
+        plan = matched[index]
+        if plan is None:
+            result['error'] = f"No hay un plan {item['period']} para este producto"
+        elif days[index] <= 0:
+            result['error'] = 'La fecha de fin debe ser posterior a la fecha de inicio'
+        else:
+            available_units = max(plan.product.stock_quantity - available[index], 0)
+            total_cost = base_costs[index] + maintenance_costs[index]
+            result.update({
+                'plan_id': plan.pk,
+                'duration_days': days[index],
+                'duration_units': units[index],
+                'base_cost': base_costs[index],
+                'maintenance_cost': maintenance_costs[index],
+                'total_cost': total_cost,
+                'available_units': available_units,
+                'is_available': available_units >= item['quantity'],
+            })
+            if include_document:
+                result['contract_document'] = documents.quote_document(
+                    plan.product, plan, item['start_date'], item['end_date'], version
+                )
+        results.append(result)
+    return results
@@ -1,6 +1,8 @@
 # leasing/serializers.py
 from rest_framework import serializers
 from .models import RentalProduct, RentalContract, RentalPlan, RentalCategory
+from .documents import render_contract
+from .quotes import MAX_BATCH_QUOTES
 
 class RentalCategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -36,8 +38,43 @@ class RentalContractSerializer(serializers.ModelSerializer):
             'id', 'customer', 'product', 'plan',
             'product_name', 'plan_period', 'customer_username',
             'start_date', 'end_date', 'total_cost',
-            'is_signed', 'contract_document', 'status'
+            'is_signed', 'status'
         ]
+        # La firma y el estado solo cambian por la acción sign y el ciclo de vida
         extra_kwargs = {
-            'customer': {'read_only': True}
-        }
\ No newline at end of file
+            'customer': {'read_only': True},
+            'is_signed': {'read_only': True},
+            'status': {'read_only': True},
+        }
+
+    def validate(self, attrs):
+        # En una edición parcial las fechas que no llegan son las del contrato
+        start_date = attrs.get('start_date', getattr(self.instance, 'start_date', None))
+        end_date = attrs.get('end_date', getattr(self.instance, 'end_date', None))
+        if start_date and end_date and end_date <= start_date:
+            raise serializers.ValidationError({'end_date': 'La fecha de fin debe ser posterior a la de inicio.'})
+        return attrs
+
+class RentalContractDetailSerializer(RentalContractSerializer):
+    """Detalle del contrato con el documento generado desde su plantilla."""
+    template_version = serializers.IntegerField(source='template_id', read_only=True)
+    contract_document = serializers.SerializerMethodField()
+
+    class Meta(RentalContractSerializer.Meta):
+        fields = RentalContractSerializer.Meta.fields + ['template_version', 'contract_document']
+
+    def get_contract_document(self, contract):
+        return render_contract(contract)
+
+class QuoteItemSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    period = serializers.ChoiceField(choices=RentalPlan.RENTAL_PERIOD_CHOICES)
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+class BatchQuoteSerializer(serializers.Serializer):
+    """Cotización masiva: el contrato solo se genera si se pide (include_document)."""
+    items = QuoteItemSerializer(many=True, allow_empty=False, max_length=MAX_BATCH_QUOTES)
+    include_document = serializers.BooleanField(default=False)
+
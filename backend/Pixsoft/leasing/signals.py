@@ -0,0 +1,53 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from api import outbox
+from api.cache import catalog_cache
+from products import ledger
+from products.models import StockMovement
+from .models import RentalCategory, RentalContract, RentalPlan, RentalProduct
+
+@receiver(post_save, sender=RentalProduct)
+@receiver(post_delete, sender=RentalProduct)
+@receiver(post_save, sender=RentalCategory)
+@receiver(post_delete, sender=RentalCategory)
+def invalidate_rental_product_cache(sender, instance, **kwargs):
+    """Invalida los listados cacheados del catálogo de arrendamiento."""
+    catalog_cache.invalidate('rental_products')
+
+@receiver(post_save, sender=RentalPlan)
+@receiver(post_delete, sender=RentalPlan)
+def invalidate_rental_plan_cache(sender, instance, **kwargs):
+    """Los planes aparecen anidados en los productos y en su propio listado."""
+    catalog_cache.invalidate('rental_plans')
+
+@receiver(post_init, sender=RentalProduct)
+def remember_rental_stock(sender, instance, **kwargs):
+    ledger.remember_stock(instance)
+
+@receiver(post_save, sender=RentalProduct)
+def record_rental_stock_change(sender, instance, created, **kwargs):
+    """Altas y ediciones de la flota quedan en el libro de movimientos."""
+    ledger.record_saved_stock(instance, created)
+
+@receiver(post_init, sender=RentalContract)
+def remember_contract_status(sender, instance, **kwargs):
+    instance._loaded_status = instance.__dict__.get('status') if instance.pk else None
+
+@receiver(post_save, sender=RentalContract)
+def record_rental_movement(sender, instance, **kwargs):
+    """
+    Al activarse un contrato el equipo sale de bodega; al completarse o cancelarse
+    un contrato activo, vuelve.
+    """
+    previous, current = instance._loaded_status, instance.__dict__.get('status')
+    if current == 'ACTIVE' and previous != 'ACTIVE':
+        ledger.record(RentalProduct, StockMovement.RENTAL_OUT, {instance.product_id: -1}, f"contract:{instance.pk}")
+    elif previous == 'ACTIVE' and current in ('COMPLETED', 'CANCELED'):
+        ledger.record(RentalProduct, StockMovement.RENTAL_IN, {instance.product_id: 1}, f"contract:{instance.pk}")
+    instance._loaded_status = current
+
+@receiver(post_save, sender=RentalContract)
+def publish_contract_created(sender, instance, created, **kwargs):
+    """El evento confirma con el contrato; el primer periodo lo factura el despachador del outbox."""
+    if created:
+        outbox.publish('contract.created', contract=instance.pk)
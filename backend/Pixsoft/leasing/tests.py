@@ -1,3 +1,362 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from api import outbox
+from billing.models import Invoice
+from orders.models import Cart
+from products import ledger
+from products.models import StockMovement
+from .models import ContractTemplate, RentalCategory, RentalContract, RentalPlan, RentalProduct
+from . import availability, documents, lifecycle
 
-# Create your tests here.
+
+class RentalAvailabilityTests(APITestCase):
+    """
+    Pruebas de la disponibilidad por fechas: los contratos vigentes ocupan unidades
+    durante [start_date, end_date) y las cotizaciones, el carrito y los contratos nuevos
+    lo respetan.
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='cliente')
+        self.client.force_authenticate(user=self.user)
+        category = RentalCategory.objects.create(name='Cómputo')
+        self.laptop = RentalProduct.objects.create(
+            name='Laptop', description='', sku='LAP-1', stock_quantity=2, category=category
+        )
+        self.tablet = RentalProduct.objects.create(
+            name='Tablet', description='', sku='TAB-1', stock_quantity=1, category=category
+        )
+        self.plan = RentalPlan.objects.create(product=self.laptop, period='DAILY', base_price=Decimal('10.00'))
+        # Laptop: dos contratos se solapan del 5 al 9; el cancelado no ocupa unidades
+        self.contract(self.laptop, date(2026, 3, 1), date(2026, 3, 10))
+        self.contract(self.laptop, date(2026, 3, 5), date(2026, 3, 15))
+        self.contract(self.laptop, date(2026, 3, 1), date(2026, 3, 31), status='CANCELED')
+
+    def contract(self, product, start, end, status='ACTIVE'):
+        customer = get_user_model().objects.create_user(username=f'c{RentalContract.objects.count()}')
+        plan = RentalPlan.objects.get_or_create(product=product, period='DAILY', defaults={'base_price': Decimal('10.00')})[0]
+        return RentalContract.objects.create(
+            customer=customer, product=product, plan=plan, start_date=start, end_date=end,
+            total_cost=Decimal('10.00'), contract_document='', status=status
+        )
+
+    def test_peak_usage_counts_overlapping_holding_contracts(self):
+        self.assertEqual(availability.peak_usage(self.laptop.pk, date(2026, 3, 1), date(2026, 4, 1)), 2)
+        # El día de fin queda libre: desde el 10 solo hay un contrato
+        self.assertEqual(availability.peak_usage(self.laptop.pk, date(2026, 3, 10), date(2026, 3, 20)), 1)
+        self.assertEqual(availability.available_units(self.laptop, date(2026, 3, 15), date(2026, 3, 20)), 2)
+
+    def test_quote_rejects_periods_without_free_units(self):
+        response = self.client.post('/api/v1/leasing/quote/', {
+            'product_id': self.laptop.pk, 'period': 'DAILY', 'start_date': '2026-03-08', 'end_date': '2026-03-12'
+        })
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['available_units'], 0)
+
+        response = self.client.post('/api/v1/leasing/quote/', {
+            'product_id': self.laptop.pk, 'period': 'DAILY', 'start_date': '2026-03-10', 'end_date': '2026-03-12'
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['available_units'], response.data['total_cost']), (1, 20.0))
+
+    def test_calendar_returns_daily_availability_in_two_queries(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/v1/leasing/availability/', {
+                'products': f'{self.laptop.pk},{self.tablet.pk}', 'start': '2026-03-03', 'end': '2026-03-12'
+            })
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['dates']), 9)
+        laptop, tablet = response.data['products']
+        # 3 y 4: un contrato; 5 a 9: dos; 10 y 11: uno
+        self.assertEqual(laptop['available'], [1, 1, 0, 0, 0, 0, 0, 1, 1])
+        self.assertEqual((laptop['min_available'], tablet['available']), (0, [1] * 9))
+
+        response = self.client.get('/api/v1/leasing/availability/', {'products': 'x', 'start': '2026-03-03', 'end': '2026-03-12'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cart_and_new_contracts_respect_availability(self):
+        Cart.objects.create(user=self.user)
+        response = self.client.post('/api/v1/orders/cart/', {
+            'product_id': self.laptop.pk, 'product_type': 'rental', 'quantity': 1, 'rental_plan_id': self.plan.pk,
+            'rental_start_date': '2026-03-06', 'rental_end_date': '2026-03-08',
+        })
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['shortages'], [{'product_id': self.laptop.pk, 'requested': 1, 'available': 0}])
+
+        response = self.client.post('/api/v1/leasing/contracts/', {
+            'product': self.laptop.pk, 'plan': self.plan.pk, 'start_date': '2026-03-14', 'end_date': '2026-03-20',
+            'total_cost': '60.00', 'contract_document': 'Términos'
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post('/api/v1/leasing/contracts/', {
+            'product': self.laptop.pk, 'plan': self.plan.pk, 'start_date': '2026-03-12', 'end_date': '2026-03-16',
+            'total_cost': '40.00', 'contract_document': 'Términos'
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_contract_updates_recheck_availability_without_counting_themselves(self):
+        contract = self.contract(self.laptop, date(2026, 3, 15), date(2026, 3, 20))
+        url = f'/api/v1/leasing/contracts/{contract.pk}/'
+
+        response = self.client.patch(url, {'start_date': '2026-03-14'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Del 8 al 9 ya hay dos contratos ocupando las dos laptops
+        response = self.client.patch(url, {'start_date': '2026-03-08'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.patch(url, {'end_date': '2026-03-14'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('end_date', response.data)
+
+        contract.refresh_from_db()
+        self.assertEqual((contract.start_date, contract.end_date), (date(2026, 3, 14), date(2026, 3, 20)))
+
+    def test_overlap_search_can_use_the_gist_index(self):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute(
+                f"EXPLAIN WITH {availability.events_sql()} SELECT * FROM events",
+                availability.window_params([(self.laptop.pk, date(2026, 3, 1), date(2026, 4, 1))]),
+            )
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        self.assertIn('rentalcontract_period_gist', plan)
+
+
+class BatchQuoteTests(APITestCase):
+    """
+    Pruebas de la cotización masiva: mismas reglas que la cotización individual,
+    errores por ítem y un número fijo de consultas.
+    """
+
+    def setUp(self):
+        category = RentalCategory.objects.create(name='Servidores')
+        self.products = [
+            RentalProduct.objects.create(name=f'Servidor {i}', description='', sku=f'SRV-{i}', stock_quantity=3, category=category)
+            for i in range(4)
+        ]
+        for product in self.products:
+            RentalPlan.objects.create(product=product, period='WEEKLY', base_price=Decimal('70.00'), maintenance_price=Decimal('5.50'))
+            RentalPlan.objects.create(product=product, period='MONTHLY', base_price=Decimal('250.00'))
+
+    def item(self, product, period='WEEKLY', start='2026-05-01', end='2026-05-20', **extra):
+        return {'product_id': product.pk, 'period': period, 'start_date': start, 'end_date': end, **extra}
+
+    def test_batch_matches_single_quotes(self):
+        items = [self.item(product, period) for product in self.products for period in ('WEEKLY', 'MONTHLY')]
+        response = self.client.post('/api/v1/leasing/quote/batch/', {'items': items}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for item, result in zip(items, response.data['results']):
+            single = self.client.post('/api/v1/leasing/quote/', item).data
+            self.assertEqual(
+                (result['plan_id'], result['duration_units'], float(result['total_cost']), result['available_units']),
+                (single['plan_id'], single['duration_units'], single['total_cost'], single['available_units'])
+            )
+            self.assertNotIn('contract_document', result)
+        # 19 días en plan semanal: 2 semanas de 70.00 + 5.50
+        self.assertEqual(response.data['results'][0]['total_cost'], Decimal('151.00'))
+
+    def test_query_count_does_not_depend_on_the_number_of_items(self):
+        items = [self.item(product, start=f'2026-05-{day:02d}', end='2026-06-30') for product in self.products for day in range(1, 11)]
+        # Planes con su equipo + ocupación de todas las ventanas
+        with self.assertNumQueries(2):
+            response = self.client.post('/api/v1/leasing/quote/batch/', {'items': items}, format='json')
+        self.assertEqual(len(response.data['results']), 40)
+
+    def test_unquotable_items_report_errors_without_failing_the_batch(self):
+        items = [
+            self.item(self.products[0], 'DAILY'),
+            self.item(self.products[0], start='2026-05-20', end='2026-05-01'),
+            self.item(self.products[1], quantity=5),
+        ]
+        response = self.client.post('/api/v1/leasing/quote/batch/', {'items': items, 'include_document': True}, format='json')
+
+        missing_plan, inverted, too_many = response.data['results']
+        self.assertIn('error', missing_plan)
+        self.assertIn('error', inverted)
+        self.assertFalse(too_many['is_available'])
+        self.assertIn('SRV-1', too_many['contract_document'])
+
+        response = self.client.post('/api/v1/leasing/quote/batch/', {'items': [items[2]] * 201}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ContractDocumentTests(APITestCase):
+    """
+    Pruebas de los contratos con plantilla: se guarda la versión y los parámetros, y
+    el texto se genera solo en el detalle y al firmar.
+    """
+
+    def setUp(self):
+        category = RentalCategory.objects.create(name='Proyectores')
+        self.product = RentalProduct.objects.create(
+            name='Proyector', description='', sku='PRY-1', stock_quantity=5, category=category
+        )
+        self.plan = RentalPlan.objects.create(
+            product=self.product, period='WEEKLY', base_price=Decimal('70.00'), maintenance_price=Decimal('5.50')
+        )
+
+    def create_contract(self):
+        self.user = get_user_model().objects.create_user(username=f'arrendatario{RentalContract.objects.count()}')
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/v1/leasing/contracts/', {
+            'product': self.product.pk, 'plan': self.plan.pk, 'start_date': '2026-05-01', 'end_date': '2026-05-20',
+            'total_cost': '151.00',
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return RentalContract.objects.get(pk=response.data['id'])
+
+    def test_contract_stores_template_version_and_terms(self):
+        contract = self.create_contract()
+        self.assertEqual((contract.template_id, contract.contract_document), (1, ''))
+        self.assertEqual(contract.terms['sku'], 'PRY-1')
+
+        response = self.client.get('/api/v1/leasing/contracts/')
+        self.assertNotIn('contract_document', response.data[0])
+
+        document = self.client.get(f'/api/v1/leasing/contracts/{contract.pk}/').data['contract_document']
+        # 19 días en plan semanal: 2 semanas de 70.00 + 5.50
+        self.assertIn('• Periodo: 2026-05-01 a 2026-05-20', document)
+        self.assertIn('• TOTAL: $151.00', document)
+        self.assertTrue(document.endswith(f"FECHA: {contract.terms['issued_at']}"))
+        # Los cambios de precio posteriores no alteran el contrato emitido
+        RentalPlan.objects.filter(pk=self.plan.pk).update(base_price=Decimal('99.00'))
+        self.assertEqual(self.client.get(f'/api/v1/leasing/contracts/{contract.pk}/').data['contract_document'], document)
+
+    def test_quote_and_contract_render_the_same_document(self):
+        quote = self.client.post('/api/v1/leasing/quote/', {
+            'product_id': self.product.pk, 'period': 'WEEKLY', 'start_date': '2026-05-01', 'end_date': '2026-05-20'
+        }).data['contract_document']
+        contract = self.create_contract()
+        rendered = documents.render_contract(contract)
+        # Solo cambia la fecha de emisión
+        self.assertEqual(quote.rsplit('FECHA:', 1)[0], rendered.rsplit('FECHA:', 1)[0])
+
+        # La plantilla compilada queda en caché: generar otro documento no consulta la base
+        with self.assertNumQueries(0):
+            documents.render_contract(contract)
+
+    def test_sign_renders_the_document_for_the_customer_only(self):
+        contract = self.create_contract()
+        customer = self.user
+        self.client.force_authenticate(user=get_user_model().objects.create_user(username='otro'))
+        response = self.client.post(f'/api/v1/leasing/contracts/{contract.pk}/sign/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=customer)
+        response = self.client.post(f'/api/v1/leasing/contracts/{contract.pk}/sign/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['is_signed'])
+        self.assertEqual(response.data['template_version'], 1)
+        self.assertIn('CONTRATO DE ARRENDAMIENTO - Proyector', response.data['contract_document'])
+
+    def test_signature_and_status_change_only_through_sign(self):
+        contract = self.create_contract()
+        response = self.client.patch(f'/api/v1/leasing/contracts/{contract.pk}/', {'is_signed': True, 'status': 'ACTIVE'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        contract.refresh_from_db()
+        self.assertEqual((contract.is_signed, contract.status), (False, 'PENDING'))
+
+        # Firma presencial desde el panel: el personal firma y activa el contrato
+        self.client.force_authenticate(user=get_user_model().objects.create_user(username='staff', is_staff=True))
+        response = self.client.post(f'/api/v1/leasing/contracts/{contract.pk}/sign/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['is_signed'], response.data['status']), (True, 'ACTIVE'))
+
+    def test_quotes_without_a_published_template_are_rejected(self):
+        ContractTemplate.objects.all().delete()
+
+        response = self.client.post('/api/v1/leasing/quote/', {
+            'product_id': self.product.pk, 'period': 'WEEKLY', 'start_date': '2026-05-01', 'end_date': '2026-05-20'
+        })
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_published_templates_are_immutable_and_versioned(self):
+        contract = self.create_contract()
+        template = ContractTemplate.objects.get(version=1)
+        template.body = 'Otro texto'
+        with self.assertRaises(ValidationError):
+            template.save()
+
+        ContractTemplate.objects.create(version=2, body='Contrato {{ sku }} por ${{ total_cost }}')
+        newer = self.create_contract()
+        self.assertEqual(documents.render_contract(newer), 'Contrato PRY-1 por $151.00')
+        # Los contratos emitidos siguen con su versión
+        self.assertTrue(documents.render_contract(contract).startswith('CONTRATO DE ARRENDAMIENTO'))
+        # Contratos antiguos sin plantilla: se muestra su texto guardado
+        contract.template, contract.contract_document = None, 'Texto firmado'
+        self.assertEqual(documents.render_contract(contract), 'Texto firmado')
+
+
+class ContractLifecycleTests(APITestCase):
+    """
+    Pruebas del ciclo de vida automático: cancelación de pendientes sin pago,
+    cierre de activos terminados con devolución al libro de stock, por lotes e idempotente.
+    """
+
+    def setUp(self):
+        category = RentalCategory.objects.create(name='Audio')
+        self.product = RentalProduct.objects.create(
+            name='Parlante', description='', sku='PAR-1', stock_quantity=20, category=category
+        )
+        self.plan = RentalPlan.objects.create(product=self.product, period='DAILY', base_price=Decimal('10.00'))
+        self.now = timezone.now()
+
+    def contract(self, status, end_date, hours_old=0):
+        customer = get_user_model().objects.create_user(username=f'c{RentalContract.objects.count()}')
+        contract = RentalContract.objects.create(
+            customer=customer, product=self.product, plan=self.plan, start_date=date(2026, 1, 1), end_date=end_date,
+            total_cost=Decimal('10.00'), status=status
+        )
+        RentalContract.objects.filter(pk=contract.pk).update(created_at=self.now - timedelta(hours=hours_old))
+        return contract
+
+    def returns(self):
+        return StockMovement.objects.filter(kind=StockMovement.RENTAL_IN).count()
+
+    def test_transitions_are_applied_once(self):
+        today = timezone.localdate(self.now)
+        finished = self.contract('ACTIVE', today)
+        running = self.contract('ACTIVE', today + timedelta(days=3))
+        unpaid = self.contract('PENDING', today + timedelta(days=3), hours_old=72)
+        recent = self.contract('PENDING', today + timedelta(days=3), hours_old=1)
+        paid = self.contract('PENDING', today + timedelta(days=3), hours_old=72)
+        outbox.drain()
+        Invoice.objects.filter(rental_contract=paid).update(status='PAID')
+
+        self.assertEqual(lifecycle.run(now=self.now), {'canceled': 1, 'completed': 1})
+        statuses = dict(RentalContract.objects.values_list('pk', 'status'))
+        self.assertEqual(
+            [statuses[c.pk] for c in (finished, running, unpaid, recent, paid)],
+            ['COMPLETED', 'ACTIVE', 'CANCELED', 'PENDING', 'PENDING']
+        )
+        self.assertEqual(ledger.stock_at(self.product, timezone.now())['rented_out'], 1)
+
+        # Repetir la corrida no cambia estados ni vuelve a devolver unidades
+        self.assertEqual(lifecycle.run(now=self.now), {'canceled': 0, 'completed': 0})
+        self.assertEqual(self.returns(), 1)
+
+    def test_batches_cover_every_due_contract(self):
+        yesterday = timezone.localdate(self.now) - timedelta(days=1)
+        for _ in range(5):
+            self.contract('ACTIVE', yesterday)
+        self.assertEqual(lifecycle.run(batch_size=2, now=self.now)['completed'], 5)
+        self.assertEqual(self.returns(), 5)
+        self.assertFalse(RentalContract.objects.filter(status='ACTIVE').exists())
+
+    def test_due_contracts_are_found_through_the_status_index(self):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute(
+                f"EXPLAIN SELECT id FROM {RentalContract._meta.db_table} "
+                f"WHERE status = 'ACTIVE' AND end_date <= %s ORDER BY end_date, id",
+                [timezone.localdate(self.now)],
+            )
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        self.assertIn('rentalcontract_status_end_idx', plan)
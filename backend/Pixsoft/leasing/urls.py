@@ -1,14 +1,20 @@
 # leasing/urls.py
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ProductListView, ContractViewSet, PlanListView, calculate_quote
+from .views import (
+    AvailabilityView, BatchQuoteView, ProductListView, ProductExportView, ProductImportView, ContractViewSet, PlanListView, calculate_quote
+)
 
 router = DefaultRouter()
 router.register(r'contracts', ContractViewSet, basename='contract')
 
 urlpatterns = [
     path('products/', ProductListView.as_view(), name='product-list'),
+    path('products/export/', ProductExportView.as_view(), name='product-export'),
+    path('products/import/', ProductImportView.as_view(), name='product-import'),
     path('plans/', PlanListView.as_view(), name='plan-list'),
+    path('availability/', AvailabilityView.as_view(), name='availability'),
     path('quote/', calculate_quote, name='calculate-quote'),  # ¡ESTA ES LA RUTA QUE FALTABA!
+    path('quote/batch/', BatchQuoteView.as_view(), name='batch-quote'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,5 +1,17 @@
 from decimal import Decimal
 from datetime import date
+from django.contrib.postgres.aggregates import JSONBAgg
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.functions import JSONObject
+from .models import RentalPlan, RentalProduct
+
+# Días de cada periodo de cobro
+PERIOD_DAYS = {
+    'DAILY': 1,
+    'WEEKLY': 7,
+    'MONTHLY': 30,  # Simplificado
+    'ANNUAL': 365   # Simplificado
+}
 
 def calculate_rental_cost(plan, start_date: date, end_date: date):
     """
@@ -12,14 +24,7 @@ def calculate_rental_cost(plan, start_date: date, end_date: date):
         return Decimal('0.00'), 0, 0
     
     # Calcular cantidad de periodos
-    period_multiplier = {
-        'DAILY': 1,
-        'WEEKLY': 7,
-        'MONTHLY': 30,  # Simplificado
-        'ANNUAL': 365   # Simplificado
-    }
-    
-    multiplier = period_multiplier.get(plan.period, 30)
+    multiplier = PERIOD_DAYS.get(plan.period, 30)
     duration_units = max(1, duration_days // multiplier)
     
     # Si la división no es exacta, ¿cobramos fracción o periodo completo?
@@ -38,3 +43,34 @@ def calculate_rental_cost(plan, start_date: date, end_date: date):
     total_cost = base_cost + maintenance_cost
     
     return total_cost, duration_days, duration_units
+
+
+# Columnas de la exportación del catálogo de arrendamiento (ver api/export.py)
+RENTAL_PRODUCT_EXPORT_COLUMNS = (
+    'id', 'sku', 'name', 'category', 'stock_quantity', 'specifications', 'plans', 'updated_at',
+)
+
+
+def rental_product_export(since=None):
+    """
+    (columnas, values_list) de la exportación de equipos con sus planes anidados.
+    Los planes se agregan en la misma consulta (jsonb_agg), así cada fila se
+    serializa sin consultas extra. Con `since` entran los equipos modificados o con
+    algún plan modificado desde esa fecha.
+    """
+    products = RentalProduct.objects.order_by('pk')
+    if since:
+        changed_plans = RentalPlan.objects.filter(product=OuterRef('pk'), updated_at__gte=since)
+        products = products.filter(Q(updated_at__gte=since) | Exists(changed_plans))
+    products = products.annotate(
+        plan_list=JSONBAgg(
+            JSONObject(
+                id='plans__id', period='plans__period', base_price='plans__base_price',
+                maintenance_price='plans__maintenance_price',
+            ),
+            filter=Q(plans__isnull=False), order_by='plans__id', default=[],
+        )
+    )
+    return RENTAL_PRODUCT_EXPORT_COLUMNS, products.values_list(
+        'id', 'sku', 'name', 'category__name', 'stock_quantity', 'specifications', 'plan_list', 'updated_at'
+    )
@@ -6,22 +6,104 @@ from rest_framework import status, permissions
 from rest_framework.permissions import AllowAny
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from .models import RentalProduct, RentalContract, RentalPlan, RentalCategory
-from .serializers import RentalProductSerializer, RentalContractSerializer, RentalPlanSerializer
+from .serializers import (
+    BatchQuoteSerializer, RentalProductSerializer, RentalContractSerializer, RentalContractDetailSerializer,
+    RentalPlanSerializer,
+)
+from api.cache import cache_response
+from api.conditional import conditional_get
+from api.export import streaming_export
+from .utils import rental_product_export
+from products.importer import import_upload
+from . import availability, documents
+from .quotes import quote_many
+from api.pagination import KeysetPagination
 from decimal import Decimal
 import datetime
 from django.utils import timezone
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes
 from datetime import datetime as dt
 
 # Vista para productos
 class ProductListView(APIView):
     permission_classes = [AllowAny]
-    
+    # Paginación por cursor sobre (name, id); índice rentalproduct_name_id_idx
+    ordering = ('name', 'id')
+
+    @conditional_get
+    @cache_response('rental_products', 'rental_plans')
     def get(self, request):
-        products = RentalProduct.objects.all()
+        paginator = KeysetPagination()
+        products = paginator.paginate_queryset(RentalProduct.objects.all(), request, view=self)
         serializer = RentalProductSerializer(products, many=True)
-        return Response(serializer.data)
+        return paginator.get_paginated_response(serializer.data)
+
+# Exportación del catálogo de arrendamiento con planes (?output=, ?since=, ?compression=gzip)
+class ProductExportView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        response = streaming_export(request, rental_product_export, 'equipos')
+        if response is None:
+            return Response({"detail": "Parámetros de exportación inválidos."}, status=status.HTTP_400_BAD_REQUEST)
+        return response
+
+# Importación masiva de equipos por SKU (multipart: file=.csv|.ndjson[.gz])
+class ProductImportView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"detail": "Falta el archivo ('file')."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            summary = import_upload('rental', upload, request.data.get('create_categories') == 'true')
+        except ValueError as error:
+            return Response({"detail": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(summary)
+
+# Calendario de disponibilidad por día de varios equipos
+# URL: /api/v1/leasing/availability/?products=1,2,3&start=2026-01-01&end=2026-02-01
+class AvailabilityView(APIView):
+    permission_classes = [AllowAny]
+    max_products = 100
+
+    def get(self, request):
+        try:
+            product_ids = [int(pk) for pk in request.query_params.get('products', '').split(',') if pk]
+            start_date = dt.strptime(request.query_params['start'], '%Y-%m-%d').date()
+            end_date = dt.strptime(request.query_params['end'], '%Y-%m-%d').date()
+        except (KeyError, ValueError):
+            return Response(
+                {'error': 'Parámetros requeridos: products (ids separados por coma), start y end (YYYY-MM-DD)'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not product_ids or len(product_ids) > self.max_products:
+            return Response({'error': f'Indique entre 1 y {self.max_products} equipos'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 < (end_date - start_date).days <= availability.MAX_CALENDAR_DAYS:
+            return Response(
+                {'error': f'La ventana debe tener entre 1 y {availability.MAX_CALENDAR_DAYS} días'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        products = list(RentalProduct.objects.filter(pk__in=product_ids).only('pk', 'stock_quantity').order_by('pk'))
+        calendar = availability.daily_availability(products, start_date, end_date)
+        return Response({
+            'start': start_date,
+            'end': end_date,
+            'dates': availability.calendar_dates(start_date, end_date),
+            'products': [
+                {
+                    'product_id': product.pk,
+                    'stock_quantity': product.stock_quantity,
+                    'available': calendar[product.pk],
+                    'min_available': min(calendar[product.pk]),
+                }
+                for product in products
+            ],
+        })
 
 # Vista para contratos
 class ContractViewSet(viewsets.ModelViewSet):
@@ -29,13 +111,79 @@ class ContractViewSet(viewsets.ModelViewSet):
     serializer_class = RentalContractSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            # El listado no muestra el documento: no se leen sus parámetros ni el texto antiguo
+            queryset = queryset.defer('terms', 'contract_document')
+        return queryset
+
+    def get_serializer_class(self):
+        # El documento se genera solo en el detalle y al firmar
+        if self.action in ('retrieve', 'sign'):
+            return RentalContractDetailSerializer
+        return super().get_serializer_class()
+
+    def lock_units(self, product, start_date, end_date, exclude_contract=None):
+        """
+        Bloquea el equipo (el lock serializa las reservas concurrentes del mismo
+        equipo) y verifica que quede una unidad libre en [start_date, end_date).
+        Debe ejecutarse dentro de una transacción.
+        """
+        product = RentalProduct.objects.select_for_update().get(pk=product.pk)
+        if availability.available_units(product, start_date, end_date, exclude_contract=exclude_contract) < 1:
+            raise serializers.ValidationError({'product': 'No hay unidades disponibles para esas fechas.'})
+        return product
+
     def perform_create(self, serializer):
-        serializer.save(customer=self.request.user)
+        product, start_date, end_date = (serializer.validated_data[key] for key in ('product', 'start_date', 'end_date'))
+        with transaction.atomic():
+            product = self.lock_units(product, start_date, end_date)
+            # Se guarda la versión vigente de la plantilla y los parámetros, no el texto
+            serializer.save(
+                customer=self.request.user,
+                template_id=documents.current_version(),
+                terms=documents.build_terms(product, serializer.validated_data['plan']),
+            )
+
+    def perform_update(self, serializer):
+        instance = serializer.instance
+        product, start_date, end_date = (
+            serializer.validated_data.get(key, getattr(instance, key)) for key in ('product', 'start_date', 'end_date')
+        )
+        with transaction.atomic():
+            # El contrato no compite consigo mismo: sus días actuales se liberan al moverlo
+            if instance.status in ('PENDING', 'ACTIVE'):
+                self.lock_units(product, start_date, end_date, exclude_contract=instance.pk)
+            serializer.save()
+
+    @action(detail=True, methods=['post'])
+    def sign(self, request, pk=None):
+        """
+        Firma del contrato por su cliente o por el personal (firma presencial desde el
+        panel de arrendamiento, que además activa el contrato pendiente). Retorna el
+        documento firmado.
+        """
+        contract = self.get_object()
+        if contract.customer_id != request.user.id and not request.user.is_staff:
+            return Response({'error': 'Solo el cliente puede firmar su contrato.'}, status=status.HTTP_403_FORBIDDEN)
+        fields = []
+        if not contract.is_signed:
+            contract.is_signed = True
+            fields.append('is_signed')
+        if request.user.is_staff and contract.status == 'PENDING':
+            contract.status = 'ACTIVE'
+            fields.append('status')
+        if fields:
+            contract.save(update_fields=fields)
+        return Response(self.get_serializer(contract).data)
 
 # Vista para planes
 class PlanListView(APIView):
     permission_classes = [AllowAny]
-    
+
+    @conditional_get
+    @cache_response('rental_plans')
     def get(self, request):
         plans = RentalPlan.objects.all()
         serializer = RentalPlanSerializer(plans, many=True)
@@ -94,6 +242,20 @@ def calculate_quote(request):
                 {'error': 'La fecha de fin debe ser posterior a la fecha de inicio'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+
+        # Disponibilidad: unidades libres en todo el periodo (una consulta indexada)
+        try:
+            quantity = int(data.get('quantity', 1))
+            if quantity <= 0: raise ValueError
+        except (TypeError, ValueError):
+            return Response({'error': 'Cantidad inválida.'}, status=status.HTTP_400_BAD_REQUEST)
+        available_units = availability.available_units(product, start_date, end_date)
+        if available_units < quantity:
+            return Response({
+                'error': 'No hay unidades disponibles para esas fechas',
+                'available_units': available_units,
+                'product_name': product.name
+            }, status=status.HTTP_409_CONFLICT)
         
         # Calcular cantidad de periodos
         period_multiplier = {
@@ -110,31 +272,11 @@ def calculate_quote(request):
         maintenance_cost = plan.maintenance_price * Decimal(duration_units)
         total_cost = base_cost + maintenance_cost
         
-        # Generar documento de contrato
-        contract_document = f"""CONTRATO DE ARRENDAMIENTO - {product.name}
-
-DETALLES DEL CONTRATO:
-• Producto: {product.name}
-• SKU: {product.sku}
-• Plan: {plan.get_period_display()}
-• Periodo: {start_date_str} a {end_date_str}
-• Duración: {duration_days} días ({duration_units} {plan.get_period_display().lower()}(s))
-
-DETALLES DE COSTO:
-• Precio base por {plan.get_period_display().lower()}: ${float(plan.base_price):.2f}
-• Mantenimiento/seguro por {plan.get_period_display().lower()}: ${float(plan.maintenance_price):.2f}
-• Costo base: ${float(base_cost):.2f}
-• Costo mantenimiento: ${float(maintenance_cost):.2f}
-• TOTAL: ${float(total_cost):.2f}
-
-TÉRMINOS Y CONDICIONES:
-1. El equipo debe ser devuelto en las mismas condiciones.
-2. Cualquier daño será responsabilidad del arrendatario.
-3. El pago debe realizarse al inicio del contrato.
-4. Cancelaciones con menos de 24h de anticipación incurren en penalización.
-
-FIRMA DEL CLIENTE: _________________________
-FECHA: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"""
+        # Generar documento de contrato (plantilla vigente, compilada una vez por proceso)
+        try:
+            contract_text = documents.quote_document(product, plan, start_date, end_date)
+        except documents.NoTemplate as error:
+            return Response({'error': str(error)}, status=status.HTTP_409_CONFLICT)
         
         return Response({
             'product_id': product.id,
@@ -148,11 +290,27 @@ FECHA: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"""
             'base_price_per_unit': float(plan.base_price),
             'maintenance_price_per_unit': float(plan.maintenance_price),
             'total_cost': float(total_cost),
-            'contract_document': contract_document
+            'available_units': available_units,
+            'contract_document': contract_text
         })
         
     except Exception as e:
         return Response(
             {'error': f'Error interno: {str(e)}'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
\ No newline at end of file
+        )
+
+# Cotización masiva (página de comparación)
+# URL: /api/v1/leasing/quote/batch/  {"items": [{"product_id", "period", "start_date", "end_date", "quantity"}]}
+class BatchQuoteView(APIView):
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        serializer = BatchQuoteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            results = quote_many(serializer.validated_data['items'], serializer.validated_data['include_document'])
+        except documents.NoTemplate as error:
+            return Response({'error': str(error)}, status=status.HTTP_409_CONFLICT)
+        return Response({'results': results})
+
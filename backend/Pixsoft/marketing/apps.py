@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class MarketingConfig(AppConfig):
+    name = "marketing"
+
+    def ready(self):
+        import marketing.signals
@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from api.cache import catalog_cache
+from .models import Banner
+
+@receiver(post_save, sender=Banner)
+@receiver(post_delete, sender=Banner)
+def invalidate_banner_cache(sender, instance, **kwargs):
+    """Los banners públicos cacheados dejan de ser válidos."""
+    catalog_cache.invalidate('banners')
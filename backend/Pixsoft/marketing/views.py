@@ -5,6 +5,7 @@ from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from django.utils import timezone
 from .models import Promotion, Coupon, Campaign, Banner
 from .serializers import PromotionSerializer, CouponSerializer, CampaignSerializer, BannerSerializer
+from api.cache import cache_response
 
 class PromotionViewSet(viewsets.ModelViewSet):
     queryset = Promotion.objects.all()
@@ -56,6 +57,14 @@ class BannerViewSet(viewsets.ModelViewSet):
     queryset = Banner.objects.filter(is_active=True)
     serializer_class = BannerSerializer
     permission_classes = [AllowAny] # Público puede ver banners
+
+    @cache_response('banners')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_response('banners')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import generics, permissions
@@ -0,0 +1,20 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from orders.rollup import backfill
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula el resumen diario de ventas (DailySalesRollup) desde los pedidos. "
+        "Sin fechas recalcula toda la historia; con --from/--to solo ese rango de días."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', type=date.fromisoformat, help="Primer día (AAAA-MM-DD)")
+        parser.add_argument('--to', dest='date_to', type=date.fromisoformat, help="Último día (AAAA-MM-DD)")
+
+    def handle(self, *args, **options):
+        rows = backfill(options['date_from'], options['date_to'])
+        self.stdout.write(self.style.SUCCESS(f"Resumen diario recalculado: {rows} filas (día, estado)."))
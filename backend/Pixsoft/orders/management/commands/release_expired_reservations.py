@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.reservations import release_expired
+
+
+class Command(BaseCommand):
+    help = (
+        "Libera (borra) las reservas de stock vencidas por lotes. Pensado para ejecutarse "
+        "periódicamente (cron); con --every queda en ejecución barriendo cada N segundos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Reservas borradas por transacción")
+        parser.add_argument('--every', type=int, default=0, help="Segundos entre barridos (0 = una sola vez)")
+
+    def handle(self, *args, **options):
+        while True:
+            released = release_expired(batch_size=options['batch_size'])
+            self.stdout.write(f"Reservas vencidas liberadas: {released}")
+            if not options['every']:
+                return
+            time.sleep(options['every'])
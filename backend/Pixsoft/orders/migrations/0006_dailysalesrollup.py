@@ -0,0 +1,60 @@
+# Generated by Django 6.0 on 2026-10-18 11:20
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def populate_rollup(apps, schema_editor):
+    # Carga inicial del resumen con los pedidos existentes (mismo cálculo que orders.rollup.backfill)
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    DailySalesRollup = apps.get_model('orders', 'DailySalesRollup')
+    items = OrderItem.objects.filter(order=OuterRef('pk')).values('order').annotate(total=Sum('quantity')).values('total')
+    rows = Order.objects.annotate(
+        day=TruncDate('created_at'), units=Coalesce(Subquery(items, output_field=IntegerField()), 0)
+    ).values('day', 'status').annotate(
+        revenue=Sum('total_price'), orders=Count('pk'), item_count=Sum('units')
+    ).order_by()
+    DailySalesRollup.objects.bulk_create(
+        DailySalesRollup(
+            date=row['day'], status=row['status'], revenue=row['revenue'],
+            order_count=row['orders'], item_count=row['item_count'],
+        )
+        for row in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_stockreservation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Día')),
+                ('status', models.CharField(choices=[('pending', 'Pendiente'), ('processing', 'En proceso'), ('shipped', 'Enviado'), ('delivered', 'Entregado'), ('canceled', 'Cancelado')], max_length=20)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('order_count', models.IntegerField(default=0)),
+                ('item_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Resumen Diario de Ventas',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at', 'id'], name='order_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailysalesrollup',
+            constraint=models.UniqueConstraint(fields=('date', 'status'), name='unique_rollup_date_status'),
+        ),
+        migrations.RunPython(populate_rollup, migrations.RunPython.noop),
+    ]
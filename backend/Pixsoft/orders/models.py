@@ -2,9 +2,11 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
-from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
+from django.utils.functional import cached_property
 from leasing.models import RentalPlan
 from leasing.utils import calculate_rental_cost
+from products.models import SaleProduct
 
 User = get_user_model()
 
@@ -19,6 +21,16 @@ class Cart(models.Model):
     def __str__(self):
         return f"Carrito de {self.user.username}"
 
+class ProductItemQuerySet(models.QuerySet):
+
+    def with_products(self):
+        """
+        Ítems listos para serializar: el producto genérico se carga con UNA consulta
+        por tipo de contenido (prefetch del GenericForeignKey) y el plan de alquiler
+        junto con su producto (lo usa RentalPlan.__str__).
+        """
+        return self.select_related('rental_plan__product').prefetch_related('product')
+
 class CartItem(models.Model):
     """
     Modelo que representa un ítem dentro del carrito de compras.
@@ -38,6 +50,8 @@ class CartItem(models.Model):
     rental_start_date = models.DateField(null=True, blank=True)
     rental_end_date = models.DateField(null=True, blank=True)
 
+    objects = ProductItemQuerySet.as_manager()
+
     class Meta:
         # Evita duplicados del mismo producto en el carrito, a menos que sea un plan de renta distinto
         unique_together = ('cart', 'content_type', 'object_id', 'rental_plan')
@@ -45,10 +59,11 @@ class CartItem(models.Model):
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
 
-    @property
+    @cached_property
     def item_price(self):
         """
-        Calcula el precio del ítem.
+        Calcula el precio del ítem (una vez por instancia: total_price y el total
+        del carrito lo reutilizan).
         Si es un producto de venta, usa su precio.
         Si es un producto de arrendamiento, usa el precio base del plan.
         """
@@ -66,6 +81,14 @@ class CartItem(models.Model):
         """
         return self.item_price * self.quantity
 
+class OrderQuerySet(models.QuerySet):
+
+    def with_details(self):
+        """Pedidos con usuario, ítems, productos y planes precargados (consultas fijas)."""
+        return self.select_related('user').prefetch_related(
+            models.Prefetch('items', queryset=OrderItem.objects.with_products())
+        )
+
 class Order(models.Model):
     """
     Modelo que representa un pedido de un usuario.
@@ -87,6 +110,16 @@ class Order(models.Model):
     # Podríamos añadir más campos para la dirección de envío, método de pago, etc.
     # shipping_address = models.ForeignKey('users.Address', on_delete=models.SET_NULL, null=True)
 
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Historial de pedidos del usuario paginado por cursor
+            models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_idx'),
+            # Actividad reciente del dashboard
+            models.Index(fields=['created_at', 'id'], name='order_created_idx'),
+        ]
+
     def __str__(self):
         return f"Pedido #{self.id} de {self.user.username}"
 
@@ -111,9 +144,68 @@ class OrderItem(models.Model):
     rental_start_date = models.DateField(null=True, blank=True)
     rental_end_date = models.DateField(null=True, blank=True)
 
+    objects = ProductItemQuerySet.as_manager()
+
     def __str__(self):
         return f"Ítem de pedido {self.id} para el pedido #{self.order.id}"
 
     @property
     def total_price(self):
         return self.price_at_purchase * self.quantity
+
+class StockReservationQuerySet(models.QuerySet):
+
+    def live(self):
+        """Reservas vigentes (las vencidas ya no retienen stock aunque sigan en la tabla)."""
+        return self.filter(expires_at__gt=timezone.now())
+
+    def expired(self):
+        return self.filter(expires_at__lte=timezone.now())
+
+class StockReservation(models.Model):
+    """
+    Retención temporal de stock de un producto de venta para un carrito.
+    Stock disponible = stock_quantity - reservas vigentes de todos los carritos.
+    """
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='reservations')
+    product = models.ForeignKey(SaleProduct, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(verbose_name="Vence")
+
+    objects = StockReservationQuerySet.as_manager()
+
+    class Meta:
+        verbose_name_plural = "Reservas de Stock"
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product_reservation'),
+        ]
+        indexes = [
+            # Suma de reservas vigentes por producto y barrido de vencidas
+            models.Index(fields=['product', 'expires_at'], name='reservation_product_exp_idx'),
+            models.Index(fields=['expires_at'], name='reservation_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} (carrito {self.cart_id}) hasta {self.expires_at:%H:%M}"
+
+
+
+class DailySalesRollup(models.Model):
+    """
+    Ventas agregadas por día y estado de pedido, mantenidas de forma incremental
+    (ver orders/rollup.py). El dashboard lee de aquí en lugar de recorrer Order.
+    """
+    date = models.DateField(verbose_name="Día")
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    order_count = models.IntegerField(default=0)
+    item_count = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Resumen Diario de Ventas"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'status'], name='unique_rollup_date_status'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.status}: {self.order_count} pedidos, ${self.revenue}"
@@ -0,0 +1,150 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Sum, When
+from django.db.models.functions import Now
+from django.utils import timezone
+from products import ledger
+from products.models import SaleProduct
+from leasing import availability
+from leasing.models import RentalProduct
+from .models import StockReservation
+
+# Regla de concurrencia: toda operación que lee y luego modifica el stock (reservar,
+# comprar, pagar un carrito) bloquea primero las filas de SaleProduct en orden de id.
+# Así dos operaciones sobre el mismo SKU se serializan sin deadlocks y cada una ve
+# las reservas confirmadas por la anterior.
+
+
+class InsufficientStock(Exception):
+    """Algún producto no tiene stock disponible suficiente."""
+
+    def __init__(self, shortages):
+        super().__init__("Stock insuficiente para completar el pedido.")
+        self.shortages = shortages
+
+
+def reservation_expiry():
+    return timezone.now() + timedelta(minutes=settings.STOCK_RESERVATION_TTL_MINUTES)
+
+
+def lock_products(product_ids):
+    """SELECT ... FOR UPDATE de los productos en orden determinista. Retorna {id: producto}."""
+    return {
+        product.pk: product
+        for product in SaleProduct.objects.select_for_update().filter(pk__in=product_ids).order_by('pk')
+    }
+
+
+def held_quantities(product_ids, exclude_cart=None):
+    """Unidades retenidas por reservas vigentes, por producto (una consulta agregada)."""
+    reservations = StockReservation.objects.live().filter(product_id__in=product_ids)
+    if exclude_cart is not None:
+        reservations = reservations.exclude(cart=exclude_cart)
+    return dict(reservations.values('product').annotate(total=Sum('quantity')).values_list('product', 'total'))
+
+
+def check_available(locked, quantities, held):
+    """Lanza InsufficientStock con el detalle de los productos que no alcanzan."""
+    shortages = []
+    for pk, quantity in quantities.items():
+        available = locked[pk].stock_quantity - held.get(pk, 0) if pk in locked else 0
+        if available < quantity:
+            shortages.append({"product_id": pk, "requested": quantity, "available": max(available, 0)})
+    if shortages:
+        raise InsufficientStock(shortages)
+
+
+def check_rental(product_id, quantity, start_date, end_date):
+    """
+    Equipos de arrendamiento: no se reservan en el carrito, pero se verifica que
+    haya `quantity` unidades libres en todo el periodo (contratos vigentes que se
+    solapan, vía el índice GiST de leasing).
+    """
+    if not (start_date and end_date):
+        return
+    product = RentalProduct.objects.only('pk', 'stock_quantity').get(pk=product_id)
+    available = availability.available_units(product, start_date, end_date)
+    if available < quantity:
+        raise InsufficientStock([{"product_id": product_id, "requested": quantity, "available": available}])
+
+
+def reserve(cart, product_id, quantity):
+    """
+    Crea o ajusta la reserva del carrito para el producto (cantidad total, no
+    incremental) y renueva su vencimiento.
+    """
+    with transaction.atomic():
+        locked = lock_products([product_id])
+        check_available(locked, {product_id: quantity}, held_quantities([product_id], exclude_cart=cart))
+        StockReservation.objects.update_or_create(
+            cart=cart, product_id=product_id,
+            defaults={'quantity': quantity, 'expires_at': reservation_expiry()}
+        )
+
+
+def release(cart, product_id):
+    cart.reservations.filter(product_id=product_id).delete()
+
+
+def extend(cart):
+    """Renueva las reservas vigentes del carrito (las vencidas se recalculan al pagar)."""
+    return cart.reservations.live().update(expires_at=reservation_expiry())
+
+
+def purchase(product_id, quantity):
+    """
+    Venta directa de un producto respetando las reservas de los carritos.
+    Retorna el stock resultante.
+    """
+    with transaction.atomic():
+        locked = lock_products([product_id])
+        check_available(locked, {product_id: quantity}, held_quantities([product_id]))
+        SaleProduct.objects.filter(pk=product_id).update(
+            stock_quantity=F('stock_quantity') - quantity, updated_at=Now()
+        )
+        ledger.record_sales(SaleProduct, {product_id: quantity}, 'purchase')
+    return locked[product_id].stock_quantity - quantity
+
+
+def convert_to_sale(cart, quantities):
+    """
+    Checkout: convierte las reservas del carrito en descuentos de stock.
+
+    Los productos cubiertos por una reserva vigente solo se comparan contra su stock
+    (la reserva ya aparta las unidades de otros carritos, pero el stock pudo bajar
+    por fuera, p. ej. un ajuste del admin); los que no tienen reserva suficiente
+    (vencida o inexistente) se comparan contra el stock libre. Luego se descuenta
+    todo con UN UPDATE y se borran las reservas del carrito.
+    Debe ejecutarse dentro de una transacción. Retorna {id: producto bloqueado}.
+    """
+    locked = lock_products(quantities)
+    own = dict(cart.reservations.live().values_list('product', 'quantity'))
+    uncovered = {pk: quantity for pk, quantity in quantities.items() if own.get(pk, 0) < quantity}
+    held = held_quantities(uncovered, exclude_cart=cart) if uncovered else {}
+    check_available(locked, quantities, held)
+
+    SaleProduct.objects.filter(pk__in=quantities).update(
+        stock_quantity=Case(*[When(pk=pk, then=F('stock_quantity') - quantity) for pk, quantity in quantities.items()]),
+        updated_at=Now(),
+    )
+    cart.reservations.all().delete()
+    return locked
+
+
+def release_expired(batch_size=1000):
+    """
+    Barre las reservas vencidas por lotes (cada lote en su propia transacción,
+    saltando filas bloqueadas por otra operación). Retorna cuántas se borraron.
+    """
+    released = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                StockReservation.objects.expired().select_for_update(skip_locked=True)
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                return released
+            StockReservation.objects.filter(pk__in=ids).delete()
+        released += len(ids)
@@ -0,0 +1,102 @@
+from django.db import connection, transaction
+from django.db.models import IntegerField, OuterRef, Subquery, Sum, Count
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from .models import DailySalesRollup, Order, OrderItem
+
+# Estados cuyo monto cuenta como ingreso en el dashboard
+REVENUE_STATUSES = ('processing', 'shipped', 'delivered')
+
+
+def order_day(order):
+    return timezone.localdate(order.created_at)
+
+
+def apply(deltas):
+    """
+    Suma deltas (día, estado, ingreso, pedidos, ítems) al resumen con UN
+    INSERT ... ON CONFLICT DO UPDATE. Las filas se escriben en orden de clave para
+    que dos transacciones que tocan los mismos días no se bloqueen mutuamente.
+    Se ejecuta en la transacción del pedido: si éste se deshace, el delta también.
+    """
+    deltas = sorted(delta for delta in deltas if any(delta[2:]))
+    if not deltas:
+        return
+    table = DailySalesRollup._meta.db_table
+    values = ', '.join(['(%s, %s, %s, %s, %s)'] * len(deltas))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (date, status, revenue, order_count, item_count)
+            VALUES {values}
+            ON CONFLICT (date, status) DO UPDATE SET
+                revenue = {table}.revenue + EXCLUDED.revenue,
+                order_count = {table}.order_count + EXCLUDED.order_count,
+                item_count = {table}.item_count + EXCLUDED.item_count
+            """,
+            [value for delta in deltas for value in delta],
+        )
+
+
+def item_total(order):
+    return order.items.aggregate(total=Sum('quantity'))['total'] or 0
+
+
+def order_created(order):
+    apply([(order_day(order), order.status, order.total_price, 1, 0)])
+
+
+def order_changed(order, old_status, old_total):
+    """Mueve el pedido de su estado anterior al nuevo (o corrige su monto)."""
+    items = item_total(order)
+    day = order_day(order)
+    apply([
+        (day, old_status, -old_total, -1, -items),
+        (day, order.status, order.total_price, 1, items),
+    ] if old_status != order.status else [
+        (day, order.status, order.total_price - old_total, 0, 0),
+    ])
+
+
+def order_deleted(order, items):
+    apply([(order_day(order), order.status, -order.total_price, -1, -items)])
+
+
+def items_added(order, quantity):
+    """Los ítems se crean con bulk_create (sin señales): el checkout informa el total."""
+    apply([(order_day(order), order.status, 0, 0, quantity)])
+
+
+def backfill(date_from=None, date_to=None):
+    """
+    Recalcula el resumen desde Order para el rango de días indicado (todo si no se
+    indica). Bloquea la tabla del resumen mientras tanto: las escrituras incrementales
+    en curso terminan antes del recálculo y las nuevas esperan a que acabe.
+    Retorna cuántas filas (día, estado) se escribieron.
+    """
+    orders = Order.objects.annotate(day=TruncDate('created_at'))
+    rollups = DailySalesRollup.objects.all()
+    if date_from:
+        orders, rollups = orders.filter(day__gte=date_from), rollups.filter(date__gte=date_from)
+    if date_to:
+        orders, rollups = orders.filter(day__lte=date_to), rollups.filter(date__lte=date_to)
+
+    items = OrderItem.objects.filter(order=OuterRef('pk')).values('order').annotate(total=Sum('quantity')).values('total')
+    rows = orders.annotate(
+        units=Coalesce(Subquery(items, output_field=IntegerField()), 0)
+    ).values('day', 'status').annotate(
+        revenue=Sum('total_price'), orders=Count('pk'), item_count=Sum('units')
+    ).order_by()
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {DailySalesRollup._meta.db_table} IN EXCLUSIVE MODE")
+        rollups.delete()
+        created = DailySalesRollup.objects.bulk_create(
+            DailySalesRollup(
+                date=row['day'], status=row['status'], revenue=row['revenue'],
+                order_count=row['orders'], item_count=row['item_count'],
+            )
+            for row in rows
+        )
+    return len(created)
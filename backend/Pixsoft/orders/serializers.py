@@ -1,8 +1,12 @@
 from rest_framework import serializers
 from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from .models import Cart, CartItem, Order, OrderItem
 from products.models import SaleProduct
 from leasing.models import RentalProduct, RentalPlan
+from .services import checkout
+from .reservations import check_rental, reserve
 
 class ProductRelatedField(serializers.RelatedField):
     """
@@ -41,8 +45,17 @@ class CartSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'items', 'total_cart_price', 'updated_at']
     
     def get_total_cart_price(self, obj):
+        # Con load_cart los ítems y sus precios ya están en memoria
         return sum(item.total_price for item in obj.items.all())
 
+def load_cart(cart):
+    """
+    Precarga los ítems del carrito con sus productos y planes para que
+    CartSerializer use un número fijo de consultas sin importar los ítems.
+    """
+    prefetch_related_objects([cart], Prefetch('items', queryset=CartItem.objects.with_products().order_by('pk')))
+    return cart
+
 class AddCartItemSerializer(serializers.ModelSerializer):
     """
     Serializador para añadir un ítem al carrito.
@@ -95,18 +108,26 @@ class AddCartItemSerializer(serializers.ModelSerializer):
             content_type = ContentType.objects.get_for_model(RentalProduct)
             rental_plan = RentalPlan.objects.get(id=rental_plan_id)
 
-        # Actualizar cantidad si el ítem ya existe, o crear uno nuevo
-        cart_item, created = CartItem.objects.update_or_create(
-            cart=cart,
-            content_type=content_type,
-            object_id=product_id,
-            rental_plan=rental_plan,
-            defaults={
-                'quantity': quantity,
-                'rental_start_date': rental_start_date,
-                'rental_end_date': rental_end_date
-            }
-        )
+        with transaction.atomic():
+            # Los productos de venta retienen stock mientras estén en el carrito
+            # (lanza InsufficientStock si no hay unidades libres)
+            if product_type == 'sale':
+                reserve(cart, product_id, quantity)
+            else:
+                check_rental(product_id, quantity, rental_start_date, rental_end_date)
+
+            # Actualizar cantidad si el ítem ya existe, o crear uno nuevo
+            cart_item, created = CartItem.objects.update_or_create(
+                cart=cart,
+                content_type=content_type,
+                object_id=product_id,
+                rental_plan=rental_plan,
+                defaults={
+                    'quantity': quantity,
+                    'rental_start_date': rental_start_date,
+                    'rental_end_date': rental_end_date
+                }
+            )
         
         self.instance = cart_item
         return self.instance
@@ -143,39 +164,15 @@ class CreateOrderSerializer(serializers.Serializer):
         user = self.context['request'].user
         cart = getattr(user, 'cart', None)
 
-        if not cart or not cart.items.exists():
+        if not cart:
             raise serializers.ValidationError("Tu carrito está vacío.")
 
-        # Crear el pedido
-        order = Order.objects.create(user=user)
-        total_price = 0
-
-        # Mover ítems del carrito al pedido
-        for cart_item in cart.items.all():
-            order_item = OrderItem.objects.create(
-                order=order,
-                content_type=cart_item.content_type,
-                object_id=cart_item.object_id,
-                product=cart_item.product,
-                quantity=cart_item.quantity,
-                price_at_purchase=cart_item.item_price,
-                rental_plan=cart_item.rental_plan,
-                rental_start_date=cart_item.rental_start_date,
-                rental_end_date=cart_item.rental_end_date
-            )
-            total_price += order_item.total_price
-        
-        # Actualizar el precio total del pedido
-        order.total_price = total_price
-        order.save()
-
-        # Limpiar el carrito
-        cart.items.all().delete()
-
-        return order
+        # Transacción única: stock, pedido, ítems y vaciado del carrito (ver orders/services.py)
+        return checkout(cart)
 
     def to_representation(self, instance):
         """
         Devuelve la representación detallada del pedido usando OrderSerializer.
         """
+        prefetch_related_objects([instance], Prefetch('items', queryset=OrderItem.objects.with_products()))
         return OrderSerializer(instance).data
@@ -0,0 +1,84 @@
+from collections import defaultdict
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+from products.models import SaleProduct
+from products import ledger
+from leasing.models import RentalProduct
+from api.cache import catalog_cache
+from .models import Order, OrderItem
+from .reservations import InsufficientStock, convert_to_sale
+from . import rollup
+
+
+def invalidate_stock_caches(locked, quantities):
+    """El stock cambió con update(): se invalidan solo las entradas de esos productos."""
+    catalog_cache.invalidate(*[f"product:{pk}" for pk in quantities])
+    if any(product.stock_quantity == quantities[pk] for pk, product in locked.items()):
+        catalog_cache.invalidate('products', 'facets')
+
+
+def checkout(cart):
+    """
+    Convierte el carrito en un pedido dentro de UNA transacción con un número fijo
+    de consultas, sin importar cuántos ítems tenga:
+    ítems del carrito, productos por tipo, lock + reservas + UPDATE del stock,
+    pedido (y su evento order.placed en el outbox), bulk_create de los ítems y vaciado
+    del carrito. La factura la crea el despachador del outbox tras confirmar.
+    """
+    with transaction.atomic():
+        items = list(cart.items.select_related('rental_plan').order_by('pk'))
+        if not items:
+            raise ValidationError("Tu carrito está vacío.")
+
+        sale_type = ContentType.objects.get_for_model(SaleProduct)
+        rental_type = ContentType.objects.get_for_model(RentalProduct)
+        quantities = defaultdict(int)
+        for item in items:
+            if item.content_type_id == sale_type.pk:
+                quantities[item.object_id] += item.quantity
+            elif item.content_type_id != rental_type.pk:
+                raise ValidationError("Tipo de producto inesperado en el carrito.")
+
+        # Las reservas vigentes del carrito se convierten en descuentos de stock
+        locked = convert_to_sale(cart, quantities) if quantities else {}
+
+        # Precios: los productos de venta ya están cargados (y bloqueados)
+        rental_ids = {item.object_id for item in items if item.content_type_id == rental_type.pk}
+        rentals = RentalProduct.objects.in_bulk(rental_ids) if rental_ids else {}
+        order_items = []
+        for item in items:
+            product = locked.get(item.object_id) if item.content_type_id == sale_type.pk else rentals.get(item.object_id)
+            if product is None:
+                raise ValidationError(f"El producto {item.object_id} ya no existe.")
+            item.product = product
+            order_items.append(OrderItem(
+                content_type_id=item.content_type_id,
+                object_id=item.object_id,
+                quantity=item.quantity,
+                price_at_purchase=item.item_price,
+                rental_plan=item.rental_plan,
+                rental_start_date=item.rental_start_date,
+                rental_end_date=item.rental_end_date,
+            ))
+
+        # El total se calcula antes de crear el pedido: confirma junto con su evento
+        # (la factura sale con el monto correcto) y el pedido se guarda una sola vez.
+        order = Order.objects.create(
+            user=cart.user,
+            total_price=sum(order_item.total_price for order_item in order_items),
+        )
+        for order_item in order_items:
+            order_item.order = order
+        OrderItem.objects.bulk_create(order_items)
+        # bulk_create no emite señales: las unidades se suman al resumen diario aquí
+        rollup.items_added(order, sum(order_item.quantity for order_item in order_items))
+        # Un movimiento de venta por producto en el libro de stock (un bulk_create)
+        if quantities:
+            ledger.record_sales(SaleProduct, quantities, f"order:{order.pk}")
+
+        cart.items.all().delete()
+
+        if quantities:
+            transaction.on_commit(lambda: invalidate_stock_caches(locked, quantities))
+    return order
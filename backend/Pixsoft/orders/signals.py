@@ -0,0 +1,48 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+from api import outbox
+from .models import Order, OrderItem
+from . import rollup
+
+@receiver(post_init, sender=Order)
+def remember_order_totals(sender, instance, **kwargs):
+    """
+    Estado y monto originales para mover el pedido entre filas del resumen diario
+    (None si el campo está diferido: leerlo aquí recargaría la instancia).
+    """
+    instance._loaded_rollup = loaded_totals(instance)
+
+def loaded_totals(instance):
+    return (instance.__dict__.get('status'), instance.__dict__.get('total_price'))
+
+@receiver(post_save, sender=Order)
+def update_sales_rollup(sender, instance, created, **kwargs):
+    if created:
+        rollup.order_created(instance)
+    else:
+        old_status, old_total = instance._loaded_rollup
+        # Sin los valores cargados (only()/defer()) no hay diferencia que aplicar
+        current = loaded_totals(instance)
+        if None not in (old_status, old_total) + current and (old_status, old_total) != current:
+            rollup.order_changed(instance, old_status, old_total)
+    instance._loaded_rollup = loaded_totals(instance)
+
+@receiver(pre_delete, sender=Order)
+def count_deleted_order_items(sender, instance, **kwargs):
+    # Los ítems se borran en cascada antes del post_delete del pedido
+    instance._rollup_items = rollup.item_total(instance)
+
+@receiver(post_delete, sender=Order)
+def remove_order_from_rollup(sender, instance, **kwargs):
+    rollup.order_deleted(instance, getattr(instance, '_rollup_items', 0))
+
+@receiver(post_save, sender=OrderItem)
+def add_item_to_rollup(sender, instance, created, **kwargs):
+    if created:
+        rollup.items_added(instance.order, instance.quantity)
+
+@receiver(post_save, sender=Order)
+def publish_order_placed(sender, instance, created, **kwargs):
+    """El evento confirma con el pedido; la factura la crea el despachador del outbox."""
+    if created:
+        outbox.publish('order.placed', order=instance.pk)
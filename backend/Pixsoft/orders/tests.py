@@ -1,9 +1,20 @@
+import threading
+from datetime import timedelta
+from decimal import Decimal
 from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework.test import APITestCase
 from rest_framework import status
-from .models import Order, OrderItem, Cart
-from products.models import SaleProduct, Category as SaleCategory
-from leasing.models import RentalProduct, Category as RentalCategory, RentalPlan
+from .models import Order, OrderItem, Cart, StockReservation, DailySalesRollup
+from .services import checkout
+from . import reservations, rollup
+from products.models import SaleProduct, SaleCategory
+from leasing.models import RentalProduct, RentalCategory, RentalPlan
+from api import outbox
+from billing.models import Invoice
 
 User = get_user_model()
 
@@ -17,25 +28,28 @@ class OrderCreationTests(APITestCase):
         self.user = User.objects.create_user(username='testuser', password='testpassword')
 
         # --- Crear Productos ---
-        sale_cat = SaleCategory.objects.create(name='Venta General')
+        self.sale_cat = SaleCategory.objects.create(name='Venta General')
         self.sale_product = SaleProduct.objects.create(
-            name='Producto de Venta', 
+            name='Producto de Venta',
             description='Un producto para comprar',
-            price=100.00,
-            stock=10,
-            category=sale_cat
+            sku='VENTA-1',
+            price=Decimal('100.00'),
+            stock_quantity=10,
+            category=self.sale_cat
         )
 
         rental_cat = RentalCategory.objects.create(name='Alquiler General')
         self.rental_product = RentalProduct.objects.create(
             name='Producto de Alquiler',
             description='Un producto para alquilar',
+            sku='RENTA-1',
+            stock_quantity=3,
             category=rental_cat
         )
         self.rental_plan = RentalPlan.objects.create(
             product=self.rental_product,
-            plan_type='daily',
-            base_price=25.00
+            period='DAILY',
+            base_price=Decimal('25.00')
         )
 
         # --- Crear Carrito y añadir items ---
@@ -49,20 +63,20 @@ class OrderCreationTests(APITestCase):
             quantity=1,
             rental_plan=self.rental_plan
         )
-        
+
         # --- Autenticar Cliente ---
-        self.client.login(username='testuser', password='testpassword')
+        self.client.force_authenticate(user=self.user)
 
     def test_create_order_from_cart(self):
         """
-        Verifica que un POST a /api/v1/orders/ crea un pedido correctamente.
+        Verifica que un POST a /api/v1/orders/orders/ crea un pedido correctamente.
         """
         # URL para crear un pedido
-        url = '/api/v1/orders/'
-        
+        url = '/api/v1/orders/orders/'
+
         # Realizar la petición para crear el pedido
         response = self.client.post(url, {}, format='json')
-        
+
         # --- Aserciones ---
 
         # 1. El estado de la respuesta debe ser 201 CREATED
@@ -78,7 +92,7 @@ class OrderCreationTests(APITestCase):
 
         # 4. Verificar el precio total del pedido
         # (2 * 100.00) + (1 * 25.00) = 225.00
-        self.assertEqual(order.total_price, 225.00)
+        self.assertEqual(order.total_price, Decimal('225.00'))
 
         # 5. Verificar los datos de los ítems del pedido
         sale_order_item = order.items.get(object_id=self.sale_product.id)
@@ -93,18 +107,332 @@ class OrderCreationTests(APITestCase):
         self.cart.refresh_from_db()
         self.assertEqual(self.cart.items.count(), 0)
 
+        # 7. El stock de venta se descuenta y la factura sale del outbox con el total correcto
+        self.sale_product.refresh_from_db()
+        self.assertEqual(self.sale_product.stock_quantity, 8)
+        self.assertFalse(Invoice.objects.filter(order=order).exists())
+        outbox.drain()
+        self.assertEqual(Invoice.objects.get(order=order).amount, Decimal('225.00'))
+
     def test_create_order_with_empty_cart(self):
         """
         Verifica que no se puede crear un pedido con un carrito vacío.
         """
         # Vaciar el carrito primero
         self.cart.items.all().delete()
-        
-        url = '/api/v1/orders/'
+
+        url = '/api/v1/orders/orders/'
         response = self.client.post(url, {}, format='json')
-        
+
         # La respuesta debe ser un 400 Bad Request
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
-        
+
         # No se debe haber creado ningún pedido
         self.assertEqual(Order.objects.count(), 0)
+
+    def test_checkout_fails_atomically_when_an_item_is_short(self):
+        """
+        Si un solo producto no alcanza, no se descuenta nada ni se crea el pedido.
+        """
+        scarce = SaleProduct.objects.create(
+            name='Escaso', description='', sku='ESCASO-1', price=Decimal('5.00'),
+            stock_quantity=1, category=self.sale_cat
+        )
+        self.cart.items.create(product=scarce, quantity=3)
+
+        response = self.client.post('/api/v1/orders/orders/', {}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['shortages'], [
+            {'product_id': scarce.pk, 'requested': 3, 'available': 1}
+        ])
+        self.sale_product.refresh_from_db()
+        self.assertEqual(self.sale_product.stock_quantity, 10)
+        self.assertEqual(Order.objects.count(), 0)
+        self.assertEqual(self.cart.items.count(), 3)
+
+    def test_checkout_runs_a_fixed_number_of_queries(self):
+        """
+        La cantidad de consultas no depende del número de líneas del carrito.
+        """
+        def queries_for(lines):
+            user = User.objects.create_user(username=f'cliente{lines}')
+            cart = Cart.objects.create(user=user)
+            for i in range(lines):
+                product = SaleProduct.objects.create(
+                    name=f'Item {lines}-{i}', description='', sku=f'SKU-{lines}-{i}',
+                    price=Decimal('1.00'), stock_quantity=5, category=self.sale_cat
+                )
+                cart.items.create(product=product, quantity=1)
+            cart = User.objects.get(pk=user.pk).cart
+            with CaptureQueriesContext(connection) as queries:
+                order = checkout(cart)
+            self.assertEqual(order.items.count(), lines)
+            return len(queries)
+
+        self.assertEqual(queries_for(2), queries_for(50))
+
+
+class SerializationQueryTests(APITestCase):
+    """
+    El carrito y los pedidos se serializan con un número fijo de consultas,
+    sin importar cuántos ítems (de venta y de alquiler) tengan.
+    """
+
+    def setUp(self):
+        self.sale_cat = SaleCategory.objects.create(name='Accesorios')
+        self.rental_cat = RentalCategory.objects.create(name='Equipos')
+
+    def fill(self, container, lines):
+        for i in range(lines):
+            sale = SaleProduct.objects.create(
+                name=f'Cable {container.pk}-{i}', description='', sku=f'CAB-{container.pk}-{i}',
+                price=Decimal('3.00'), stock_quantity=5, category=self.sale_cat
+            )
+            rental = RentalProduct.objects.create(
+                name=f'Proyector {container.pk}-{i}', description='', sku=f'PRY-{container.pk}-{i}',
+                stock_quantity=2, category=self.rental_cat
+            )
+            plan = RentalPlan.objects.create(product=rental, period='DAILY', base_price=Decimal('10.00'))
+            if isinstance(container, Cart):
+                container.items.create(product=sale, quantity=2)
+                container.items.create(product=rental, quantity=1, rental_plan=plan)
+            else:
+                container.items.create(product=sale, quantity=2, price_at_purchase=sale.price)
+                container.items.create(product=rental, quantity=1, price_at_purchase=plan.base_price, rental_plan=plan)
+
+    def queries_for(self, url, lines, make_container):
+        user = User.objects.create_user(username=f'cliente{lines}')
+        self.fill(make_container(user), lines)
+        self.client.force_authenticate(user=user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries), response
+
+    def test_cart_queries_do_not_grow_with_items(self):
+        make_cart = lambda user: Cart.objects.create(user=user)
+        few, _ = self.queries_for('/api/v1/orders/cart/', 1, make_cart)
+        many, response = self.queries_for('/api/v1/orders/cart/', 15, make_cart)
+
+        self.assertEqual(few, many)
+        self.assertEqual(len(response.data['items']), 30)
+        self.assertEqual(response.data['total_cart_price'], Decimal('240.00'))
+        self.assertTrue(response.data['items'][1]['rental_plan_details'].startswith('Proyector'))
+
+    def test_order_list_queries_do_not_grow_with_items(self):
+        make_order = lambda user: Order.objects.create(user=user, total_price=0)
+        few, _ = self.queries_for('/api/v1/orders/orders/', 1, make_order)
+        many, response = self.queries_for('/api/v1/orders/orders/', 15, make_order)
+
+        self.assertEqual(few, many)
+        self.assertEqual(len(response.data['results'][0]['items']), 30)
+
+
+class SalesRollupTests(APITestCase):
+    """
+    Pruebas del resumen diario de ventas y del dashboard que lo consume.
+    """
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', is_staff=True)
+        category = SaleCategory.objects.create(name='Hogar')
+        self.product = SaleProduct.objects.create(
+            name='Lámpara', description='', sku='LAMP-1', price=Decimal('20.00'), stock_quantity=50, category=category
+        )
+
+    def place_order(self, quantity):
+        customer = User.objects.create_user(username=f'cliente{User.objects.count()}')
+        cart = Cart.objects.create(user=customer)
+        cart.items.create(product=self.product, quantity=quantity)
+        return checkout(cart)
+
+    def rollup_rows(self):
+        return {
+            row.status: (row.revenue, row.order_count, row.item_count)
+            for row in DailySalesRollup.objects.all()
+        }
+
+    def test_checkout_and_status_changes_update_the_rollup(self):
+        first = self.place_order(2)
+        self.place_order(1)
+        self.assertEqual(self.rollup_rows(), {'pending': (Decimal('60.00'), 2, 3)})
+
+        first.status = 'processing'
+        first.save()
+        self.assertEqual(self.rollup_rows(), {
+            'pending': (Decimal('20.00'), 1, 1),
+            'processing': (Decimal('40.00'), 1, 2),
+        })
+
+        first.delete()
+        self.assertEqual(self.rollup_rows()['processing'], (Decimal('0.00'), 0, 0))
+
+    def test_deferred_orders_load_without_recursion(self):
+        order = self.place_order(2)
+        # Leer los campos diferidos no vuelve a disparar el post_init indefinidamente
+        self.assertEqual(Order.objects.only('id').get(pk=order.pk).status, 'pending')
+        deferred = Order.objects.defer('status', 'total_price').get(pk=order.pk)
+        self.assertEqual(deferred.total_price, Decimal('40.00'))
+
+        partial = Order.objects.only('id', 'user').get(pk=order.pk)
+        partial.user = self.admin
+        partial.save()
+        self.assertEqual(self.rollup_rows(), {'pending': (Decimal('40.00'), 1, 2)})
+
+    def test_backfill_matches_the_incremental_rollup(self):
+        self.place_order(2).delete()
+        order = self.place_order(3)
+        order.status = 'shipped'
+        order.save()
+        self.place_order(4)
+        incremental = {status: row for status, row in self.rollup_rows().items() if row[1]}
+
+        rollup.backfill()
+
+        self.assertEqual(self.rollup_rows(), incremental)
+
+    def test_dashboard_reads_ranges_from_the_rollup(self):
+        today = timezone.localdate()
+        DailySalesRollup.objects.bulk_create([
+            DailySalesRollup(date=date, status=status_, revenue=revenue, order_count=1, item_count=2)
+            for date, status_, revenue in [
+                (today.replace(day=1) - timedelta(days=1), 'delivered', Decimal('10.00')),
+                (today, 'shipped', Decimal('5.00')),
+                (today, 'pending', Decimal('7.00')),
+            ]
+        ])
+        self.client.force_authenticate(user=self.admin)
+        params = {'from': (today.replace(day=1) - timedelta(days=1)).isoformat(), 'to': today.isoformat(), 'granularity': 'month'}
+
+        with self.assertNumQueries(4):  # resumen, gráfico, totales del rango, actividad reciente
+            response = self.client.get('/api/v1/dashboard/sales/', params)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['summary'], {
+            'total_revenue': Decimal('15.00'), 'total_orders': 3, 'pending_orders': 1
+        })
+        self.assertEqual([point['revenue'] for point in response.data['sales_chart']], [Decimal('10.00'), Decimal('5.00')])
+        self.assertEqual(response.data['range']['items'], 4)
+
+        response = self.client.get('/api/v1/dashboard/sales/', {'granularity': 'year'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class StockReservationTests(APITestCase):
+    """
+    Pruebas de las reservas de stock con vencimiento de los carritos.
+    """
+
+    def setUp(self):
+        category = SaleCategory.objects.create(name='Ofertas')
+        self.product = SaleProduct.objects.create(
+            name='Consola', description='', sku='CONSOLA-1', price=Decimal('300.00'),
+            stock_quantity=3, category=category
+        )
+        self.buyer = User.objects.create_user(username='comprador')
+        self.other = User.objects.create_user(username='otro')
+
+    def add_to_cart(self, user, quantity):
+        self.client.force_authenticate(user=user)
+        return self.client.post('/api/v1/orders/cart/', {
+            'product_id': self.product.pk, 'product_type': 'sale', 'quantity': quantity
+        })
+
+    def test_cart_items_hold_stock_for_other_buyers(self):
+        self.assertEqual(self.add_to_cart(self.buyer, 2).status_code, status.HTTP_201_CREATED)
+
+        response = self.add_to_cart(self.other, 2)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['shortages'][0]['available'], 1)
+
+        response = self.client.post(f'/api/v1/products/product/{self.product.pk}/purchase/', {'quantity': 2})
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.add_to_cart(self.other, 1).status_code, status.HTTP_201_CREATED)
+
+    def test_expired_holds_stop_counting_and_are_swept_in_batches(self):
+        self.add_to_cart(self.buyer, 3)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(self.add_to_cart(self.other, 3).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(reservations.release_expired(batch_size=1), 1)
+        self.assertEqual(list(StockReservation.objects.values_list('cart__user__username', flat=True)), ['otro'])
+
+    def test_checkout_converts_holds_into_stock_decrements(self):
+        self.add_to_cart(self.buyer, 2)
+
+        response = self.client.post('/api/v1/orders/orders/', {}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 1)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_checkout_fails_when_stock_dropped_below_the_hold(self):
+        self.add_to_cart(self.buyer, 2)
+        # Ajuste de inventario por fuera del carrito
+        SaleProduct.objects.filter(pk=self.product.pk).update(stock_quantity=1)
+
+        response = self.client.post('/api/v1/orders/orders/', {}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 1)
+
+    def test_removing_the_item_releases_the_hold(self):
+        self.add_to_cart(self.buyer, 3)
+        item = Cart.objects.get(user=self.buyer).items.get()
+
+        self.client.delete(f'/api/v1/orders/cart/{item.pk}/')
+
+        self.assertFalse(StockReservation.objects.exists())
+
+
+class StockConcurrencyTests(TransactionTestCase):
+    """
+    Decenas de compradores en paralelo sobre un mismo SKU: nunca se vende más
+    stock del que existe (compra directa y carrito + checkout mezclados).
+    """
+    BUYERS = 40
+    STOCK = 10
+
+    def setUp(self):
+        category = SaleCategory.objects.create(name='Flash sale')
+        self.product = SaleProduct.objects.create(
+            name='Edición limitada', description='', sku='FLASH-1', price=Decimal('50.00'),
+            stock_quantity=self.STOCK, category=category
+        )
+        self.carts = [
+            Cart.objects.create(user=User.objects.create_user(username=f'flash{i}'))
+            for i in range(self.BUYERS)
+        ]
+
+    def buy(self, index, start, sold):
+        start.wait()
+        try:
+            if index % 2:
+                reservations.purchase(self.product.pk, 1)
+            else:
+                cart = self.carts[index]
+                reservations.reserve(cart, self.product.pk, 1)
+                cart.items.create(product=self.product, quantity=1)
+                checkout(Cart.objects.select_related('user').get(pk=cart.pk))
+            sold.append(index)
+        except reservations.InsufficientStock:
+            pass
+        finally:
+            connections.close_all()
+
+    def test_parallel_buyers_never_oversell(self):
+        start, sold = threading.Barrier(self.BUYERS), []
+        threads = [threading.Thread(target=self.buy, args=(i, start, sold)) for i in range(self.BUYERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.product.refresh_from_db()
+        self.assertEqual(len(sold), self.STOCK)
+        self.assertEqual(self.product.stock_quantity, 0)
+        self.assertEqual(OrderItem.objects.count(), len([index for index in sold if index % 2 == 0]))
+        self.assertFalse(StockReservation.objects.exists())
@@ -2,60 +2,102 @@ from rest_framework import viewsets, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
-from django.db.models import Sum, Count
-from django.db.models.functions import TruncDate
+from datetime import date, timedelta
+from decimal import Decimal
+from django.db.models import DateField, F, Q, Sum
+from django.db.models.functions import Coalesce, Trunc
 from django.utils import timezone
 
-from .models import Cart, CartItem, Order
+from .models import Cart, CartItem, Order, DailySalesRollup
+from .rollup import REVENUE_STATUSES
 from .serializers import (
     CartSerializer, AddCartItemSerializer, CartItemSerializer, 
-    OrderSerializer, CreateOrderSerializer
+    OrderSerializer, CreateOrderSerializer, load_cart
 )
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from products.models import SaleProduct
+from . import reservations
+from .reservations import InsufficientStock
+from api.pagination import KeysetPagination
+from api.idempotency import idempotent
 
 class SalesAnalyticsView(APIView):
     """
-    Endpoint para obtener datos crudos de ventas para el Dashboard.
+    Endpoint para obtener datos de ventas para el Dashboard.
+    Lee del resumen DailySalesRollup (una fila por día y estado), así que su costo
+    no depende de cuántos pedidos haya en la historia.
+    Parámetros: ?from=AAAA-MM-DD&to=AAAA-MM-DD&granularity=day|week|month
+    (por defecto los últimos 30 días por día).
     Retorna:
     - Resumen (revenue total, ordenes totales, pendientes).
-    - Gráfico de ventas (últimos 30 días).
+    - Gráfico de ventas del rango.
+    - Totales del rango.
     - Actividad reciente (últimas 5 ordenes).
     """
     permission_classes = [IsAdminUser]
+    GRANULARITIES = ('day', 'week', 'month')
 
     def get(self, request):
-        # 1. KPIs Generales
-        total_revenue = Order.objects.filter(status__in=['processing', 'shipped', 'delivered']).aggregate(Sum('total_price'))['total_price__sum'] or 0
-        total_orders = Order.objects.count()
-        pending_orders = Order.objects.filter(status='pending').count()
-
-        # 2. Ventas por Día (Últimos 30 días)
-        last_30_days = timezone.now() - timezone.timedelta(days=30)
-        daily_sales = Order.objects.filter(
-            created_at__gte=last_30_days,
-            status__in=['processing', 'shipped', 'delivered']
-        ).annotate(
-            date=TruncDate('created_at')
-        ).values('date').annotate(
-            revenue=Sum('total_price'),
-            count=Count('id')
-        ).order_by('date')
-
-        # 3. Top Productos Recientes (Últimos 5 orders)
-        # Nota: Idealmente serializamos con menos detalle para el dashboard
-        recent_orders = Order.objects.order_by('-created_at')[:5]
+        try:
+            date_to = parse_date_param(request.query_params.get('to')) or timezone.localdate()
+            date_from = parse_date_param(request.query_params.get('from')) or date_to - timedelta(days=29)
+        except ValueError:
+            return Response({'error': 'Fechas inválidas (formato AAAA-MM-DD).'}, status=status.HTTP_400_BAD_REQUEST)
+        granularity = request.query_params.get('granularity', 'day')
+        if granularity not in self.GRANULARITIES or date_from > date_to:
+            return Response({'error': 'Rango o granularidad inválidos.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        paid = Q(status__in=REVENUE_STATUSES)
+
+        # 1. KPIs Generales (una consulta sobre el resumen)
+        summary = DailySalesRollup.objects.aggregate(
+            total_revenue=Coalesce(Sum('revenue', filter=paid), Decimal('0')),
+            total_orders=Coalesce(Sum('order_count'), 0),
+            pending_orders=Coalesce(Sum('order_count', filter=Q(status='pending')), 0),
+        )
+
+        # 2. Ventas por periodo dentro del rango
+        in_range = DailySalesRollup.objects.filter(paid, date__range=(date_from, date_to))
+        sales_chart = in_range.annotate(
+            period=Trunc('date', granularity, output_field=DateField())
+        ).values('period').annotate(
+            revenue=Sum('revenue'),
+            count=Sum('order_count'),
+            items=Sum('item_count'),
+        ).values('revenue', 'count', 'items', date=F('period')).order_by('period')
+        range_totals = in_range.aggregate(
+            revenue=Coalesce(Sum('revenue'), Decimal('0')),
+            orders=Coalesce(Sum('order_count'), 0),
+            items=Coalesce(Sum('item_count'), 0),
+        )
+
+        # 3. Actividad reciente (últimas 5 ordenes, índice order_created_idx)
+        recent_orders = Order.objects.with_details().order_by('-created_at', '-id')[:5]
         recent_orders_data = OrderSerializer(recent_orders, many=True).data
 
         data = {
-            "summary": {
-                "total_revenue": total_revenue,
-                "total_orders": total_orders,
-                "pending_orders": pending_orders
+            "summary": summary,
+            "range": {
+                "from": date_from, "to": date_to, "granularity": granularity, **range_totals
             },
-            "sales_chart": list(daily_sales),
+            "sales_chart": list(sales_chart),
             "recent_activity": recent_orders_data
         }
         return Response(data)
 
+def parse_date_param(value):
+    """Fecha ISO de un parámetro de consulta (None si no viene; ValueError si es inválida)."""
+    return date.fromisoformat(value) if value else None
+
+def insufficient_stock_response(error):
+    """Mismo formato que la compra directa de productos (409 + notificación)."""
+    return Response({
+        "detail": str(error),
+        "shortages": error.shortages,
+        "notify_client": True
+    }, status=status.HTTP_409_CONFLICT)
+
 class CartViewSet(viewsets.ViewSet):
     """
     ViewSet para gestionar el carrito de compras del usuario.
@@ -63,6 +105,8 @@ class CartViewSet(viewsets.ViewSet):
     - Ver el carrito.
     - Añadir/actualizar productos.
     - Eliminar productos.
+    Los productos de venta quedan reservados (ver orders/reservations.py) mientras
+    el carrito tenga actividad.
     """
     permission_classes = [IsAuthenticated]
 
@@ -74,7 +118,9 @@ class CartViewSet(viewsets.ViewSet):
     def list(self, request):
         """Devuelve el contenido del carrito."""
         cart = self.get_cart(request.user)
-        serializer = CartSerializer(cart)
+        # Ver el carrito renueva sus reservas vigentes
+        reservations.extend(cart)
+        serializer = CartSerializer(load_cart(cart))
         return Response(serializer.data)
 
     def create(self, request):
@@ -83,7 +129,10 @@ class CartViewSet(viewsets.ViewSet):
         serializer = AddCartItemSerializer(data=request.data, context={'cart': cart})
         
         if serializer.is_valid():
-            cart_item = serializer.save()
+            try:
+                cart_item = serializer.save()
+            except InsufficientStock as error:
+                return insufficient_stock_response(error)
             return Response(CartItemSerializer(cart_item).data, status=status.HTTP_201_CREATED)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -106,8 +155,18 @@ class CartViewSet(viewsets.ViewSet):
         except:
              return Response({'error': 'Cantidad inválida.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        cart_item.quantity = quantity
-        cart_item.save()
+        try:
+            with transaction.atomic():
+                if self.is_sale_item(cart_item):
+                    reservations.reserve(cart, cart_item.object_id, quantity)
+                else:
+                    reservations.check_rental(
+                        cart_item.object_id, quantity, cart_item.rental_start_date, cart_item.rental_end_date
+                    )
+                cart_item.quantity = quantity
+                cart_item.save()
+        except InsufficientStock as error:
+            return insufficient_stock_response(error)
         return Response(CartItemSerializer(cart_item).data)
 
     def destroy(self, request, pk=None):
@@ -115,25 +174,40 @@ class CartViewSet(viewsets.ViewSet):
         cart = self.get_cart(request.user)
         try:
             cart_item = cart.items.get(pk=pk)
+            if self.is_sale_item(cart_item):
+                reservations.release(cart, cart_item.object_id)
             cart_item.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
         except CartItem.DoesNotExist:
             return Response({'error': 'Item no encontrado.'}, status=status.HTTP_404_NOT_FOUND)
 
+    def is_sale_item(self, cart_item):
+        return cart_item.content_type_id == ContentType.objects.get_for_model(SaleProduct).pk
+
 class OrderViewSet(viewsets.ModelViewSet):
     """
     ViewSet para gestionar los pedidos.
     """
     permission_classes = [IsAuthenticated]
+    # Paginación por cursor sobre (created_at, id) dentro del usuario; índice order_user_created_idx
+    pagination_class = KeysetPagination
+    ordering = ('-created_at', '-id')
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).order_by('-created_at')
+        return Order.objects.with_details().filter(user=self.request.user).order_by('-created_at')
 
     def get_serializer_class(self):
         if self.action == 'create':
             return CreateOrderSerializer
         return OrderSerializer
 
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        try:
+            return super().create(request, *args, **kwargs)
+        except InsufficientStock as error:
+            return insufficient_stock_response(error)
+
     def perform_create(self, serializer):
         serializer.save()
 
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import SaleCategory, SaleProduct
+from .models import SaleCategory, SaleProduct, StockMovement
 
 # --- 1. Admin para Categorías ---
 
@@ -55,4 +55,26 @@ class SaleProductAdmin(admin.ModelAdmin):
     def is_available(self, obj):
         return obj.is_available
     is_available.boolean = True
-    is_available.short_description = 'Disponible'
\ No newline at end of file
+    is_available.short_description = 'Disponible'
+
+# --- 3. Libro de movimientos de stock (solo lectura) ---
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    """
+    Auditoría del inventario. Los movimientos no se editan ni se borran:
+    las correcciones se hacen cambiando el stock del producto (genera un ajuste).
+    """
+    list_display = ('created_at', 'content_type', 'object_id', 'kind', 'quantity', 'reference')
+    list_filter = ('kind', 'content_type')
+    search_fields = ('reference',)
+    date_hierarchy = 'created_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
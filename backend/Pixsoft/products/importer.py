@@ -0,0 +1,302 @@
+import csv
+import gzip
+import io
+import json
+import time
+from decimal import Decimal, InvalidOperation
+from django.db import connection, transaction
+from leasing.models import RentalCategory, RentalProduct
+from api.cache import catalog_cache
+from .models import SaleCategory, SaleProduct, SearchTerm, StockMovement
+from . import ledger
+
+# Filas validadas y escritas por transacción
+IMPORT_CHUNK_SIZE = 5000
+
+# Rechazos incluidos en la respuesta del endpoint (el comando los escribe todos a archivo)
+MAX_REPORTED_REJECTS = 100
+
+
+def detect_format(filename):
+    """('csv' | 'ndjson', comprimido) según la extensión; ValueError si no se reconoce."""
+    name = filename.lower()
+    compressed = name.endswith('.gz')
+    if compressed:
+        name = name[:-3]
+    if name.endswith('.csv'):
+        return 'csv', compressed
+    if name.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson', compressed
+    raise ValueError(f"Formato no reconocido: {filename} (use .csv, .ndjson o .jsonl, opcionalmente .gz)")
+
+
+def read_rows(stream, output, compressed=False):
+    """
+    Filas de un archivo CSV o NDJSON (binario), leídas en streaming: retorna
+    (número de línea, dict o None si la línea no es JSON válido, texto original).
+    """
+    if compressed:
+        stream = gzip.GzipFile(fileobj=stream)
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if output == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, None, line.rstrip('\n')
+            continue
+        yield line_number, row if isinstance(row, dict) else None, line.rstrip('\n')
+
+
+class ImportReport:
+    """Contadores y ritmo de una importación."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.read = self.created = self.updated = self.rejected = 0
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self):
+        return round(self.read / self.elapsed) if self.elapsed else 0
+
+    def as_dict(self):
+        return {
+            'read': self.read, 'created': self.created, 'updated': self.updated, 'rejected': self.rejected,
+            'seconds': round(self.elapsed, 2), 'rows_per_second': self.rows_per_second,
+        }
+
+
+class CatalogImporter:
+    """
+    Importación masiva de productos por lotes. Cada lote se valida en memoria, se
+    copia con COPY a una tabla temporal de staging y se aplica con UN
+    INSERT ... SELECT ... ON CONFLICT (sku) DO UPDATE, que además devuelve el stock
+    anterior de cada producto para registrar la diferencia en el libro de stock.
+    Sin instancias del ORM por fila; solo un lote vive en memoria.
+
+    Las filas inválidas no detienen la importación: se pasan a `on_reject(línea,
+    error, fila)`. `on_progress(report)` se llama al terminar cada lote.
+    """
+    model = None
+    category_model = None
+    # Columnas que se copian a staging, en el orden de las tuplas de build()
+    columns = ()
+    json_field = None
+
+    def __init__(self, chunk_size=IMPORT_CHUNK_SIZE, create_categories=False, on_reject=None, on_progress=None):
+        self.chunk_size = chunk_size
+        self.create_categories = create_categories
+        self.on_reject = on_reject or (lambda line, error, row: None)
+        self.on_progress = on_progress or (lambda report: None)
+        self.report = ImportReport()
+        self.categories = self.load_categories()
+
+    # --- Categorías: mapa nombre -> id en memoria (una consulta) ---
+
+    def load_categories(self):
+        return {name.lower(): pk for pk, name in self.category_model.objects.values_list('pk', 'name')}
+
+    def resolve_category(self, value):
+        """Nombre de categoría (sin distinguir mayúsculas) -> id, sin consultas por fila."""
+        value = str(value or '').strip()
+        if not value:
+            raise ValueError("Falta la categoría.")
+        key = value.lower()
+        if key not in self.categories:
+            if not self.create_categories:
+                raise ValueError(f"Categoría desconocida: {value}")
+            # create() y no bulk_create: SaleCategory.save() calcula el path jerárquico
+            self.categories[key] = self.category_model.objects.create(name=value).pk
+        return self.categories[key]
+
+    # --- Validación de una fila ---
+
+    def parse_required(self, row):
+        sku, name = str(row.get('sku') or '').strip(), str(row.get('name') or '').strip()
+        if not sku or not name:
+            raise ValueError("sku y name son obligatorios.")
+        if len(sku) > 50:
+            raise ValueError("El sku supera los 50 caracteres.")
+        return sku, name[:255]
+
+    def parse_json(self, value):
+        """Objeto JSON serializado, listo para la columna jsonb."""
+        if value in (None, ''):
+            return '{}'
+        parsed = value if isinstance(value, dict) else json.loads(value)
+        if not isinstance(parsed, dict):
+            raise ValueError(f"{self.json_field} debe ser un objeto JSON.")
+        return json.dumps(parsed, ensure_ascii=False)
+
+    def parse_stock(self, value):
+        stock = int(value or 0)
+        if stock < 0:
+            raise ValueError("El stock no puede ser negativo.")
+        return stock
+
+    def build(self, row):
+        """Tupla de valores en el orden de `columns`; ValueError si la fila es inválida."""
+        raise NotImplementedError
+
+    # --- Ejecución ---
+
+    def run(self, rows):
+        chunk = {}
+        for line_number, row, raw in rows:
+            self.report.read += 1
+            if row is None:
+                self.reject(line_number, "Línea JSON inválida.", raw)
+                continue
+            try:
+                values = self.build(row)
+            except (ValueError, TypeError, KeyError, InvalidOperation) as error:
+                self.reject(line_number, str(error) or error.__class__.__name__, row)
+                continue
+            # Un sku repetido dentro del lote: gana la última fila (ON CONFLICT no admite duplicados)
+            chunk[values[0]] = values
+            if len(chunk) >= self.chunk_size:
+                self.write(chunk.values())
+                chunk = {}
+        if chunk:
+            self.write(chunk.values())
+        self.finish()
+        return self.report
+
+    def reject(self, line_number, error, row):
+        self.report.rejected += 1
+        self.on_reject(line_number, error, row)
+
+    def write(self, chunk):
+        table = self.model._meta.db_table
+        staging = f"{table}_import"
+        columns = ', '.join(self.columns)
+        updates = ', '.join(f"{column} = EXCLUDED.{column}" for column in self.columns[1:])
+
+        buffer = io.StringIO()
+        # QUOTE_ALL: en COPY csv un campo vacío sin comillas sería NULL, no ''
+        csv.writer(buffer, quoting=csv.QUOTE_ALL).writerows(chunk)
+        buffer.seek(0)
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMP TABLE IF NOT EXISTS {staging} ON COMMIT DELETE ROWS AS "
+                f"SELECT {columns} FROM {table} WITH NO DATA"
+            )
+            cursor.execute(f"TRUNCATE {staging}")
+            cursor.copy_expert(f"COPY {staging} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+            # Bloqueo de los productos existentes en orden de id (la regla de
+            # orders/reservations.py): ninguna venta cambia su stock hasta el commit
+            cursor.execute(f"""
+                WITH locked AS (
+                    SELECT p.id FROM {table} p JOIN {staging} s USING (sku) ORDER BY p.id FOR UPDATE OF p
+                )
+                SELECT count(*) FROM locked
+            """)
+            # Todas las CTE ven la misma instantánea: `previous` es el stock antes del upsert
+            cursor.execute(f"""
+                WITH previous AS (
+                    SELECT p.sku, p.stock_quantity FROM {table} p JOIN {staging} s USING (sku)
+                ), upserted AS (
+                    INSERT INTO {table} ({columns}, updated_at)
+                    SELECT {columns}, now() FROM {staging}
+                    ON CONFLICT (sku) DO UPDATE SET {updates}, updated_at = EXCLUDED.updated_at
+                    RETURNING id, sku, category_id, stock_quantity
+                )
+                SELECT u.id, u.category_id, u.stock_quantity - COALESCE(p.stock_quantity, 0), p.sku IS NULL
+                FROM upserted u LEFT JOIN previous p USING (sku)
+            """)
+            saved = cursor.fetchall()
+            self.record_stock({pk: delta for pk, category_id, delta, created in saved})
+            self.after_write([pk for pk, category_id, delta, created in saved])
+
+        created = sum(1 for row in saved if row[3])
+        self.report.created += created
+        self.report.updated += len(saved) - created
+        self.on_progress(self.report)
+
+    def record_stock(self, deltas):
+        """Diferencias de stock al libro de movimientos: reposiciones y ajustes."""
+        ledger.record(self.model, StockMovement.RESTOCK, {pk: delta for pk, delta in deltas.items() if delta > 0}, 'import')
+        ledger.record(self.model, StockMovement.ADJUSTMENT, {pk: delta for pk, delta in deltas.items() if delta < 0}, 'import')
+
+    def after_write(self, product_ids):
+        pass
+
+    def finish(self):
+        pass
+
+
+class SaleProductImporter(CatalogImporter):
+    """Columnas: sku, name, brand, model, description, category, price, stock_quantity, custom_attributes."""
+    model = SaleProduct
+    category_model = SaleCategory
+    json_field = 'custom_attributes'
+    columns = (
+        'sku', 'name', 'brand', 'model', 'description', 'category_id', 'price', 'stock_quantity', 'custom_attributes',
+    )
+
+    def build(self, row):
+        sku, name = self.parse_required(row)
+        price = Decimal(str(row.get('price')))
+        if not price.is_finite() or price < 0 or price.as_tuple().exponent < -2 or price >= 10 ** 8:
+            raise ValueError("Precio inválido.")
+        return (
+            sku, name, str(row.get('brand') or '')[:100], str(row.get('model') or '')[:100],
+            str(row.get('description') or ''), self.resolve_category(row.get('category')),
+            price, self.parse_stock(row.get('stock_quantity')), self.parse_json(row.get('custom_attributes')),
+        )
+
+    def after_write(self, product_ids):
+        # Sin save() no hay señales: el vocabulario de búsqueda se alimenta por lote
+        SearchTerm.objects.add_from_products(product_ids)
+
+    def finish(self):
+        catalog_cache.invalidate('products', 'facets')
+
+
+class RentalProductImporter(CatalogImporter):
+    """Columnas: sku, name, description, category, stock_quantity, specifications."""
+    model = RentalProduct
+    category_model = RentalCategory
+    json_field = 'specifications'
+    columns = ('sku', 'name', 'description', 'category_id', 'stock_quantity', 'specifications')
+
+    def build(self, row):
+        sku, name = self.parse_required(row)
+        return (
+            sku, name, str(row.get('description') or ''), self.resolve_category(row.get('category')),
+            self.parse_stock(row.get('stock_quantity')), self.parse_json(row.get('specifications')),
+        )
+
+    def finish(self):
+        catalog_cache.invalidate('rental_products')
+
+
+IMPORTERS = {'sale': SaleProductImporter, 'rental': RentalProductImporter}
+
+
+def import_upload(catalog, upload, create_categories=False):
+    """
+    Importa un archivo subido (multipart) y retorna el resumen con los primeros
+    rechazos. Django ya escribe a disco las subidas grandes, así que se lee en streaming.
+    """
+    output, compressed = detect_format(upload.name)
+    rejects = []
+
+    def on_reject(line, error, row):
+        if len(rejects) < MAX_REPORTED_REJECTS:
+            rejects.append({'line': line, 'error': error})
+
+    importer = IMPORTERS[catalog](create_categories=create_categories, on_reject=on_reject)
+    report = importer.run(read_rows(upload.open('rb'), output, compressed))
+    return {**report.as_dict(), 'rejects': rejects}
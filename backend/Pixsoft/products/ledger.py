@@ -0,0 +1,157 @@
+from datetime import timedelta
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.db.models import Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from leasing.models import RentalProduct
+from .models import SaleProduct, StockCheckpoint, StockMovement
+
+# Los checkpoints solo cubren movimientos con esta antigüedad: una transacción aún
+# abierta podría confirmar después un movimiento con fecha anterior al corte.
+CHECKPOINT_LAG = timedelta(minutes=5)
+
+MOVEMENTS = StockMovement._meta.db_table
+CHECKPOINTS = StockCheckpoint._meta.db_table
+
+# Último checkpoint de cada producto
+LATEST_CHECKPOINTS = f"""
+    latest AS (
+        SELECT DISTINCT ON (content_type_id, object_id) content_type_id, object_id, as_of, stock, rented_out
+        FROM {CHECKPOINTS}
+        ORDER BY content_type_id, object_id, as_of DESC
+    )
+"""
+
+
+def record(model, kind, quantities, reference=''):
+    """
+    Registra con UN bulk_create los movimientos de varios productos del mismo modelo.
+    `quantities` es {id_producto: unidades con signo}; se omiten los ceros.
+    """
+    content_type = ContentType.objects.get_for_model(model)
+    now = timezone.now()
+    return StockMovement.objects.bulk_create([
+        StockMovement(
+            content_type=content_type, object_id=pk, kind=kind,
+            quantity=quantity, reference=reference, created_at=now,
+        )
+        for pk, quantity in quantities.items() if quantity
+    ])
+
+
+def record_sales(model, quantities, reference=''):
+    """Ventas: `quantities` son unidades vendidas (positivas)."""
+    return record(model, StockMovement.SALE, {pk: -quantity for pk, quantity in quantities.items()}, reference)
+
+
+def remember_stock(instance):
+    """post_init: stock con el que se cargó la instancia (None si el campo está diferido)."""
+    instance._loaded_stock = instance.__dict__.get('stock_quantity') if instance.pk else 0
+
+
+def record_saved_stock(instance, created):
+    """
+    post_save: las altas y ediciones hechas con save() (admin, formularios) registran
+    la diferencia de stock como reposición (si sube) o ajuste (si baja).
+    Los caminos masivos (compra, checkout) llaman a record() ellos mismos.
+    """
+    loaded = getattr(instance, '_loaded_stock', None)
+    current = instance.__dict__.get('stock_quantity')
+    if loaded is not None and current is not None and current != loaded:
+        kind = StockMovement.RESTOCK if current > loaded else StockMovement.ADJUSTMENT
+        record(type(instance), kind, {instance.pk: current - loaded}, 'alta' if created else 'edición')
+    instance._loaded_stock = current
+
+
+def stock_at(product, moment):
+    """
+    Stock (comparable con stock_quantity) y unidades arrendadas del producto en
+    `moment`: último checkpoint anterior + suma de los movimientos desde entonces.
+    """
+    content_type = ContentType.objects.get_for_model(product)
+    checkpoint = StockCheckpoint.objects.filter(
+        content_type=content_type, object_id=product.pk, as_of__lte=moment
+    ).order_by('-as_of').first()
+
+    movements = StockMovement.objects.filter(content_type=content_type, object_id=product.pk, created_at__lte=moment)
+    if checkpoint:
+        movements = movements.filter(created_at__gte=checkpoint.as_of)
+    rental = Q(kind__in=StockMovement.RENTAL_KINDS)
+    tail = movements.aggregate(
+        stock=Coalesce(Sum('quantity', filter=~rental), 0),
+        rented_out=Coalesce(Sum('quantity', filter=rental), 0),
+    )
+    return {
+        'stock': (checkpoint.stock if checkpoint else 0) + tail['stock'],
+        'rented_out': (checkpoint.rented_out if checkpoint else 0) - tail['rented_out'],
+    }
+
+
+def checkpoint(as_of=None):
+    """
+    Agrega un checkpoint para cada producto con movimientos desde el anterior, en UN
+    INSERT ... SELECT. Pensado para ejecutarse periódicamente (comando
+    checkpoint_stock). Retorna cuántos checkpoints se crearon.
+    """
+    as_of = as_of or timezone.now() - CHECKPOINT_LAG
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            WITH {LATEST_CHECKPOINTS}
+            INSERT INTO {CHECKPOINTS} (content_type_id, object_id, as_of, stock, rented_out)
+            SELECT m.content_type_id, m.object_id, %(as_of)s,
+                   COALESCE(MAX(l.stock), 0)
+                     + COALESCE(SUM(m.quantity) FILTER (WHERE m.kind NOT IN %(rental)s), 0),
+                   COALESCE(MAX(l.rented_out), 0)
+                     - COALESCE(SUM(m.quantity) FILTER (WHERE m.kind IN %(rental)s), 0)
+            FROM {MOVEMENTS} m
+            LEFT JOIN latest l ON l.content_type_id = m.content_type_id AND l.object_id = m.object_id
+            WHERE m.created_at < %(as_of)s AND (l.as_of IS NULL OR m.created_at >= l.as_of)
+            GROUP BY m.content_type_id, m.object_id
+            ON CONFLICT DO NOTHING
+        """, {'as_of': as_of, 'rental': StockMovement.RENTAL_KINDS})
+        return cursor.rowcount
+
+
+def reconcile():
+    """
+    Compara stock_quantity de TODOS los productos (venta y arrendamiento) con el saldo
+    del libro (último checkpoint + movimientos posteriores) en una sola consulta.
+    Retorna las diferencias: [{'type', 'id', 'sku', 'stock_quantity', 'ledger'}].
+    """
+    products = [
+        (ContentType.objects.get_for_model(model).pk, model._meta.db_table, model._meta.model_name)
+        for model in (SaleProduct, RentalProduct)
+    ]
+    catalog = " UNION ALL ".join(
+        f"SELECT {content_type_id} AS content_type_id, '{name}' AS type, id, sku, stock_quantity FROM {table}"
+        for content_type_id, table, name in products
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            WITH {LATEST_CHECKPOINTS},
+            tail AS (
+                SELECT m.content_type_id, m.object_id,
+                       SUM(m.quantity) FILTER (WHERE m.kind NOT IN %(rental)s) AS stock
+                FROM {MOVEMENTS} m
+                LEFT JOIN latest l ON l.content_type_id = m.content_type_id AND l.object_id = m.object_id
+                WHERE l.as_of IS NULL OR m.created_at >= l.as_of
+                GROUP BY m.content_type_id, m.object_id
+            ),
+            ledger AS (
+                SELECT content_type_id, object_id, SUM(stock) AS stock
+                FROM (
+                    SELECT content_type_id, object_id, stock FROM latest
+                    UNION ALL
+                    SELECT content_type_id, object_id, stock FROM tail
+                ) AS balances
+                GROUP BY content_type_id, object_id
+            )
+            SELECT p.type, p.id, p.sku, p.stock_quantity, COALESCE(g.stock, 0)
+            FROM ({catalog}) AS p
+            LEFT JOIN ledger g ON g.content_type_id = p.content_type_id AND g.object_id = p.id
+            WHERE p.stock_quantity <> COALESCE(g.stock, 0)
+            ORDER BY p.type, p.id
+        """, {'rental': StockMovement.RENTAL_KINDS})
+        columns = ('type', 'id', 'sku', 'stock_quantity', 'ledger')
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
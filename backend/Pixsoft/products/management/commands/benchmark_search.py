@@ -0,0 +1,82 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from products.models import SaleCategory, SaleProduct, SearchTerm
+
+BRANDS = ['Dell', 'HP', 'Lenovo', 'Cisco', 'Ubiquiti', 'TP-Link', 'Logitech', 'Kingston', 'Samsung', 'Xerox']
+NOUNS = ['Cable', 'Adaptador', 'Switch', 'Router', 'Monitor', 'Teclado', 'Mouse', 'Memoria', 'Disco', 'Fuente']
+QUALIFIERS = ['HDMI', 'USB-C', 'DisplayPort', 'Gigabit', 'PoE', '4K', 'Inalámbrico', 'DDR4', 'SSD', 'Modular']
+
+# Consultas representativas: palabra exacta, frase, error de tipeo y SKU parcial
+QUERIES = ['switch poe cisco', 'cable hdmi dell', 'adaptadr usb-c', 'memoria ddr4 kingston', 'kingstn']
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la latencia de SaleProduct.objects.search() con catálogos sintéticos de distinto tamaño. "
+        "Los productos sintéticos se eliminan al terminar; no ejecutar contra producción."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[10_000, 100_000, 1_000_000])
+        parser.add_argument('--repeat', type=int, default=20, help="Repeticiones por consulta")
+        parser.add_argument('--batch-size', type=int, default=5_000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        sizes = sorted(options['sizes'])
+
+        self.stdout.write(f"{'productos':>10} {'p50 ms':>8} {'p95 ms':>8} {'máx ms':>8}")
+        category = SaleCategory.objects.create(name='Benchmark búsqueda')
+        try:
+            inserted = 0
+            for size in sizes:
+                while inserted < size:
+                    batch = min(options['batch_size'], size - inserted)
+                    SaleProduct.objects.bulk_create(
+                        [self.make_product(rng, category, inserted + i) for i in range(batch)],
+                        batch_size=batch,
+                    )
+                    inserted += batch
+                SearchTerm.objects.add_from_products()
+                # Vacía la lista pendiente de los índices GIN y actualiza estadísticas
+                with connection.cursor() as cursor:
+                    cursor.execute('VACUUM ANALYZE products_saleproduct')
+
+                # Consulta por un SKU existente, como haría un POS
+                timings = self.measure(options['repeat'], QUERIES + [f"BENCH-{rng.randrange(inserted):07d}"])
+                self.stdout.write(
+                    f"{size:>10} {statistics.median(timings):>8.2f} "
+                    f"{statistics.quantiles(timings, n=20)[-1]:>8.2f} {max(timings):>8.2f}"
+                )
+        finally:
+            SaleProduct.objects.filter(category=category).delete()
+            category.delete()
+
+    def make_product(self, rng, category, index):
+        brand, noun, qualifier = rng.choice(BRANDS), rng.choice(NOUNS), rng.choice(QUALIFIERS)
+        model = f"{brand[:2].upper()}{rng.randrange(36 ** 5):05X}"
+        return SaleProduct(
+            name=f"{noun} {qualifier} {brand} {model}",
+            brand=brand,
+            model=model,
+            description=f"{noun} {qualifier} de {brand} para oficina y centro de datos.",
+            sku=f"BENCH-{index:07d}",
+            price=Decimal(rng.randint(100, 50_000)) / 100,
+            stock_quantity=rng.randint(0, 50),
+            category=category,
+        )
+
+    def measure(self, repeat, queries):
+        timings = []
+        for _ in range(repeat):
+            for text in queries:
+                start = time.perf_counter()
+                list(SaleProduct.objects.search(text).values_list('id', flat=True)[:20])
+                timings.append((time.perf_counter() - start) * 1000)
+        return timings
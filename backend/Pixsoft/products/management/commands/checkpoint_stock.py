@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from products.ledger import checkpoint
+
+
+class Command(BaseCommand):
+    help = (
+        "Crea checkpoints de stock para los productos con movimientos nuevos (un solo "
+        "INSERT ... SELECT). Ejecutarlo periódicamente (p. ej. cada noche) mantiene corta "
+        "la suma necesaria para conocer el stock en cualquier fecha."
+    )
+
+    def handle(self, *args, **options):
+        created = checkpoint()
+        self.stdout.write(self.style.SUCCESS(f"Checkpoints creados: {created}"))
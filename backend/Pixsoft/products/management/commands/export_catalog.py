@@ -0,0 +1,42 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.export import FORMATS, export_stream, parse_since
+from leasing.utils import rental_product_export
+from products.utils import product_export
+
+EXPORTS = {'sale': product_export, 'rental': rental_product_export}
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporta el catálogo de venta o de arrendamiento (con planes) en CSV o NDJSON, "
+        "leyendo con un cursor del servidor: la memoria no depende del tamaño del catálogo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('catalog', choices=EXPORTS, help="sale = productos de venta, rental = equipos y planes")
+        parser.add_argument('--output', choices=FORMATS, default='csv')
+        parser.add_argument('--since', help="Solo filas modificadas desde esta fecha u hora ISO")
+        parser.add_argument('--gzip', action='store_true', help="Comprimir la salida con gzip")
+        parser.add_argument('--file', help="Archivo de destino (por defecto, la salida estándar)")
+
+    def handle(self, *args, **options):
+        try:
+            since = parse_since(options['since'])
+        except ValueError:
+            raise CommandError(f"Fecha inválida: {options['since']}")
+
+        columns, queryset = EXPORTS[options['catalog']](since)
+        started, written = time.perf_counter(), 0
+        target = open(options['file'], 'wb') if options['file'] else sys.stdout.buffer
+        try:
+            for chunk in export_stream(columns, queryset, options['output'], options['gzip']):
+                target.write(chunk)
+                written += len(chunk)
+        finally:
+            if options['file']:
+                target.close()
+        self.stderr.write(f"{written} bytes exportados en {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,58 @@
+import csv
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importer import IMPORT_CHUNK_SIZE, IMPORTERS, detect_format, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa productos de venta o equipos de arrendamiento desde CSV o NDJSON "
+        "(opcionalmente .gz) con upserts por SKU en lotes; la memoria depende del lote, "
+        "no del tamaño del archivo. Las filas inválidas se escriben en el archivo de rechazos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('catalog', choices=IMPORTERS, help="sale = productos de venta, rental = equipos")
+        parser.add_argument('file', help="Archivo .csv, .ndjson o .jsonl (con .gz si está comprimido)")
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+        parser.add_argument('--rejects', help="CSV de rechazos (línea, error, fila); por defecto <file>.rejects.csv")
+        parser.add_argument('--create-categories', action='store_true', help="Crear las categorías desconocidas")
+
+    def handle(self, *args, **options):
+        try:
+            output, compressed = detect_format(options['file'])
+        except ValueError as error:
+            raise CommandError(str(error))
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size debe ser positivo.")
+
+        rejects_path = options['rejects'] or f"{options['file']}.rejects.csv"
+        with open(options['file'], 'rb') as source, open(rejects_path, 'w', newline='', encoding='utf-8') as rejects:
+            writer = csv.writer(rejects)
+            writer.writerow(['line', 'error', 'row'])
+
+            def on_reject(line, error, row):
+                writer.writerow([line, error, row if isinstance(row, str) else json.dumps(row, ensure_ascii=False)])
+
+            def on_progress(report):
+                self.stderr.write(
+                    f"{report.read} filas leídas, {report.created} creadas, {report.updated} actualizadas, "
+                    f"{report.rejected} rechazadas ({report.rows_per_second} filas/s)"
+                )
+
+            importer = IMPORTERS[options['catalog']](
+                chunk_size=options['chunk_size'], create_categories=options['create_categories'],
+                on_reject=on_reject, on_progress=on_progress,
+            )
+            report = importer.run(read_rows(source, output, compressed))
+
+        summary = report.as_dict()
+        self.stdout.write(json.dumps(summary))
+        if report.rejected:
+            self.stderr.write(f"Rechazos en {rejects_path}")
+        elif not options['rejects']:
+            # Sin rechazos no se deja un archivo vacío junto al de entrada
+            os.remove(rejects_path)
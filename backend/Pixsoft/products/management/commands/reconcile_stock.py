@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products.ledger import reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara stock_quantity de todos los productos de venta y arrendamiento con el "
+        "saldo del libro de movimientos (una consulta) y lista las diferencias. "
+        "Termina con error si hay alguna, para usarlo en tareas programadas."
+    )
+
+    def handle(self, *args, **options):
+        mismatches = reconcile()
+        for row in mismatches:
+            self.stdout.write(
+                f"{row['type']} #{row['id']} ({row['sku']}): stock_quantity={row['stock_quantity']} "
+                f"libro={row['ledger']} diferencia={row['stock_quantity'] - row['ledger']:+d}"
+            )
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} productos no cuadran con el libro de movimientos.")
+        self.stdout.write(self.style.SUCCESS("Todo el stock cuadra con el libro de movimientos."))
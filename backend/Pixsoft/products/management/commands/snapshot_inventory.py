@@ -0,0 +1,22 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from products.models import InventorySnapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Guarda la foto diaria del inventario por categoría (valor, unidades, agotados, "
+        "stock bajo). Pensado para ejecutarse una vez al día (cron); repetirlo el mismo "
+        "día reemplaza la foto."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, help="Día de la foto (AAAA-MM-DD, por defecto hoy)")
+
+    def handle(self, *args, **options):
+        day = options['date'] or timezone.localdate()
+        snapshots = InventorySnapshot.take(day)
+        self.stdout.write(self.style.SUCCESS(f"Foto de inventario del {day}: {len(snapshots)} categorías."))
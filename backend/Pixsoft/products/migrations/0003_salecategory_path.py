@@ -0,0 +1,44 @@
+# Generated by Django 6.0 on 2026-10-18 06:22
+
+from django.db import migrations, models
+
+
+def build_category_paths(apps, schema_editor):
+    """Calcula el path materializado de las categorías existentes (en memoria, un solo bulk_update)."""
+    SaleCategory = apps.get_model('products', 'SaleCategory')
+    categories = {category.pk: category for category in SaleCategory.objects.all()}
+
+    def resolve(category, visiting=()):
+        if category.path:
+            return category.path
+        parent = categories.get(category.parent_id)
+        # Un ciclo heredado se rompe tratando el nodo como raíz
+        parent_path = resolve(parent, visiting + (category.pk,)) if parent and parent.pk not in visiting else ''
+        category.path = f"{parent_path}{category.pk:010d}/"
+        category.depth = len(category.path) // 11 - 1
+        return category.path
+
+    for category in categories.values():
+        resolve(category)
+    SaleCategory.objects.bulk_update(categories.values(), ['path', 'depth'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_saleproduct_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='salecategory',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Nivel'),
+        ),
+        migrations.AddField(
+            model_name='salecategory',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255, verbose_name='Ruta Jerárquica'),
+        ),
+        migrations.RunPython(build_category_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 6.0 on 2026-10-18 06:40
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.operations
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_salecategory_path'),
+    ]
+
+    operations = [
+        django.contrib.postgres.operations.TrigramExtension(),
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('word', models.CharField(max_length=100, primary_key=True, serialize=False)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='saleproduct',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('name', config='spanish', weight='A'), '||', django.contrib.postgres.search.SearchVector('brand', 'model', 'sku', config='spanish', weight='B'), django.contrib.postgres.search.SearchConfig('spanish')), '||', django.contrib.postgres.search.SearchVector('description', config='spanish', weight='C'), django.contrib.postgres.search.SearchConfig('spanish')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddIndex(
+            model_name='saleproduct',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='saleproduct_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saleproduct',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['sku'], name='saleproduct_sku_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='searchterm',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['word'], name='searchterm_word_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO products_searchterm (word)
+                SELECT DISTINCT word FROM (
+                    SELECT unnest(tsvector_to_array(
+                        to_tsvector('simple', name || ' ' || brand || ' ' || model)
+                    )) AS word
+                    FROM products_saleproduct
+                ) AS words
+                WHERE length(word) BETWEEN 3 AND 100
+                ON CONFLICT (word) DO NOTHING
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
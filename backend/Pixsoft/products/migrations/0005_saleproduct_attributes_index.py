@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 07:10
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_saleproduct_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='saleproduct',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['custom_attributes'], name='saleproduct_attrs_idx', opclasses=['jsonb_path_ops']),
+        ),
+    ]
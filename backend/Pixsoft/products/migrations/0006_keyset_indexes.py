@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 07:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_saleproduct_attributes_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='saleproduct',
+            index=models.Index(fields=['name', 'id'], name='saleproduct_name_id_idx'),
+        ),
+    ]
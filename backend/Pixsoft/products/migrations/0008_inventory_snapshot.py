@@ -0,0 +1,43 @@
+# Generated by Django 6.0 on 2026-10-18 12:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventorySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_on', models.DateField(verbose_name='Fecha')),
+                ('category_name', models.CharField(max_length=100)),
+                ('product_count', models.IntegerField(default=0)),
+                ('out_of_stock', models.IntegerField(default=0)),
+                ('low_stock', models.IntegerField(default=0)),
+                ('stock_units', models.BigIntegerField(default=0)),
+                ('inventory_value', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+            options={
+                'verbose_name_plural': 'Fotos de Inventario',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='saleproduct',
+            index=models.Index(condition=models.Q(('stock_quantity__lt', 5)), fields=['stock_quantity', 'id'], name='saleproduct_low_stock_idx'),
+        ),
+        migrations.AddField(
+            model_name='inventorysnapshot',
+            name='category',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='inventory_snapshots', to='products.salecategory', verbose_name='Categoría'),
+        ),
+        migrations.AddConstraint(
+            model_name='inventorysnapshot',
+            constraint=models.UniqueConstraint(fields=('taken_on', 'category'), name='unique_snapshot_day_category'),
+        ),
+    ]
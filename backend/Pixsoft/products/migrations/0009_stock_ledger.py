@@ -0,0 +1,90 @@
+# Generated by Django 6.0 on 2026-10-18 13:55
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def opening_balances(apps, schema_editor):
+    # El stock existente entra al libro como un ajuste inicial por producto
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    StockMovement = apps.get_model('products', 'StockMovement')
+    now = timezone.now()
+    for app_label, model_name in (('products', 'saleproduct'), ('leasing', 'rentalproduct')):
+        model = apps.get_model(app_label, model_name)
+        stocks = model.objects.exclude(stock_quantity=0).values_list('pk', 'stock_quantity')
+        if not stocks.exists():
+            continue
+        content_type, _ = ContentType.objects.get_or_create(app_label=app_label, model=model_name)
+        StockMovement.objects.bulk_create(
+            StockMovement(
+                content_type=content_type, object_id=pk, kind='ADJUSTMENT',
+                quantity=stock, reference='saldo inicial', created_at=now,
+            )
+            for pk, stock in stocks.iterator(chunk_size=2000)
+        )
+
+
+# Solo inserción: cualquier UPDATE o DELETE sobre el libro falla
+APPEND_ONLY_SQL = '''
+CREATE FUNCTION products_stockmovement_append_only() RETURNS trigger AS $$
+BEGIN
+    RAISE EXCEPTION 'products_stockmovement es de solo inserción: registre un ajuste';
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER products_stockmovement_append_only
+    BEFORE UPDATE OR DELETE ON products_stockmovement
+    FOR EACH ROW EXECUTE FUNCTION products_stockmovement_append_only();
+'''
+
+DROP_APPEND_ONLY_SQL = '''
+DROP TRIGGER products_stockmovement_append_only ON products_stockmovement;
+DROP FUNCTION products_stockmovement_append_only();
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('products', '0008_inventory_snapshot'),
+        ('leasing', '0005_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('as_of', models.DateTimeField(verbose_name='Saldo al')),
+                ('stock', models.IntegerField(verbose_name='Stock')),
+                ('rented_out', models.IntegerField(default=0, verbose_name='Unidades arrendadas')),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='contenttypes.contenttype')),
+            ],
+            options={
+                'verbose_name_plural': 'Checkpoints de Stock',
+                'constraints': [models.UniqueConstraint(fields=('content_type', 'object_id', 'as_of'), name='unique_stock_checkpoint')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('kind', models.CharField(choices=[('SALE', 'Venta'), ('RESTOCK', 'Reposición'), ('RENTAL_OUT', 'Salida por arrendamiento'), ('RENTAL_IN', 'Devolución de arrendamiento'), ('ADJUSTMENT', 'Ajuste')], max_length=10, verbose_name='Tipo')),
+                ('quantity', models.IntegerField(verbose_name='Unidades')),
+                ('reference', models.CharField(blank=True, max_length=50, verbose_name='Referencia')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha')),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='contenttypes.contenttype')),
+            ],
+            options={
+                'verbose_name_plural': 'Movimientos de Stock',
+                'indexes': [models.Index(fields=['content_type', 'object_id', 'created_at'], name='stockmovement_product_idx'), models.Index(fields=['created_at'], name='stockmovement_created_idx')],
+            },
+        ),
+        migrations.RunSQL(APPEND_ONLY_SQL, DROP_APPEND_ONLY_SQL),
+        migrations.RunPython(opening_balances, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,57 @@
-from django.db import models
+import json
+from django.db import connection, connections, models, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, FloatField, Q, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Concat, Now, StrIndex, Substr
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, SearchVectorField, TrigramSimilarity
+)
+from django.core.exceptions import ValidationError
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
 from django.contrib.auth import get_user_model 
 
 User = get_user_model()
 
+# Ancho (en dígitos) de cada segmento del path materializado: "0000000001/0000000007/"
+CATEGORY_PATH_WIDTH = 10
+CATEGORY_SEGMENT_LENGTH = CATEGORY_PATH_WIDTH + 1
+
+
+def category_path_segment(pk):
+    return f"{pk:0{CATEGORY_PATH_WIDTH}d}/"
+
+
+class SaleCategoryQuerySet(models.QuerySet):
+    """Consultas sobre la jerarquía usando el path materializado (una sola consulta indexada)."""
+
+    def roots(self):
+        return self.filter(parent__isnull=True)
+
+    def subtree(self, category, include_self=True):
+        """La categoría y todos sus descendientes (path LIKE 'prefijo%')."""
+        queryset = self.filter(path__startswith=category.path)
+        if not include_self:
+            queryset = queryset.exclude(pk=category.pk)
+        return queryset
+
+    def build_tree(self):
+        """
+        Carga el bosque (o subárbol) en UNA consulta y arma la jerarquía en memoria.
+        Retorna (raíces, {parent_id: [hijos]}) respetando el orden del path.
+        """
+        categories = list(self.order_by('path'))
+        ids = {category.pk for category in categories}
+        roots, children = [], {}
+        for category in categories:
+            if category.parent_id in ids:
+                children.setdefault(category.parent_id, []).append(category)
+            else:
+                # Raíz real o raíz del subárbol solicitado
+                roots.append(category)
+        return roots, children
+
 # --- 4.1 Categorías y Subcategorías (Jerárquicas) ---
 
 class SaleCategory(models.Model):
@@ -19,6 +68,16 @@ class SaleCategory(models.Model):
         on_delete=models.SET_NULL,
         verbose_name="Categoría Padre"
     )
+
+    # Jerarquía materializada: ids de los ancestros + propio, mantenida en save()/delete
+    path = models.CharField(max_length=255, db_index=True, editable=False, default='', verbose_name="Ruta Jerárquica")
+    depth = models.PositiveSmallIntegerField(default=0, editable=False, verbose_name="Nivel")
+
+    # Fecha de la última edición. No interviene en el GET condicional: ETag y
+    # Last-Modified salen de la entrada de caché (ver api/conditional.py)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Última Modificación")
+
+    objects = SaleCategoryQuerySet.as_manager()
     
     class Meta:
         verbose_name_plural = "Categorías de Venta"
@@ -26,8 +85,182 @@ class SaleCategory(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        """Guarda la categoría y reescribe el path de todo su subárbol si cambió de padre."""
+        with transaction.atomic():
+            paths = dict(
+                SaleCategory.objects.filter(pk__in=[self.pk, self.parent_id]).values_list('pk', 'path')
+            )
+            old_path = paths.get(self.pk, '') if self.pk else ''
+            parent_path = paths.get(self.parent_id, '') if self.parent_id else ''
+
+            if old_path and parent_path.startswith(old_path):
+                raise ValidationError("Una categoría no puede ser subcategoría de sí misma ni de sus descendientes.")
+
+            super().save(*args, **kwargs)
+
+            new_path = parent_path + category_path_segment(self.pk)
+            if new_path != old_path:
+                new_depth = len(new_path) // CATEGORY_SEGMENT_LENGTH - 1
+                if old_path:
+                    # Mover el subárbol completo con un solo UPDATE
+                    old_depth = len(old_path) // CATEGORY_SEGMENT_LENGTH - 1
+                    SaleCategory.objects.filter(path__startswith=old_path).update(
+                        path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+                        depth=F('depth') + (new_depth - old_depth),
+                    )
+                else:
+                    SaleCategory.objects.filter(pk=self.pk).update(path=new_path, depth=new_depth)
+                self.path, self.depth = new_path, new_depth
+
+    def detach_descendants(self):
+        """
+        Tras borrar la categoría, sus hijas quedan como raíces (on_delete=SET_NULL):
+        se recorta su prefijo del path en un solo UPDATE.
+        """
+        segment = category_path_segment(self.pk)
+        position = StrIndex('path', Value(segment))
+        SaleCategory.objects.filter(path__contains=segment).update(
+            path=Substr('path', position + CATEGORY_SEGMENT_LENGTH),
+            depth=F('depth') - (position - 1) / CATEGORY_SEGMENT_LENGTH - 1,
+            updated_at=Now(),
+        )
+
+    def get_ancestors(self, include_self=False):
+        """Ancestros ordenados desde la raíz, resueltos a partir del path (una consulta)."""
+        ids = [int(segment) for segment in self.path.split('/') if segment]
+        if not include_self:
+            ids = ids[:-1]
+        return SaleCategory.objects.filter(pk__in=ids).order_by('depth')
+
+    def get_descendants(self, include_self=False):
+        return SaleCategory.objects.subtree(self, include_self=include_self)
+
 # --- 4.1 Productos ---
 
+# Configuración de texto completo para el catálogo (contenido en español)
+SEARCH_CONFIG = 'spanish'
+
+# Productos con stock por debajo de este valor se reportan como "stock bajo". No es
+# configurable: es la condición del índice parcial saleproduct_low_stock_idx y las
+# consultas deben repetirla tal cual (cambiarlo requiere una migración)
+LOW_STOCK_THRESHOLD = 5
+
+
+def inventory_aggregates():
+    """
+    KPIs de inventario como agregados condicionales (FILTER): se calculan todos en
+    una sola pasada sobre los productos, para .aggregate() o por grupo con .annotate().
+    """
+    value = ExpressionWrapper(F('price') * F('stock_quantity'), output_field=DecimalField(max_digits=16, decimal_places=2))
+    return {
+        'product_count': Count('pk'),
+        'out_of_stock': Count('pk', filter=Q(stock_quantity=0)),
+        'low_stock': Count('pk', filter=Q(stock_quantity__gt=0, stock_quantity__lt=LOW_STOCK_THRESHOLD)),
+        'stock_units': Coalesce(Sum('stock_quantity'), 0),
+        'inventory_value': Coalesce(Sum(value), Value(0), output_field=DecimalField(max_digits=16, decimal_places=2)),
+    }
+
+def attribute_values(value):
+    """
+    Valores JSON que puede representar el texto de un filtro por atributo: las
+    facetas muestran 8 o true como texto, pero en custom_attributes pueden estar
+    guardados como número o booleano.
+    """
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        return [value]
+    return [value] if isinstance(parsed, str) else [value, parsed]
+
+class SaleProductQuerySet(models.QuerySet):
+
+    def in_category(self, category):
+        """Productos de la categoría y de todas sus subcategorías (una consulta indexada)."""
+        return self.filter(category__path__startswith=category.path)
+
+    def search(self, text):
+        """
+        Búsqueda rankeada sobre el tsvector almacenado (índice GIN). Si el texto no
+        coincide con ningún término (p. ej. un error de tipeo) se corrige contra el
+        vocabulario del catálogo (SearchTerm, índice de trigramas) y, como último
+        recurso, se buscan SKUs parecidos por trigramas.
+
+        Se rankean TODAS las coincidencias, ordenadas por ('-rank', '-id'): la vista
+        las pagina por cursor sobre esa clave (LIMIT por página, sin OFFSET).
+        """
+        query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+        matches = self.filter(search_vector=query)
+        found = matches.exists()
+        if not found:
+            corrected = SearchTerm.objects.correct(text)
+            if corrected != text.lower():
+                query = SearchQuery(corrected, config=SEARCH_CONFIG, search_type='websearch')
+                matches = self.filter(search_vector=query)
+                found = matches.exists()
+        if found:
+            rank = SearchRank(F('search_vector'), query)
+        else:
+            matches = self.filter(sku__trigram_similar=text)
+            rank = TrigramSimilarity('sku', text)
+        # En double precision: ts_rank y similarity son real y el valor que vuelve en
+        # el cursor no compararía igual a la fila de la que salió
+        return matches.annotate(rank=Cast(rank, FloatField())).order_by('-rank', '-id')
+
+    def with_attributes(self, attributes):
+        """
+        Filtra por atributos personalizados: {'Velocidad': ['10Gbps'], ...}.
+        Varios valores de una misma clave se combinan con OR y claves distintas
+        con AND; un valor que es un número o booleano JSON coincide también con
+        su forma no textual. Se traduce a `custom_attributes @> ...`, que usa el
+        índice GIN.
+        """
+        required = {
+            key: values[0] for key, values in attributes.items()
+            if len(values) == 1 and len(attribute_values(values[0])) == 1
+        }
+        queryset = self.filter(custom_attributes__contains=required) if required else self
+        for key, values in attributes.items():
+            if key not in required:
+                any_value = Q()
+                for value in values:
+                    for candidate in attribute_values(value):
+                        any_value |= Q(custom_attributes__contains={key: candidate})
+                queryset = queryset.filter(any_value)
+        return queryset
+
+    def low_stock(self):
+        """Productos bajo el umbral LOW_STOCK_THRESHOLD (índice parcial saleproduct_low_stock_idx)."""
+        return self.filter(stock_quantity__lt=LOW_STOCK_THRESHOLD)
+
+    def inventory_summary(self):
+        """Conteos, unidades y valor del inventario en UNA consulta."""
+        return self.aggregate(**inventory_aggregates())
+
+    def inventory_by_category(self):
+        """Los mismos KPIs agrupados por categoría (una consulta)."""
+        return self.values('category', 'category__name').annotate(**inventory_aggregates()).order_by('-product_count')
+
+    def facet_counts(self):
+        """
+        Conteo de productos por cada par (atributo, valor) dentro del queryset
+        actual, en UNA consulta agregada: {'Velocidad': [{'value': '10Gbps', 'count': 3}, ...]}.
+        """
+        sql, params = self.order_by().values('custom_attributes').query.sql_with_params()
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(f"""
+                SELECT attribute.key, attribute.value, COUNT(*)
+                FROM ({sql}) AS product
+                CROSS JOIN LATERAL jsonb_each_text(product.custom_attributes) AS attribute
+                WHERE jsonb_typeof(product.custom_attributes) = 'object'
+                GROUP BY attribute.key, attribute.value
+                ORDER BY attribute.key, COUNT(*) DESC, attribute.value
+            """, params)
+            facets = {}
+            for key, value, count in cursor.fetchall():
+                facets.setdefault(key, []).append({'value': value, 'count': count})
+        return facets
+
 class SaleProduct(models.Model):
     """Modelo para productos físicos de venta (Hardware, accesorios, etc.)."""
     
@@ -60,6 +293,11 @@ class SaleProduct(models.Model):
         default=dict,
         help_text="Atributos específicos del producto (e.g., {'Tipo Conector': 'HDMI', 'Velocidad': '10Gbps'})"
     )
+
+    # Solo lo usan la exportación y su filtro incremental ?since= (products/utils.py);
+    # los update() masivos lo fijan con Now() para que ?since= los incluya. ETag y
+    # Last-Modified salen de la entrada de caché (ver api/conditional.py)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Última Modificación")
     
     # Imagen del producto
     image = models.ImageField(
@@ -69,6 +307,35 @@ class SaleProduct(models.Model):
         verbose_name="Imagen del Producto"
     )
 
+    # Vector de búsqueda ponderado, calculado por PostgreSQL en cada INSERT/UPDATE
+    # (incluye altas masivas con bulk_create/COPY sin pasar por save()).
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('brand', 'model', 'sku', weight='B', config=SEARCH_CONFIG)
+            + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    objects = SaleProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='saleproduct_search_idx'),
+            GinIndex(fields=['sku'], opclasses=['gin_trgm_ops'], name='saleproduct_sku_trgm_idx'),
+            # Filtros por atributos (custom_attributes @> '{"clave": "valor"}')
+            GinIndex(fields=['custom_attributes'], opclasses=['jsonb_path_ops'], name='saleproduct_attrs_idx'),
+            # Paginación por cursor del listado
+            models.Index(fields=['name', 'id'], name='saleproduct_name_id_idx'),
+            # Alertas de stock bajo: solo indexa los productos bajo el umbral. Cambiar
+            # LOW_STOCK_THRESHOLD requiere una migración que recree este índice.
+            models.Index(
+                fields=['stock_quantity', 'id'], name='saleproduct_low_stock_idx',
+                condition=Q(stock_quantity__lt=LOW_STOCK_THRESHOLD),
+            ),
+        ]
     
     # Propiedad de disponibilidad
     @property
@@ -77,4 +344,187 @@ class SaleProduct(models.Model):
         return self.stock_quantity > 0
 
     def __str__(self):
-        return f"[{self.category.name}] {self.name} ({self.brand})"
\ No newline at end of file
+        return f"[{self.category.name}] {self.name} ({self.brand})"
+
+class InventorySnapshot(models.Model):
+    """
+    Foto diaria del inventario por categoría (ver el comando snapshot_inventory):
+    el dashboard grafica la evolución sin recorrer los productos.
+    """
+    taken_on = models.DateField(verbose_name="Fecha")
+    category = models.ForeignKey(
+        SaleCategory, on_delete=models.SET_NULL, null=True, related_name='inventory_snapshots', verbose_name="Categoría"
+    )
+    # Se conserva el nombre para el histórico de categorías borradas
+    category_name = models.CharField(max_length=100)
+    product_count = models.IntegerField(default=0)
+    out_of_stock = models.IntegerField(default=0)
+    low_stock = models.IntegerField(default=0)
+    stock_units = models.BigIntegerField(default=0)
+    inventory_value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = "Fotos de Inventario"
+        constraints = [
+            models.UniqueConstraint(fields=['taken_on', 'category'], name='unique_snapshot_day_category'),
+        ]
+
+    def __str__(self):
+        return f"{self.taken_on} {self.category_name}: ${self.inventory_value}"
+
+    @classmethod
+    def take(cls, day):
+        """
+        Guarda (o reemplaza) la foto del día con una consulta agregada por categoría y
+        un upsert. Retorna las filas escritas.
+        """
+        snapshots = [
+            cls(
+                taken_on=day, category_id=row['category'], category_name=row['category__name'],
+                **{field: row[field] for field in ('product_count', 'out_of_stock', 'low_stock', 'stock_units', 'inventory_value')}
+            )
+            for row in SaleProduct.objects.inventory_by_category()
+        ]
+        return cls.objects.bulk_create(
+            snapshots, update_conflicts=True, unique_fields=['taken_on', 'category'],
+            update_fields=['category_name', 'product_count', 'out_of_stock', 'low_stock', 'stock_units', 'inventory_value'],
+        )
+
+# --- Libro de movimientos de stock (ver products/ledger.py) ---
+
+class StockMovement(models.Model):
+    """
+    Movimiento de inventario de un producto de venta o de arrendamiento. Solo se
+    insertan filas (un trigger de la base rechaza UPDATE y DELETE): el stock de
+    cualquier momento se reconstruye sumando movimientos desde un StockCheckpoint.
+
+    `quantity` es el cambio de unidades en bodega (+ entra, - sale). Las ventas,
+    reposiciones y ajustes cambian stock_quantity; las salidas y devoluciones de
+    arrendamiento no (la flota es la misma), solo cuántas unidades están con clientes.
+    """
+    SALE = 'SALE'
+    RESTOCK = 'RESTOCK'
+    RENTAL_OUT = 'RENTAL_OUT'
+    RENTAL_IN = 'RENTAL_IN'
+    ADJUSTMENT = 'ADJUSTMENT'
+    KIND_CHOICES = (
+        (SALE, 'Venta'),
+        (RESTOCK, 'Reposición'),
+        (RENTAL_OUT, 'Salida por arrendamiento'),
+        (RENTAL_IN, 'Devolución de arrendamiento'),
+        (ADJUSTMENT, 'Ajuste'),
+    )
+    RENTAL_KINDS = (RENTAL_OUT, RENTAL_IN)
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.PROTECT)
+    object_id = models.PositiveIntegerField()
+    product = GenericForeignKey('content_type', 'object_id')
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, verbose_name="Tipo")
+    quantity = models.IntegerField(verbose_name="Unidades")
+    # Origen del movimiento: 'order:12', 'contract:4', 'purchase', 'admin'...
+    reference = models.CharField(max_length=50, blank=True, verbose_name="Referencia")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="Fecha")
+
+    class Meta:
+        verbose_name_plural = "Movimientos de Stock"
+        indexes = [
+            # Historial de un producto y suma de un rango de fechas desde su checkpoint
+            models.Index(fields=['content_type', 'object_id', 'created_at'], name='stockmovement_product_idx'),
+            # Movimientos nuevos desde el último checkpoint
+            models.Index(fields=['created_at'], name='stockmovement_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.quantity:+d} ({self.content_type.model} {self.object_id})"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValidationError("Los movimientos de stock no se modifican; registre un ajuste.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValidationError("Los movimientos de stock no se borran; registre un ajuste.")
+
+class StockCheckpoint(models.Model):
+    """
+    Saldo de un producto que incluye todos sus movimientos anteriores a `as_of`.
+    Stock en un momento T = último checkpoint antes de T + movimientos entre ambos.
+    """
+    content_type = models.ForeignKey(ContentType, on_delete=models.PROTECT)
+    object_id = models.PositiveIntegerField()
+    as_of = models.DateTimeField(verbose_name="Saldo al")
+    stock = models.IntegerField(verbose_name="Stock")
+    rented_out = models.IntegerField(default=0, verbose_name="Unidades arrendadas")
+
+    class Meta:
+        verbose_name_plural = "Checkpoints de Stock"
+        constraints = [
+            models.UniqueConstraint(fields=['content_type', 'object_id', 'as_of'], name='unique_stock_checkpoint'),
+        ]
+
+    def __str__(self):
+        return f"{self.content_type_id}:{self.object_id} al {self.as_of:%Y-%m-%d %H:%M} = {self.stock}"
+
+# --- Vocabulario para la búsqueda tolerante a errores ---
+
+class SearchTermManager(models.Manager):
+
+    def add_from_products(self, product_ids=None):
+        """
+        Registra en el vocabulario las palabras de nombre, marca y modelo de los
+        productos indicados (o de todo el catálogo) con un solo INSERT ... SELECT.
+        """
+        where, params = '', []
+        if product_ids is not None:
+            where, params = 'WHERE id = ANY(%s)', [list(product_ids)]
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {self.model._meta.db_table} (word)
+                SELECT DISTINCT word FROM (
+                    SELECT unnest(tsvector_to_array(
+                        to_tsvector('simple', name || ' ' || brand || ' ' || model)
+                    )) AS word
+                    FROM {SaleProduct._meta.db_table} {where}
+                ) AS words
+                WHERE length(word) BETWEEN 3 AND 100
+                ON CONFLICT (word) DO NOTHING
+            """, params)
+
+    def correct(self, text):
+        """
+        Reemplaza cada palabra del texto por la más parecida del vocabulario
+        (similitud de trigramas, una sola consulta para todas las palabras).
+        """
+        words = text.lower().split()
+        candidates = [word for word in words if len(word) >= 3]
+        if not candidates:
+            return text
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT t.word, (
+                    SELECT term.word FROM {self.model._meta.db_table} term
+                    WHERE term.word %% t.word
+                    ORDER BY similarity(term.word, t.word) DESC, term.word
+                    LIMIT 1
+                )
+                FROM unnest(%s::text[]) AS t(word)
+            """, [candidates])
+            corrections = {word: match for word, match in cursor.fetchall() if match}
+        return ' '.join(corrections.get(word, word) for word in words)
+
+
+class SearchTerm(models.Model):
+    """Palabra del catálogo; el vocabulario es mucho menor que el número de productos."""
+
+    word = models.CharField(max_length=100, primary_key=True)
+
+    objects = SearchTermManager()
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['word'], opclasses=['gin_trgm_ops'], name='searchterm_word_trgm_idx'),
+        ]
+
+    def __str__(self):
+        return self.word
@@ -12,9 +12,14 @@ class SaleCategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'parent', 'subcategories']
         
     def get_subcategories(self, obj):
-        # Recursivamente serializa las subcategorías hijas
+        # El árbol se arma en memoria a partir de una sola consulta (path materializado).
+        # La vista lo pasa en el contexto; si no, se carga el subárbol de este nodo.
+        children = self.context.get('category_children')
+        if children is None:
+            _, children = obj.get_descendants(include_self=True).build_tree()
+            self.context['category_children'] = children
         # Usamos context=self.context para permitir la serialización recursiva
-        return SaleCategorySerializer(obj.subcategories.all(), many=True, context=self.context).data
+        return SaleCategorySerializer(children.get(obj.pk, []), many=True, context=self.context).data
 
 # --- Serializador de Producto ---
 
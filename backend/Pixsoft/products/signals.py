@@ -0,0 +1,47 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from .models import SaleCategory, SaleProduct, SearchTerm
+from . import ledger
+from api.cache import catalog_cache
+
+@receiver(post_delete, sender=SaleCategory)
+def detach_category_descendants(sender, instance, **kwargs):
+    """
+    Mantiene el path materializado cuando se borra una categoría:
+    sus subcategorías pasan a ser raíces junto con todo su subárbol.
+    """
+    instance.detach_descendants()
+
+@receiver(post_save, sender=SaleProduct)
+def index_product_terms(sender, instance, **kwargs):
+    """
+    Agrega al vocabulario de búsqueda las palabras del producto guardado.
+    (El tsvector lo recalcula PostgreSQL; las altas masivas llaman a
+    SearchTerm.objects.add_from_products() por lote.)
+    """
+    SearchTerm.objects.add_from_products([instance.pk])
+
+@receiver(post_init, sender=SaleProduct)
+def remember_product_stock(sender, instance, **kwargs):
+    ledger.remember_stock(instance)
+
+@receiver(post_save, sender=SaleProduct)
+def record_product_stock_change(sender, instance, created, **kwargs):
+    """Altas y ediciones del stock (p. ej. desde el admin) quedan en el libro de movimientos."""
+    ledger.record_saved_stock(instance, created)
+
+@receiver(post_save, sender=SaleProduct)
+@receiver(post_delete, sender=SaleProduct)
+def invalidate_product_cache(sender, instance, **kwargs):
+    """
+    Un alta, baja o edición puede cambiar cualquier listado (orden, filtros) y
+    las facetas de su categoría actual y de la anterior, así que se invalidan los
+    espacios completos de productos y facetas.
+    """
+    catalog_cache.invalidate('products', 'facets')
+
+@receiver(post_save, sender=SaleCategory)
+@receiver(post_delete, sender=SaleCategory)
+def invalidate_category_cache(sender, instance, **kwargs):
+    """El árbol de categorías y los productos (muestran category_name) quedan desactualizados."""
+    catalog_cache.invalidate('categories')
@@ -1,3 +1,502 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.core.files.uploadedfile import SimpleUploadedFile
+from .models import InventorySnapshot, SaleCategory, SaleProduct, SearchTerm, StockMovement
+from .importer import SaleProductImporter, read_rows
+from . import ledger
+from api.cache import catalog_cache
+from leasing.models import RentalCategory, RentalContract, RentalPlan, RentalProduct
+from orders.models import Cart
+from orders.services import checkout
+
+
+class CategoryTreeTests(APITestCase):
+    """
+    Pruebas del árbol materializado de categorías (path/depth).
+    """
+
+    def setUp(self):
+        self.cables = SaleCategory.objects.create(name='Cables')
+        self.hdmi = SaleCategory.objects.create(name='Cables HDMI', parent=self.cables)
+        self.hdmi_8k = SaleCategory.objects.create(name='HDMI 8K', parent=self.hdmi)
+        self.componentes = SaleCategory.objects.create(name='Componentes')
+
+    def refresh(self, *categories):
+        for category in categories:
+            category.refresh_from_db()
+
+    def test_paths_are_built_on_create(self):
+        self.assertEqual(self.cables.depth, 0)
+        self.assertEqual(self.hdmi_8k.depth, 2)
+        self.assertTrue(self.hdmi_8k.path.startswith(self.hdmi.path))
+        self.assertEqual(
+            list(self.hdmi_8k.get_ancestors().values_list('name', flat=True)),
+            ['Cables', 'Cables HDMI']
+        )
+
+    def test_moving_a_node_rewrites_its_subtree(self):
+        self.hdmi.parent = self.componentes
+        self.hdmi.save()
+        self.refresh(self.hdmi, self.hdmi_8k)
+
+        self.assertTrue(self.hdmi_8k.path.startswith(self.componentes.path))
+        self.assertEqual(self.hdmi_8k.depth, 2)
+        self.assertEqual(list(self.cables.get_descendants()), [])
+
+    def test_cannot_move_under_own_descendant(self):
+        from django.core.exceptions import ValidationError
+        self.cables.parent = self.hdmi_8k
+        with self.assertRaises(ValidationError):
+            self.cables.save()
+
+    def test_deleting_a_node_promotes_children_to_roots(self):
+        self.hdmi.delete()
+        self.refresh(self.hdmi_8k)
+
+        self.assertIsNone(self.hdmi_8k.parent_id)
+        self.assertEqual(self.hdmi_8k.depth, 0)
+        self.assertEqual(self.hdmi_8k.path, f"{self.hdmi_8k.pk:010d}/")
+
+    def test_products_in_category_include_descendants(self):
+        for sku, category in [('C-1', self.cables), ('H-1', self.hdmi_8k), ('X-1', self.componentes)]:
+            SaleProduct.objects.create(
+                name=sku, description='', sku=sku, price=Decimal('10.00'), category=category
+            )
+        skus = SaleProduct.objects.in_category(self.cables).values_list('sku', flat=True)
+        self.assertEqual(sorted(skus), ['C-1', 'H-1'])
+
+    def test_list_endpoint_uses_a_single_query(self):
+        for i in range(20):
+            SaleCategory.objects.create(name=f'Sub {i}', parent=self.hdmi_8k)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/v1/products/category/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        names = [category['name'] for category in response.data]
+        self.assertEqual(names, ['Cables', 'Componentes'])
+        hdmi_8k = response.data[0]['subcategories'][0]['subcategories'][0]
+        self.assertEqual(len(hdmi_8k['subcategories']), 20)
+
+    def test_list_endpoint_can_return_a_subtree(self):
+        response = self.client.get('/api/v1/products/category/', {'root': self.hdmi.pk})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([category['name'] for category in response.data], ['Cables HDMI'])
+        self.assertEqual(response.data[0]['subcategories'][0]['name'], 'HDMI 8K')
+
+
+class CatalogSearchTests(APITestCase):
+    """
+    Pruebas de la búsqueda de texto completo / trigramas del catálogo.
+    """
+
+    def setUp(self):
+        category = SaleCategory.objects.create(name='Conectividad')
+        products = [
+            ('Switch PoE 24 puertos', 'Cisco', 'SW-CIS-024', 'Switch administrable con PoE+'),
+            ('Cable HDMI 2.1', 'Ugreen', 'CAB-HDMI-8K', 'Cable para monitores 8K'),
+            ('Adaptador USB-C a HDMI', 'Ugreen', 'ADP-USBC-HDMI', 'Adaptador compacto'),
+            ('Monitor 27 pulgadas', 'Dell', 'MON-DELL-27', 'Entradas HDMI y DisplayPort'),
+        ]
+        for name, brand, sku, description in products:
+            SaleProduct.objects.create(
+                name=name, brand=brand, sku=sku, description=description,
+                price=Decimal('100.00'), stock_quantity=3, category=category
+            )
+
+    def search(self, text, **params):
+        return self.client.get('/api/v1/products/product/search/', {'q': text, **params})
+
+    def test_results_are_ranked_by_relevance(self):
+        response = self.search('hdmi')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        skus = [product['sku'] for product in response.data['results']]
+        # El nombre pesa más que la descripción
+        self.assertEqual(set(skus[:2]), {'CAB-HDMI-8K', 'ADP-USBC-HDMI'})
+        self.assertEqual(skus[2], 'MON-DELL-27')
+
+    def test_typos_are_corrected_against_the_catalog_vocabulary(self):
+        response = self.search('adaptadr')
+
+        self.assertEqual([p['sku'] for p in response.data['results']], ['ADP-USBC-HDMI'])
+
+    def test_search_by_sku(self):
+        response = self.search('SW-CIS-024')
+
+        self.assertEqual([p['sku'] for p in response.data['results']], ['SW-CIS-024'])
+
+    def test_results_are_paginated(self):
+        first = self.search('ugreen', page_size=1)
+
+        self.assertEqual(len(first.data['results']), 1)
+        self.assertIsNotNone(first.data['next'])
+        second = self.client.get(first.data['next'])
+        self.assertEqual(len(second.data['results']), 1)
+        self.assertIsNone(second.data['next'])
+        self.assertNotEqual(first.data['results'][0]['id'], second.data['results'][0]['id'])
+
+    def test_query_is_required(self):
+        response = self.client.get('/api/v1/products/product/search/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AttributeFacetTests(APITestCase):
+    """
+    Pruebas de filtros por atributos personalizados y conteo de facetas.
+    """
+
+    def setUp(self):
+        catalog_cache.clear()
+        self.redes = SaleCategory.objects.create(name='Redes')
+        self.switches = SaleCategory.objects.create(name='Switches', parent=self.redes)
+        products = [
+            ('SW-1', self.switches, {'Velocidad': '10Gbps', 'PoE': 'Sí'}),
+            ('SW-2', self.switches, {'Velocidad': '1Gbps', 'PoE': 'Sí'}),
+            ('SW-3', self.switches, {'Velocidad': '10Gbps', 'PoE': 'No'}),
+            ('NIC-1', self.redes, {'Velocidad': '10Gbps'}),
+        ]
+        for sku, category, attributes in products:
+            SaleProduct.objects.create(
+                name=sku, description='', sku=sku, price=Decimal('50.00'),
+                stock_quantity=2, category=category, custom_attributes=attributes
+            )
+
+    def test_list_filters_by_attributes(self):
+        response = self.client.get('/api/v1/products/product/', {'attr.Velocidad': '10Gbps', 'attr.PoE': 'Sí'})
+
+        self.assertEqual([p['sku'] for p in response.data['results']], ['SW-1'])
+
+    def test_repeated_attribute_values_are_combined_with_or(self):
+        response = self.client.get('/api/v1/products/product/?attr.Velocidad=1Gbps&attr.Velocidad=10Gbps&attr.PoE=No')
+
+        self.assertEqual([p['sku'] for p in response.data['results']], ['SW-3'])
+
+    def test_numeric_and_boolean_attributes_match_their_facet_text(self):
+        SaleProduct.objects.create(
+            name='SW-5', description='', sku='SW-5', price=Decimal('50.00'),
+            category=self.switches, custom_attributes={'Puertos': 48, 'Apilable': True}
+        )
+        facets = self.client.get('/api/v1/products/product/facets/', {'category': self.switches.pk}).data
+        self.assertEqual(facets['Puertos'], [{'value': '48', 'count': 1}])
+
+        response = self.client.get('/api/v1/products/product/', {'attr.Puertos': '48', 'attr.Apilable': 'true'})
+        self.assertEqual([p['sku'] for p in response.data['results']], ['SW-5'])
+
+    def test_facets_are_counted_within_the_current_filter(self):
+        response = self.client.get('/api/v1/products/product/facets/', {'category': self.switches.pk})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['Velocidad'], [
+            {'value': '10Gbps', 'count': 2}, {'value': '1Gbps', 'count': 1}
+        ])
+
+        response = self.client.get('/api/v1/products/product/facets/', {'attr.PoE': 'Sí'})
+        self.assertEqual(response.data['Velocidad'], [
+            {'value': '10Gbps', 'count': 1}, {'value': '1Gbps', 'count': 1}
+        ])
+
+    def test_category_facets_are_cached_and_invalidated_on_product_changes(self):
+        url = '/api/v1/products/product/facets/'
+        self.client.get(url, {'category': self.redes.pk})
+        with self.assertNumQueries(0):
+            self.client.get(url, {'category': self.redes.pk})
+
+        # Un producto nuevo en la subcategoría invalida también la categoría padre
+        SaleProduct.objects.create(
+            name='SW-4', description='', sku='SW-4', price=Decimal('50.00'),
+            category=self.switches, custom_attributes={'Velocidad': '25Gbps'}
+        )
+        response = self.client.get(url, {'category': self.redes.pk})
+        self.assertIn({'value': '25Gbps', 'count': 1}, response.data['Velocidad'])
+
+
+
+class InventoryAnalyticsTests(APITestCase):
+    """
+    Pruebas del reporte de inventario (KPIs en una pasada y fotos diarias).
+    """
+
+    def setUp(self):
+        self.admin = get_user_model().objects.create_user(username='admin', is_staff=True)
+        self.client.force_authenticate(user=self.admin)
+        self.cables = SaleCategory.objects.create(name='Cables')
+        self.discos = SaleCategory.objects.create(name='Discos')
+        for sku, category, price, stock in [
+            ('CAB-1', self.cables, '2.00', 0),
+            ('CAB-2', self.cables, '3.00', 4),
+            ('CAB-3', self.cables, '1.00', 100),
+            ('SSD-1', self.discos, '50.00', 7),
+        ]:
+            SaleProduct.objects.create(
+                name=sku, description='', sku=sku, price=Decimal(price), stock_quantity=stock, category=category
+            )
+
+    def test_summary_is_a_single_conditional_aggregate(self):
+        with self.assertNumQueries(4):  # resumen, categorías, alertas, historial
+            response = self.client.get('/api/v1/dashboard/inventory/')
+
+        self.assertEqual(response.data['summary'], {
+            'total_products': 4, 'out_of_stock': 1, 'low_stock': 1, 'low_stock_threshold': 5,
+            'total_stock_units': 111, 'total_inventory_value': Decimal('462.00'),
+        })
+        self.assertEqual([alert['sku'] for alert in response.data['alerts']], ['CAB-1', 'CAB-2'])
+        self.assertEqual(response.data['by_category'][0]['count'], 3)
+
+    def test_daily_snapshots_feed_the_trend(self):
+        today = timezone.localdate()
+        InventorySnapshot.take(today - timedelta(days=1))
+        SaleProduct.objects.filter(sku='SSD-1').update(stock_quantity=1)
+        InventorySnapshot.take(today)
+        # Repetir la foto del día la reemplaza
+        self.assertEqual(len(InventorySnapshot.take(today)), 2)
+
+        response = self.client.get('/api/v1/dashboard/inventory/', {'days': 7})
+
+        self.assertEqual(
+            [(point['inventory_value'], point['stock_units']) for point in response.data['history']],
+            [(Decimal('462.00'), 111), (Decimal('162.00'), 105)]
+        )
+
+
+
+class StockLedgerTests(APITestCase):
+    """
+    Pruebas del libro de movimientos de stock, sus checkpoints y la conciliación.
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='cliente')
+        category = SaleCategory.objects.create(name='Impresoras')
+        self.printer = SaleProduct.objects.create(
+            name='Impresora', description='', sku='IMP-1', price=Decimal('90.00'), stock_quantity=10, category=category
+        )
+        self.projector = RentalProduct.objects.create(
+            name='Proyector', description='', sku='PRY-1', stock_quantity=3,
+            category=RentalCategory.objects.create(name='Video')
+        )
+        self.plan = RentalPlan.objects.create(product=self.projector, period='DAILY', base_price=Decimal('15.00'))
+
+    def movements(self, product):
+        return list(StockMovement.objects.filter(object_id=product.pk, content_type__model=product._meta.model_name)
+                    .order_by('id').values_list('kind', 'quantity', 'reference'))
+
+    def test_purchase_checkout_and_edits_are_recorded(self):
+        self.client.post(f'/api/v1/products/product/{self.printer.pk}/purchase/', {'quantity': 2})
+        cart = Cart.objects.create(user=self.user)
+        cart.items.create(product=self.printer, quantity=3)
+        order = checkout(cart)
+        product = SaleProduct.objects.get(pk=self.printer.pk)
+        product.stock_quantity = 1
+        product.save()
+
+        self.assertEqual(self.movements(self.printer), [
+            ('RESTOCK', 10, 'alta'),
+            ('SALE', -2, 'purchase'),
+            ('SALE', -3, f'order:{order.pk}'),
+            ('ADJUSTMENT', -4, 'edición'),
+        ])
+        self.assertEqual(ledger.reconcile(), [])
+
+    def test_rental_contracts_move_units_without_changing_the_fleet(self):
+        contract = RentalContract.objects.create(
+            customer=self.user, product=self.projector, plan=self.plan, start_date=timezone.localdate(),
+            end_date=timezone.localdate() + timedelta(days=3), total_cost=Decimal('45.00'), status='ACTIVE',
+        )
+        self.assertEqual(ledger.stock_at(self.projector, timezone.now()), {'stock': 3, 'rented_out': 1})
+
+        contract.status = 'COMPLETED'
+        contract.save()
+        self.assertEqual(ledger.stock_at(self.projector, timezone.now()), {'stock': 3, 'rented_out': 0})
+        self.assertEqual(ledger.reconcile(), [])
+
+    def test_point_in_time_stock_uses_checkpoints(self):
+        now = timezone.now()
+        content_type = StockMovement.objects.get(object_id=self.printer.pk, kind='RESTOCK').content_type
+        StockMovement.objects.bulk_create([
+            StockMovement(content_type=content_type, object_id=self.printer.pk, kind='SALE', quantity=-1,
+                          created_at=now + timedelta(days=day))
+            for day in range(1, 6)
+        ])
+
+        self.assertEqual(ledger.checkpoint(as_of=now + timedelta(days=3, hours=1)), 2)  # impresora y proyector
+        # Una segunda pasada sin movimientos nuevos no crea nada
+        self.assertEqual(ledger.checkpoint(as_of=now + timedelta(days=3, hours=2)), 0)
+        self.assertEqual(ledger.stock_at(self.printer, now + timedelta(days=2, hours=1))['stock'], 8)
+        with self.assertNumQueries(2):
+            self.assertEqual(ledger.stock_at(self.printer, now + timedelta(days=4, hours=1))['stock'], 6)
+
+    def test_reconciliation_reports_untracked_changes(self):
+        SaleProduct.objects.filter(pk=self.printer.pk).update(stock_quantity=7)
+
+        self.assertEqual(ledger.reconcile(), [{
+            'type': 'saleproduct', 'id': self.printer.pk, 'sku': 'IMP-1', 'stock_quantity': 7, 'ledger': 10,
+        }])
+
+    def test_movements_are_append_only(self):
+        with self.assertRaises(DatabaseError), transaction.atomic():
+            StockMovement.objects.update(quantity=0)
+
+
+
+class CatalogExportTests(APITestCase):
+    """
+    Pruebas de la exportación en streaming de los catálogos de venta y arrendamiento.
+    """
+
+    def setUp(self):
+        self.client.force_authenticate(user=get_user_model().objects.create_user(username='ops', is_staff=True))
+        category = SaleCategory.objects.create(name='Redes')
+        for i in range(5):
+            SaleProduct.objects.create(
+                name=f'Router {i}', description='', sku=f'RTR-{i}', price=Decimal('30.00'), stock_quantity=i,
+                category=category, custom_attributes={'Bandas': 'Dual, 5GHz'}
+            )
+        laptop = RentalProduct.objects.create(
+            name='Laptop', description='', sku='LAP-1', stock_quantity=2,
+            category=RentalCategory.objects.create(name='Cómputo')
+        )
+        RentalPlan.objects.create(product=laptop, period='WEEKLY', base_price=Decimal('40.00'))
+        RentalPlan.objects.create(product=laptop, period='MONTHLY', base_price=Decimal('120.00'))
+        RentalProduct.objects.create(name='Tablet', description='', sku='TAB-1', category=laptop.category)
+
+    def download(self, url, params=None):
+        response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_csv_export_streams_every_product(self):
+        rows = list(csv.DictReader(io.StringIO(self.download('/api/v1/products/product/export/').decode())))
+
+        self.assertEqual([row['sku'] for row in rows], [f'RTR-{i}' for i in range(5)])
+        self.assertEqual(rows[0]['category'], 'Redes')
+        self.assertEqual(json.loads(rows[0]['custom_attributes']), {'Bandas': 'Dual, 5GHz'})
+
+    def test_incremental_gzip_ndjson_export(self):
+        since = timezone.now()
+        SaleProduct.objects.filter(sku='RTR-3').update(updated_at=since + timedelta(seconds=1))
+
+        body = self.download('/api/v1/products/product/export/', {
+            'output': 'ndjson', 'compression': 'gzip', 'since': since.isoformat()
+        })
+
+        lines = gzip.decompress(body).decode().splitlines()
+        self.assertEqual([json.loads(line)['sku'] for line in lines], ['RTR-3'])
+
+    def test_rental_export_nests_plans_in_one_query(self):
+        with self.assertNumQueries(1):
+            body = self.download('/api/v1/leasing/products/export/', {'output': 'ndjson'})
+
+        laptop, tablet = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([plan['period'] for plan in laptop['plans']], ['WEEKLY', 'MONTHLY'])
+        self.assertEqual(tablet['plans'], [])
+
+    def test_invalid_parameters_and_anonymous_users_are_rejected(self):
+        response = self.client.get('/api/v1/products/product/export/', {'since': 'ayer'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(user=None)
+        response = self.client.get('/api/v1/leasing/products/export/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class CatalogImportTests(APITestCase):
+    """
+    Pruebas de la importación masiva por SKU: upsert por lotes, rechazos por fila
+    y registro de las diferencias de stock en el libro.
+    """
+
+    def setUp(self):
+        self.client.force_authenticate(user=get_user_model().objects.create_user(username='ops', is_staff=True))
+        self.category = SaleCategory.objects.create(name='Redes')
+        self.existing = SaleProduct.objects.create(
+            name='Router viejo', description='', sku='RTR-1', price=Decimal('30.00'), stock_quantity=10,
+            category=self.category
+        )
+
+    def upload(self, url, name, content, **data):
+        return self.client.post(url, {'file': SimpleUploadedFile(name, content), **data}, format='multipart')
+
+    def test_csv_import_upserts_by_sku_and_reports_rejects(self):
+        content = (
+            "sku,name,brand,model,description,category,price,stock_quantity,custom_attributes\n"
+            "RTR-1,Router nuevo,Acme,AX,,redes,35.50,4,\n"
+            "SWT-1,Switch gestionable,Acme,S8,,Redes,80,12,\"{\"\"Puertos\"\": 8}\"\n"
+            "BAD-1,Cable,,,,Redes,gratis,1,\n"
+            "BAD-2,Antena,,,,Antenas,10,1,\n"
+        ).encode()
+
+        response = self.upload('/api/v1/products/product/import/', 'catalogo.csv', content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            {key: response.data[key] for key in ('read', 'created', 'updated', 'rejected')},
+            {'read': 4, 'created': 1, 'updated': 1, 'rejected': 2}
+        )
+        self.assertEqual([reject['line'] for reject in response.data['rejects']], [4, 5])
+
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.name, self.existing.price, self.existing.stock_quantity), ('Router nuevo', Decimal('35.50'), 4))
+        switch = SaleProduct.objects.get(sku='SWT-1')
+        self.assertEqual(switch.custom_attributes, {'Puertos': 8})
+        self.assertTrue(SearchTerm.objects.filter(word='switch').exists())
+        # Libro de stock: el alta repone 12 y el producto existente ajusta -6
+        self.assertEqual(ledger.stock_at(switch, timezone.now())['stock'], 12)
+        self.assertEqual(ledger.stock_at(self.existing, timezone.now())['stock'], 4)
+
+    def test_gzip_ndjson_import_creates_categories_in_chunks(self):
+        lines = [json.dumps({'sku': f'SWT-{i}', 'name': f'Switch {i}', 'category': 'Conmutadores', 'price': '20', 'stock_quantity': i}) for i in range(7)]
+        lines.insert(3, '{roto')
+        content = gzip.compress('\n'.join(lines).encode())
+
+        response = self.upload('/api/v1/products/product/import/', 'catalogo.ndjson.gz', content, create_categories='true')
+
+        self.assertEqual(response.data['created'], 7)
+        self.assertEqual(response.data['rejects'], [{'line': 4, 'error': 'Línea JSON inválida.'}])
+        category = SaleCategory.objects.get(name='Conmutadores')
+        self.assertTrue(category.path)
+        self.assertEqual(SaleProduct.objects.filter(category=category).count(), 7)
+
+    def test_chunks_run_constant_queries_and_later_rows_win(self):
+        rows = [
+            (line, {'sku': f'SKU-{line % 150}', 'name': f'Producto {line}', 'category': 'Redes', 'price': '1', 'stock_quantity': line}, None)
+            for line in range(200)
+        ]
+        progress = []
+        importer = SaleProductImporter(chunk_size=100, on_progress=lambda report: progress.append(report.read))
+
+        # Por lote: savepoint, staging (CREATE IF NOT EXISTS, TRUNCATE y COPY), bloqueo,
+        # upsert, libro de stock, vocabulario y fin del savepoint
+        with self.assertNumQueries(2 * 9):
+            importer.run(rows)
+
+        self.assertEqual(progress, [100, 200])
+        self.assertEqual(SaleProduct.objects.values_list('name', 'stock_quantity').get(sku='SKU-49'), ('Producto 199', 199))
+
+    def test_invalid_file_and_non_staff_users_are_rejected(self):
+        response = self.upload('/api/v1/products/product/import/', 'catalogo.xlsx', b'')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(user=get_user_model().objects.create_user(username='cliente'))
+        response = self.upload('/api/v1/leasing/products/import/', 'equipos.csv', b'sku,name\n')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_rental_import_command_writes_rejects_file(self):
+        RentalCategory.objects.create(name='Cómputo')
+        content = "sku,name,description,category,stock_quantity,specifications\nLAP-1,Laptop,,Cómputo,3,\nLAP-2,Tablet,,Cómputo,-1,\n"
+        response = self.upload('/api/v1/leasing/products/import/', 'equipos.csv', content.encode())
+
+        self.assertEqual((response.data['created'], response.data['rejected']), (1, 1))
+        self.assertEqual(RentalProduct.objects.get(sku='LAP-1').stock_quantity, 3)
 
-# Create your tests here.
@@ -0,0 +1,19 @@
+from .models import SaleProduct
+
+# Columnas de la exportación del catálogo de venta (ver api/export.py)
+PRODUCT_EXPORT_COLUMNS = (
+    'id', 'sku', 'name', 'brand', 'model', 'category', 'price', 'stock_quantity',
+    'custom_attributes', 'updated_at',
+)
+
+
+def product_export(since=None):
+    """
+    (columnas, values_list) de la exportación de productos de venta, en orden de id.
+    Con `since` solo los modificados desde esa fecha (las bajas no aparecen).
+    """
+    products = SaleProduct.objects.order_by('pk')
+    if since:
+        products = products.filter(updated_at__gte=since)
+    fields = [column if column != 'category' else 'category__name' for column in PRODUCT_EXPORT_COLUMNS]
+    return PRODUCT_EXPORT_COLUMNS, products.values_list(*fields)
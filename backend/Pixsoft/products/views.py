@@ -3,19 +3,66 @@ from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.views import APIView
-from django.db.models import F, Count, Sum
-from .models import SaleCategory, SaleProduct
+from datetime import timedelta
+from django.db.models import F, Sum
+from django.utils import timezone
+from rest_framework.generics import get_object_or_404
+from .models import LOW_STOCK_THRESHOLD, InventorySnapshot, SaleCategory, SaleProduct
 from .serializers import SaleCategorySerializer, SaleProductSerializer
+from .utils import product_export
+from .importer import import_upload
+from api.cache import cache_response, catalog_cache
+from api.conditional import conditional_get
+from api.export import streaming_export
+from api.pagination import KeysetPagination
+from orders import reservations
+from orders.reservations import InsufficientStock
+
+# Búsqueda paginada por relevancia; el id desempata (ver SaleProductQuerySet.search)
+class SearchPagination(KeysetPagination):
+    ordering = ('-rank', '-id')
+
 
 # --- ViewSet para Categorías (Soporta Jerarquía) ---
 
 class SaleCategoryViewSet(viewsets.ModelViewSet):
     """Gestión de categorías y subcategorías (jerarquía)."""
-    # Muestra solo las categorías principales (parent__isnull=True)
-    queryset = SaleCategory.objects.filter(parent__isnull=True) 
+    queryset = SaleCategory.objects.all()
     serializer_class = SaleCategorySerializer
     permission_classes = [AllowAny] 
 
+    @conditional_get
+    @cache_response('categories')
+    def list(self, request, *args, **kwargs):
+        """
+        Devuelve el bosque completo (o el subárbol de ?root=<id>) con UNA consulta:
+        las categorías se leen ordenadas por path y el árbol se arma en memoria.
+        """
+        categories = SaleCategory.objects.all()
+        root_id = request.query_params.get('root')
+        if root_id:
+            root = get_object_or_404(SaleCategory, pk=root_id)
+            categories = categories.subtree(root)
+
+        roots, children = categories.build_tree()
+        context = self.get_serializer_context()
+        context['category_children'] = children
+        serializer = self.get_serializer_class()(roots, many=True, context=context)
+        return Response(serializer.data)
+
+    @conditional_get
+    @cache_response('categories')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    # URL: /api/v1/products/category/{id}/ancestors/
+    @action(detail=True, methods=['get'])
+    def ancestors(self, request, pk=None):
+        """Ruta desde la raíz hasta la categoría (breadcrumbs)."""
+        category = self.get_object()
+        data = category.get_ancestors(include_self=True).values('id', 'name', 'parent', 'depth')
+        return Response(list(data))
+
 # --- ViewSet para Productos (Incluye Manejo de Stock) ---
 
 class SaleProductViewSet(viewsets.ModelViewSet):
@@ -23,16 +70,109 @@ class SaleProductViewSet(viewsets.ModelViewSet):
     queryset = SaleProduct.objects.all()
     serializer_class = SaleProductSerializer
     permission_classes = [AllowAny] 
+    # Listado paginado por (name, id); índice saleproduct_name_id_idx
+    pagination_class = KeysetPagination
+    ordering = ('name', 'id')
     
     # Endpoint para consultar SOLO productos disponibles
     def get_queryset(self):
         queryset = super().get_queryset()
-        if self.action == 'list':
+        if self.action in ('list', 'search', 'facets'):
+            queryset = queryset.select_related('category')
+            # Productos de una categoría y sus subcategorías: ?category=<id>
+            category_id = self.request.query_params.get('category')
+            if category_id:
+                category = get_object_or_404(SaleCategory, pk=category_id)
+                queryset = queryset.in_category(category)
+            # Filtros por atributos personalizados: ?attr.Velocidad=10Gbps&attr.Color=Negro
+            attributes = self.get_attribute_filters()
+            if attributes:
+                queryset = queryset.with_attributes(attributes)
             # Permite filtrar por disponibilidad: /api/v1/products/productos/?available=true
-            if 'available' in self.request.query_params and self.request.query_params['available'].lower() == 'true':
-                return queryset.filter(stock_quantity__gt=0)
+            if self.only_available():
+                queryset = queryset.filter(stock_quantity__gt=0)
         return queryset
 
+    # Respuestas públicas cacheadas; cada fila se etiqueta como 'product:<id>'
+    # para que un cambio de stock invalide solo las entradas que la incluyen.
+    @conditional_get
+    @cache_response('products', 'categories', row_namespace='product')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_get
+    @cache_response('products', 'categories', row_namespace='product')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def get_attribute_filters(self):
+        """Parámetros ?attr.<Clave>=<valor> agrupados por clave (un valor repetido es OR)."""
+        params = self.request.query_params
+        return {
+            key[len('attr.'):]: params.getlist(key)
+            for key in params if key.startswith('attr.') and len(key) > len('attr.')
+        }
+
+    def only_available(self):
+        return self.request.query_params.get('available', '').lower() == 'true'
+
+    # URL: /api/v1/products/product/search/?q=cable hdmi&cursor=...
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Búsqueda en el catálogo (nombre, marca, modelo, SKU y descripción),
+        ordenada por relevancia y paginada por cursor sobre (rank, id): cada
+        página continúa desde la última fila de la anterior, sin OFFSET ni COUNT(*).
+        """
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            return Response({"detail": "El parámetro 'q' es requerido."}, status=status.HTTP_400_BAD_REQUEST)
+
+        paginator = SearchPagination()
+        products = paginator.paginate_queryset(self.get_queryset().search(text), request)
+        serializer = self.get_serializer(products, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    # URL: /api/v1/products/product/facets/?category=3&attr.Velocidad=10Gbps
+    @action(detail=False, methods=['get'])
+    @cache_response('facets', 'categories')
+    def facets(self, request):
+        """
+        Conteo de valores de cada atributo dentro del filtro actual (una sola
+        consulta agregada). Se cachea en el espacio 'facets', que invalida
+        cualquier cambio de productos.
+        """
+        return Response(self.get_queryset().facet_counts())
+
+    # URL: /api/v1/products/product/export/?output=csv|ndjson&since=...&compression=gzip
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def export(self, request):
+        """
+        Exportación completa (o incremental con ?since=) del catálogo de venta en
+        streaming: se lee con un cursor del servidor y se escribe por lotes, así la
+        memoria no crece con el tamaño del catálogo.
+        """
+        response = streaming_export(request, product_export, 'productos')
+        if response is None:
+            return Response({"detail": "Parámetros de exportación inválidos."}, status=status.HTTP_400_BAD_REQUEST)
+        return response
+
+    # URL: /api/v1/products/product/import/ (multipart: file=.csv|.ndjson[.gz], create_categories=true)
+    @action(detail=False, methods=['post'], url_path='import', permission_classes=[IsAdminUser])
+    def bulk_import(self, request):
+        """
+        Alta/actualización masiva por SKU en lotes. Las filas inválidas no detienen
+        la carga: se informan en 'rejects' con su número de línea.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"detail": "Falta el archivo ('file')."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            summary = import_upload('sale', upload, request.data.get('create_categories') == 'true')
+        except ValueError as error:
+            return Response({"detail": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(summary)
+
     # Acción personalizada para simular una compra (reduce el stock)
     # URL: /api/v1/products/productos/{id}/purchase/
     @action(detail=True, methods=['post'], permission_classes=[AllowAny])
@@ -48,63 +188,78 @@ class SaleProductViewSet(viewsets.ModelViewSet):
         except ValueError:
              return Response({"detail": "Cantidad no válida."}, status=status.HTTP_400_BAD_REQUEST)
 
-        if product.stock_quantity < quantity:
+        # 4.1 Gestión de inventarios en tiempo real
+        # La fila del producto se bloquea antes de verificar: el stock disponible
+        # descuenta las reservas vigentes de los carritos y no hay sobreventa.
+        try:
+            new_stock = reservations.purchase(product.pk, quantity)
+        except InsufficientStock as error:
             # 4.1 Control de disponibilidad y notificación de agotado
             return Response({
-                "detail": f"Stock insuficiente. Solo quedan {product.stock_quantity} unidades.",
+                "detail": f"Stock insuficiente. Solo quedan {error.shortages[0]['available']} unidades.",
                 "notify_client": True # Opción para notificar al cliente si está agotado
             }, status=status.HTTP_409_CONFLICT)
-        
-        # 4.1 Gestión de inventarios en tiempo real
-        # Utilizamos F() para evitar condiciones de carrera (race conditions) al actualizar el stock
-        SaleProduct.objects.filter(pk=product.pk).update(stock_quantity=F('stock_quantity') - quantity)
-        product.refresh_from_db()
+
+        # update() no emite señales: se invalidan a mano solo las entradas afectadas
+        catalog_cache.invalidate(f"product:{product.pk}")
+        if new_stock == 0:
+            # Deja de contar en las facetas y listados de productos disponibles
+            catalog_cache.invalidate('products', 'facets')
 
         return Response({
             "message": "Compra procesada. Stock actualizado en tiempo real.",
-            "new_stock": product.stock_quantity
+            "new_stock": new_stock
         }, status=status.HTTP_200_OK)
 
 class InventoryAnalyticsView(APIView):
     """
     Endpoint para Reportes de Inventario.
     Retorna:
-    - Estado del stock (Total, Agotado, Bajo Stock).
+    - Estado del stock (Total, Agotado, Bajo Stock) y valor total del inventario,
+      en una sola consulta con agregados condicionales.
     - Distribución por categorías.
-    - Valor total del inventario.
+    - Alertas de stock bajo (umbral LOW_STOCK_THRESHOLD, índice parcial).
+    - Evolución del valor y del stock según las fotos diarias (?days=, por defecto 30).
     """
     permission_classes = [IsAdminUser]
 
     def get(self, request):
-        # 1. KPIs de Stock
-        total_products = SaleProduct.objects.count()
-        out_of_stock = SaleProduct.objects.filter(stock_quantity=0).count()
-        low_stock = SaleProduct.objects.filter(stock_quantity__lt=5, stock_quantity__gt=0).count()
-        
-        # Valor del inventario (Precio * Cantidad)
-        inventory_value_qs = SaleProduct.objects.aggregate(
-            total_value=Sum(F('price') * F('stock_quantity'))
-        )
-        total_value = inventory_value_qs['total_value'] or 0
+        try:
+            days = max(1, min(int(request.query_params.get('days', 30)), 366 * 5))
+        except ValueError:
+            return Response({'error': 'days debe ser un número.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # 1. KPIs de Stock y valor del inventario (Precio * Cantidad)
+        summary = SaleProduct.objects.inventory_summary()
 
         # 2. Distribución por Categoría
-        category_distribution = SaleProduct.objects.values('category__name').annotate(
-            count=Count('id')
-        ).order_by('-count')
+        category_distribution = SaleProduct.objects.inventory_by_category().values(
+            'category__name', 'stock_units', 'inventory_value', count=F('product_count')
+        )
 
         # 3. Alertas de Stock Bajo (Detalle)
-        low_stock_items = SaleProduct.objects.filter(stock_quantity__lt=5).values(
+        low_stock_items = SaleProduct.objects.low_stock().order_by('stock_quantity', 'id').values(
             'name', 'sku', 'stock_quantity'
         )[:10]
 
+        # 4. Tendencia desde las fotos diarias (sin recorrer productos)
+        history = InventorySnapshot.objects.filter(
+            taken_on__gt=timezone.localdate() - timedelta(days=days)
+        ).values('taken_on').annotate(
+            inventory_value=Sum('inventory_value'), stock_units=Sum('stock_units'), out_of_stock=Sum('out_of_stock')
+        ).order_by('taken_on')
+
         data = {
             "summary": {
-                "total_products": total_products,
-                "out_of_stock": out_of_stock,
-                "low_stock": low_stock,
-                "total_inventory_value": total_value
+                "total_products": summary['product_count'],
+                "out_of_stock": summary['out_of_stock'],
+                "low_stock": summary['low_stock'],
+                "low_stock_threshold": LOW_STOCK_THRESHOLD,
+                "total_stock_units": summary['stock_units'],
+                "total_inventory_value": summary['inventory_value']
             },
             "by_category": list(category_distribution),
-            "alerts": list(low_stock_items)
+            "alerts": list(low_stock_items),
+            "history": list(history)
         }
         return Response(data)
\ No newline at end of file
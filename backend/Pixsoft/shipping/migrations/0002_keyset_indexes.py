@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 07:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipping', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['created_at', 'id'], name='shipment_created_idx'),
+        ),
+    ]
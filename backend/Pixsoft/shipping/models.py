@@ -50,5 +50,11 @@ class Shipment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Listado de envíos paginado por cursor
+            models.Index(fields=['created_at', 'id'], name='shipment_created_idx'),
+        ]
+
     def __str__(self):
         return f"Envío #{self.id} - {self.tracking_number or 'Sin Tracking'} ({self.status})"
@@ -3,14 +3,18 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from .models import ShippingMethod, Shipment
 from .serializers import ShippingMethodSerializer, ShipmentSerializer
+from api.pagination import KeysetPagination
 
 class ShippingMethodViewSet(viewsets.ModelViewSet):
     queryset = ShippingMethod.objects.all()
     serializer_class = ShippingMethodSerializer
 
 class ShipmentViewSet(viewsets.ModelViewSet):
-    queryset = Shipment.objects.all().order_by('-created_at')
+    queryset = Shipment.objects.select_related('shipping_method').order_by('-created_at')
     serializer_class = ShipmentSerializer
+    # Paginación por cursor sobre (created_at, id); índice shipment_created_idx
+    pagination_class = KeysetPagination
+    ordering = ('-created_at', '-id')
 
     @action(detail=False, methods=['get'])
     def track(self, request):
@@ -2,6 +2,7 @@ from rest_framework import generics, viewsets, status
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from .serializers import UserSerializer, CustomTokenObtainPairSerializer
+from api.pagination import KeysetPagination
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth import get_user_model
 from dj_rest_auth.registration.views import SocialLoginView
@@ -120,6 +121,9 @@ class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAdminUser]
+    # Paginación por cursor sobre username (único e indexado por auth_user)
+    pagination_class = KeysetPagination
+    ordering = ('username',)
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
@@ -139,6 +143,8 @@ class UserListUpdateView(generics.ListAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = KeysetPagination
+    ordering = ('username',)
 
 class ToggleUserStaffStatusView(generics.UpdateAPIView):
     queryset = User.objects.all()
@@ -2,6 +2,20 @@ import { useState, useEffect } from "react";
 import { Link } from "react-router-dom";
 import { Plus, Edit, Trash2, Search } from "lucide-react";
 
+// El listado viene paginado por cursor ({results, next}): se siguen los enlaces
+// "next" hasta juntar todos los productos
+async function fetchAllPages(url) {
+  let items = [];
+  while (url) {
+    const res = await fetch(url);
+    if (!res.ok) throw new Error(`HTTP ${res.status}`);
+    const page = await res.json();
+    items = items.concat(page.results);
+    url = page.next;
+  }
+  return items;
+}
+
 export default function ProductList() {
   const [products, setProducts] = useState([]);
   const [categories, setCategories] = useState([]);
@@ -11,9 +25,7 @@ export default function ProductList() {
   // 1. Cargar productos y categorías al iniciar
   useEffect(() => {
     Promise.all([
-      fetch("http://127.0.0.1:8000/api/v1/products/product/").then((res) =>
-        res.json()
-      ),
+      fetchAllPages("http://127.0.0.1:8000/api/v1/products/product/?page_size=100"),
       fetch("http://127.0.0.1:8000/api/v1/products/category/").then((res) =>
         res.json()
       ),
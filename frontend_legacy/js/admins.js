@@ -66,11 +66,15 @@ async function apiCall(endpoint, method = "GET", body = null) {
 }
 
 async function fetchUsers() {
-  const data = await apiCall("");
-  if (data) {
-    allUsers = data;
-    renderUsers(allUsers);
+  // Listado paginado por cursor ({results, next}): se siguen las páginas
+  let users = [];
+  let page = await apiCall("?page_size=100");
+  while (page) {
+    users = users.concat(page.results);
+    page = page.next ? await apiCall(page.next.slice(page.next.indexOf("?"))) : null;
   }
+  allUsers = users;
+  renderUsers(allUsers);
 }
 
 // --- Renderizado ---
@@ -79,11 +79,7 @@ function initializeContractsTable() {
         alignment: "right",
         render: (_, row) => {
           if (!row.is_signed) {
-            return `<button onclick="openSignModal('${
-              row.id
-            }', \`${encodeURIComponent(
-              row.contract_document || ""
-            )}\`)" class="text-blue-500 hover:text-blue-700 font-medium transition-colors">Firmar</button>`;
+            return `<button onclick="openSignModal('${row.id}')" class="text-blue-500 hover:text-blue-700 font-medium transition-colors">Firmar</button>`;
           }
           return '<span class="text-slate-400 text-xs">Firmado</span>';
         },
@@ -416,7 +412,6 @@ async function handleCreateContract() {
     start_date: document.getElementById("modal-start").value,
     end_date: document.getElementById("modal-end").value,
     total_cost: finalCost,
-    contract_document: currentQuote.contract_document,
     status: "PENDING",
   };
 
@@ -433,15 +428,20 @@ async function handleCreateContract() {
 
 // --- Sign Modal ---
 
-window.openSignModal = function (id, docEncoded) {
+window.openSignModal = async function (id) {
   activeContractId = id;
   signModal.open();
-  setTimeout(() => {
-    const pre = document.getElementById("contract-text");
-    if (pre) pre.textContent = decodeURIComponent(docEncoded);
-    const inp = document.getElementById("signature-input");
-    if (inp) inp.value = "";
-  }, 100);
+  // El listado no trae el documento: se genera en el detalle del contrato
+  let contract = {};
+  try {
+    contract = await api.get(`leasing/contracts/${id}/`);
+  } catch (error) {
+    console.error("Contract detail error:", error);
+  }
+  const pre = document.getElementById("contract-text");
+  if (pre) pre.textContent = contract.contract_document || "";
+  const inp = document.getElementById("signature-input");
+  if (inp) inp.value = "";
 };
 
 async function handleSubmitSignature() {
@@ -452,10 +452,8 @@ async function handleSubmitSignature() {
   }
 
   try {
-    await api.patch(`leasing/contracts/${activeContractId}/`, {
-      is_signed: true,
-      status: "ACTIVE",
-    });
+    // Firmar desde el panel también activa el contrato pendiente
+    await api.post(`leasing/contracts/${activeContractId}/sign/`, {});
     Toast.show({ type: "success", message: "Contrato firmado" });
     signModal.close();
     loadContracts();
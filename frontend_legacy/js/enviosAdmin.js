@@ -199,7 +199,7 @@ async function loadShipments() {
     const container = document.getElementById("shipments-table-container");
     if (container) container.innerHTML = Loading.spinner("Cargando envíos...");
 
-    const data = await api.get("shipping/shipments/");
+    const { results: data } = await api.get("shipping/shipments/");
     allShipmentsCache = data; // Cache for filtering
     shipmentsTable.render(data);
 
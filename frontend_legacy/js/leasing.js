@@ -13,7 +13,7 @@ async function loadRentalProducts() {
         const response = await fetch('http://127.0.0.1:8000/api/v1/leasing/products/');
         if (!response.ok) throw new Error('Error al cargar productos');
 
-        const products = await response.json();
+        const { results: products } = await response.json();
 
         grid.innerHTML = '';
 
@@ -25,14 +25,23 @@ async function loadUsers() {
       return;
     }
 
-    const response = await fetch(API_BASE, {
-      headers: {
-        Authorization: `Bearer ${token}`,
-      },
-    });
+    // Listado paginado por cursor ({results, next}): se siguen las páginas
+    let users = [];
+    let url = `${API_BASE}?page_size=100`;
+    let response;
+    while (url) {
+      response = await fetch(url, {
+        headers: {
+          Authorization: `Bearer ${token}`,
+        },
+      });
+      if (!response.ok) break;
+      const page = await response.json();
+      users = users.concat(page.results);
+      url = page.next;
+    }
 
     if (response.ok) {
-      const users = await response.json();
       window.allUsersCache = users; // Store for search filtering
       renderUsers(users);
     } else {